@@ -1,7 +1,12 @@
 #!/bin/bash
 
 usage() {
-    echo "> Usage: arxive -c|-g|-u [-n] [<source> <destination>]"
+    echo "> Usage: arxive -c|-g|-w|-u [-n] [-r] [<source> <destination>]"
+    echo "         arxive -c [-n] -p <profile>"
+    echo "         arxive -c --all [--resume]"
+    echo "         arxive -c --resume <source> <destination>"
+    echo "         arxive plan [-n] <source> <destination> -o <plan file>"
+    echo "         arxive apply [-n] <plan file>"
     exit 1
 }
 
@@ -9,17 +14,19 @@ if [ $# -lt 1 ]; then
     usage
 fi
 
+CALL_DIR=$(pwd)
 SCRIPT_DIR=$(dirname "$(readlink -f "$0")")
 cd "$SCRIPT_DIR" || exit
 
 mode=""
 no_interrupt=false
+extra=()
 source=""
 destination=""
 
 while [[ $# -gt 0 ]]; do
     case "$1" in
-        -c|-g|-u)
+        -c|-g|-w|-u|plan|apply)
             if [[ -n "$mode" ]]; then
                 echo "> Error: Multiple modes specified."
                 usage
@@ -31,6 +38,34 @@ while [[ $# -gt 0 ]]; do
             no_interrupt=true
             shift
             ;;
+        -r)
+            extra+=("--rebuild-index")
+            shift
+            ;;
+        -p)
+            if [[ -z "$2" ]]; then
+                echo "> Error: Missing profile name."
+                usage
+            fi
+            extra+=("--profile" "$2")
+            shift 2
+            ;;
+        --all)
+            extra+=("--all")
+            shift
+            ;;
+        --resume)
+            extra+=("--resume")
+            shift
+            ;;
+        -o)
+            if [[ -z "$2" ]]; then
+                echo "> Error: Missing plan file."
+                usage
+            fi
+            extra+=("--output" "$(cd "$CALL_DIR" && realpath -m "$2")")
+            shift 2
+            ;;
         *)
             if [[ -z "$source" ]]; then
                 source="$1"
@@ -47,7 +82,7 @@ while [[ $# -gt 0 ]]; do
 done
 
 if [[ -z "$mode" ]]; then
-    echo "> Error: Mode (-c, -g, or -u) is required."
+    echo "> Error: Mode (-c, -g, -w or -u) is required."
     usage
 fi
 
@@ -58,6 +93,17 @@ case "$mode" in
     -g)
         mode="gui"
         ;;
+    -w)
+        mode="watch"
+        ;;
+    plan)
+        mode="plan"
+        ;;
+    apply)
+        mode="plan"
+        source=$(cd "$CALL_DIR" && realpath -m "$source")
+        extra+=("--apply")
+        ;;
     -u)
         echo "> Updating arXive..."
         ./update.sh
@@ -84,4 +130,4 @@ else
     echo "  Source and destination not specified."
 fi
 
-pipenv run python src/arxive_"$mode".py "$source" "$destination" "$no_interrupt"
+pipenv run python src/arxive_"$mode".py "$source" "$destination" "$no_interrupt" "${extra[@]}"
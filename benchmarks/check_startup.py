@@ -0,0 +1,120 @@
+"""
+arXive: A simple CLI/GUI frontend for rsync.
+
+This file checks that starting the CLI of arXive stays fast: importing
+`arxive_cli` must not load Qt and must fit into a time budget.
+
+Usage: `python benchmarks/check_startup.py [--budget MS] [--runs N]`
+(the exit code is `1` if the check fails).
+
+Check the documentation for details: https://arxive.readthedocs.io
+
+    Copyright (C) 2025 David Gaal (gaaldvd@proton.me)
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import sys
+from argparse import ArgumentParser
+from os import path
+from subprocess import run
+
+SRC_DIR = f"{path.dirname(path.dirname(path.abspath(__file__)))}/src"
+
+# The modules importing `arxive_cli` (and so the core) must not load
+FORBIDDEN = ("PySide6", "shiboken6", "sqlite3", "concurrent.futures")
+
+# The import time of `arxive_cli` allowed by default in milliseconds
+BUDGET = 100
+
+
+def measure_import(module):
+    """Import a module in a fresh interpreter (with `-X importtime`).
+
+    :param str module: The name of the module (in `src`).
+
+    :return: The cumulative import time of the module in milliseconds
+        and the names of the top-level packages that got imported.
+    :rtype: tuple
+
+    :raises RuntimeError: If the module cannot be imported.
+    """
+
+    result = run([sys.executable, "-X", "importtime", "-c",
+                  f"import {module}"],
+                 cwd=SRC_DIR, capture_output=True, text=True, check=False)
+    if result.returncode:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr}")
+
+    # Lines of `-X importtime`: "import time: self | cumulative | name"
+    total, modules = None, set()
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[12:].split("|")
+        if not cumulative.strip().isdigit():
+            continue
+        modules.add(name.strip())
+        if name.strip() == module:
+            total = int(cumulative) / 1000
+    return total, modules
+
+def check_startup(budget=BUDGET, runs=5):
+    """Check that importing `arxive_cli` loads none of the `FORBIDDEN`
+    modules and takes at most `budget` milliseconds (the fastest of the
+    runs counts, the others are disturbed by caches and other processes).
+
+    :param float budget: The budget in milliseconds.
+    :param int runs: The number of measurements.
+
+    :return: The problems found (empty if the check passed).
+    :rtype: list
+    """
+
+    problems = []
+    times = []
+    for _ in range(runs):
+        total, modules = measure_import("arxive_cli")
+        times.append(total)
+    loaded = sorted(name for name in modules
+                    if name.split(".")[0] in FORBIDDEN or name in FORBIDDEN)
+    if loaded:
+        problems.append(f"arxive_cli imports {", ".join(loaded)}")
+    best = min(times)
+    print(f"arxive_cli import time: {best:.1f} ms (budget: {budget} ms, "
+          f"best of {runs})")
+    if best > budget:
+        problems.append(f"arxive_cli import time {best:.1f} ms is over "
+                        f"the budget ({budget} ms)")
+    return problems
+
+def main():
+    """Run the check from the command line."""
+
+    parser = ArgumentParser(description="Check the startup time of the "
+                                        "arXive CLI.")
+    parser.add_argument("--budget", type=float, default=BUDGET,
+                        help=f"import time budget in ms (default: {BUDGET})")
+    parser.add_argument("--runs", type=int, default=5,
+                        help="number of measurements (default: 5)")
+    args = parser.parse_args()
+
+    problems = check_startup(args.budget, args.runs)
+    for problem in problems:
+        print(f"Error: {problem}!")
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,370 @@
+"""
+arXive: A simple CLI/GUI frontend for rsync.
+
+This file runs the benchmarks of arXive: it generates synthetic trees
+(see `synthetic_tree.py`), then times listing the deletions, deleting them
+and synchronizing the trees with local rsync, and writes the results into
+a JSON file that can be compared with the results of another commit.
+
+Usage:
+    `python benchmarks/run_benchmarks.py [SCENARIO ...] [-o results.json]`
+    `python benchmarks/run_benchmarks.py --compare old.json new.json`
+
+Check the documentation for details: https://arxive.readthedocs.io
+
+    Copyright (C) 2025 David Gaal (gaaldvd@proton.me)
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import platform
+import sys
+from argparse import ArgumentParser, SUPPRESS
+from datetime import datetime
+from json import load, dump
+from os import path, makedirs, replace, wait4, waitstatus_to_exitcode
+from shutil import rmtree, which
+from subprocess import Popen, run, DEVNULL, CalledProcessError
+from tempfile import mkdtemp, NamedTemporaryFile
+from time import monotonic
+
+from synthetic_tree import TreeShape, generate_tree
+
+REPO_DIR = path.dirname(path.dirname(path.abspath(__file__)))
+
+# The scenarios: the arguments of `TreeShape`
+SCENARIOS = {
+    "10k": {"files": 10_000, "depth": 2, "fanout": 10},
+    "100k": {"files": 100_000, "depth": 3, "fanout": 10},
+    "100k-flat": {"files": 100_000, "layout": "flat"},
+    "100k-small-dirs": {"files": 100_000, "depth": 4, "fanout": 10},
+    "1m": {"files": 1_000_000, "depth": 3, "fanout": 20},
+    "1m-flat": {"files": 1_000_000, "layout": "flat", "sizes": "fixed:0"},
+    "10m": {"files": 10_000_000, "depth": 4, "fanout": 20,
+            "sizes": "fixed:0"},
+}
+
+# The phases, in the order they run on the same trees
+PHASES = ("list", "delete", "sync")
+
+
+def run_phase(phase, source, destination, state_path, engine, shards):
+    """Run a phase with a :ref:`Session <session-class>` (in the child
+    process started by :ref:`measure_phase <measure-phase>`) and write
+    its results into the state file.
+
+    :param str phase: `list`, `delete` or `sync`.
+    :param str source: The source directory.
+    :param str destination: The destination directory.
+    :param str state_path: The JSON file passing the deletions from the
+        `list` phase to the `delete` phase and the results to the parent.
+    :param str engine: The engine listing the deletions.
+    :param int shards: The number of rsync processes.
+    """
+
+    sys.path.insert(0, path.join(REPO_DIR, "src"))
+    from arxive_common import Session
+    from arxive_log import QUIET
+
+    session = Session(path.join(path.dirname(state_path), "session.log"))
+    session.verbosity = QUIET
+    session.source, session.destination = f"{source}/", f"{destination}/"
+    session.options = []
+    session.engine = engine
+    session.shards = shards
+    with open(state_path, 'r', encoding="utf-8") as file:
+        state = load(file)
+
+    start = monotonic()
+    if phase == "list":
+        deletions = session.get_deletions()
+        if not isinstance(deletions, list):
+            raise deletions
+        state["deletions"] = deletions
+        result = {"deletions": len(deletions)}
+    elif phase == "delete":
+        failures = session.delete_entities(state["deletions"])
+        result = {"deleted": session.deleted, "failed": len(failures)}
+    else:
+        session.collect_stats = True
+        session.sync()
+        result = {"stats": session.stats}
+    result["seconds"] = monotonic() - start
+    session.flush_log()
+
+    state["result"] = result
+    with open(state_path, 'w', encoding="utf-8") as file:
+        dump(state, file)
+
+def measure_phase(phase, work_dir, engine, shards, syscalls):
+    """Run a phase in a child process and measure it: the wall time, the
+    CPU time and the peak RSS of the child and its rsync processes, and
+    (with `strace`) the syscalls.
+
+    :param str phase: `list`, `delete` or `sync`.
+    :param str work_dir: The directory of the trees and the state file.
+    :param str engine: The engine listing the deletions.
+    :param int shards: The number of rsync processes.
+    :param bool syscalls: Count the syscalls with `strace -f -c` (slows the
+        phase down, so the times are not comparable with untraced runs).
+
+    :return: The measurements and the results of the phase.
+    :rtype: dict
+
+    :raises RuntimeError: If the phase fails.
+    """
+
+    state_path = path.join(work_dir, "state.json")
+    cmd = [sys.executable, path.abspath(__file__), "--phase", phase,
+           "--source", path.join(work_dir, "source"),
+           "--destination", path.join(work_dir, "destination"),
+           "--state", state_path, "--engine", engine,
+           "--shards", str(shards)]
+    trace_path = path.join(work_dir, f"{phase}.strace")
+    if syscalls:
+        cmd = ["strace", "-f", "-c", "-o", trace_path] + cmd
+
+    # The resource usage of the child includes the waited processes it
+    # started (rsync), `ru_maxrss` is the peak of the biggest one
+    start = monotonic()
+    process = Popen(cmd, stdout=DEVNULL)
+    _, status, usage = wait4(process.pid, 0)
+    process.returncode = waitstatus_to_exitcode(status)
+    wall = monotonic() - start
+    if process.returncode:
+        raise RuntimeError(f"The {phase} phase failed with exit code "
+                           f"{process.returncode}!")
+
+    with open(state_path, 'r', encoding="utf-8") as file:
+        measurement = load(file).pop("result")
+    measurement.update({"wall": round(wall, 6),
+                        "seconds": round(measurement["seconds"], 6),
+                        "user": round(usage.ru_utime, 6),
+                        "sys": round(usage.ru_stime, 6),
+                        "max_rss_kb": usage.ru_maxrss})
+    if syscalls:
+        measurement["syscalls"] = parse_strace(trace_path)
+    return measurement
+
+def parse_strace(trace_path):
+    """Parse the summary of `strace -c`.
+
+    :param str trace_path: The output file of strace.
+
+    :return: The number of calls by syscall (with their `total`).
+    :rtype: dict
+    """
+
+    counts = {}
+    with open(trace_path, 'r', encoding="utf-8") as file:
+        for line in file:
+            fields = line.split()
+
+            # "% time  seconds  usecs/call  calls  [errors]  syscall"
+            if len(fields) >= 5 and fields[3].isdigit():
+                counts[fields[-1]] = int(fields[3])
+    return counts
+
+def run_scenario(name, shape, args):
+    """Generate the trees of a scenario and measure its phases
+    (`args.repeat` times, on freshly generated trees).
+
+    :param str name: The name of the scenario.
+    :param TreeShape shape: The shape of the trees.
+    :param argparse.Namespace args: The arguments of the benchmark.
+
+    :return: The shape, the generated entities and the measurements of
+        every run by phase.
+    :rtype: dict
+    """
+
+    results = {"shape": shape.to_dict(), "runs": []}
+    for run_index in range(args.repeat):
+        work_dir = mkdtemp(prefix=f"arxive-bench-{name}-",
+                           dir=args.work_dir)
+        try:
+            start = monotonic()
+            results["tree"] = generate_tree(
+                shape, path.join(work_dir, "source"),
+                path.join(work_dir, "destination"), args.hard_links)
+            print(f"{name} #{run_index + 1}: generated "
+                  f"{shape.files} files in {monotonic() - start:.1f} s"
+                  f"{" (hard links)" if args.hard_links else ""}")
+            with open(path.join(work_dir, "state.json"), 'w',
+                      encoding="utf-8") as file:
+                dump({}, file)
+
+            measurements = {}
+            for phase in PHASES:
+                measurements[phase] = measure_phase(
+                    phase, work_dir, args.engine, args.shards, args.syscalls)
+                print(f"  {phase}: {measurements[phase]["wall"]:.3f} s, "
+                      f"{measurements[phase]["max_rss_kb"]} KiB")
+            results["runs"].append(measurements)
+        finally:
+            if not args.keep:
+                rmtree(work_dir, ignore_errors=True)
+    return results
+
+def describe_environment():
+    """Describe the commit and the machine the benchmarks run on.
+
+    :return: The commit, the versions of Python and rsync, the host and
+        the time.
+    :rtype: dict
+    """
+
+    def output(cmd):
+        try:
+            return run(cmd, cwd=REPO_DIR, capture_output=True, text=True,
+                       check=True).stdout.strip()
+        except (OSError, CalledProcessError) as e:
+            return f"unknown ({e})"
+
+    return {"commit": output(["git", "rev-parse", "HEAD"]),
+            "dirty": bool(output(["git", "status", "--porcelain",
+                                  "--untracked-files=no"])),
+            "python": platform.python_version(),
+            "rsync": output(["rsync", "--version"]).split("\n")[0],
+            "host": platform.node(),
+            "machine": platform.machine(),
+            "time": datetime.now().isoformat(timespec="seconds")}
+
+def compare_results(old_path, new_path):
+    """Print the change of the median wall time and peak RSS of every
+    phase between two result files.
+
+    :param str old_path: The earlier results.
+    :param str new_path: The later results.
+    """
+
+    with open(old_path, 'r', encoding="utf-8") as file:
+        old = load(file)
+    with open(new_path, 'r', encoding="utf-8") as file:
+        new = load(file)
+    print(f"{old["environment"]["commit"][:10]} -> "
+          f"{new["environment"]["commit"][:10]}")
+
+    for name, scenario in new["scenarios"].items():
+        if name not in old["scenarios"]:
+            continue
+        for phase in PHASES:
+            before = _median(old["scenarios"][name], phase)
+            after = _median(new["scenarios"][name], phase)
+            if before is None or after is None:
+                continue
+            print(f"  {name:<16} {phase:<6} "
+                  f"wall {before[0]:8.3f} s -> {after[0]:8.3f} s "
+                  f"({_change(before[0], after[0])}), "
+                  f"RSS {before[1]} -> {after[1]} KiB "
+                  f"({_change(before[1], after[1])})")
+
+def _median(scenario, phase):
+    """Return the median wall time and peak RSS of a phase."""
+
+    runs = [run_[phase] for run_ in scenario["runs"] if phase in run_]
+    if not runs:
+        return None
+    walls = sorted(measurement["wall"] for measurement in runs)
+    rss = sorted(measurement["max_rss_kb"] for measurement in runs)
+    return walls[len(walls) // 2], rss[len(rss) // 2]
+
+def _change(before, after):
+    """Format the relative change of a measurement."""
+
+    if not before:
+        return "n/a"
+    return f"{(after - before) / before * 100:+.1f}%"
+
+def main():
+    """Run the benchmarks from the command line."""
+
+    parser = ArgumentParser(description="Benchmark arXive on synthetic "
+                                        "trees.")
+    parser.add_argument("scenarios", nargs="*", default=["10k"],
+                        help=f"scenarios to run ({", ".join(SCENARIOS)}; "
+                             f"default: 10k)")
+    parser.add_argument("-o", "--output",
+                        help="results file (default: "
+                             "benchmarks/results/<commit>.json)")
+    parser.add_argument("--engine", default="rsync",
+                        choices=("rsync", "native", "indexed"),
+                        help="engine listing the deletions")
+    parser.add_argument("--shards", type=int, default=1,
+                        help="number of rsync processes")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="runs of every scenario (default: 3)")
+    parser.add_argument("--files", type=int,
+                        help="override the number of files of the scenarios")
+    parser.add_argument("--sizes",
+                        help="override the size distribution (fixed:N, "
+                             "uniform:A:B or lognormal:MEDIAN:SIGMA)")
+    parser.add_argument("--deletion-ratio", type=float,
+                        help="override the ratio of deletions")
+    parser.add_argument("--work-dir", help="directory of the generated trees "
+                                           "(default: the temp directory)")
+    parser.add_argument("--keep", action="store_true",
+                        help="keep the generated trees")
+    parser.add_argument("--hard-links", action="store_true",
+                        help="hard link the files on both sides instead of "
+                             "copying them (less disk space, but the sides "
+                             "share their inodes)")
+    parser.add_argument("--syscalls", action="store_true",
+                        help="count the syscalls with strace (slower)")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"),
+                        help="compare two result files")
+    for hidden in ("--phase", "--source", "--destination", "--state"):
+        parser.add_argument(hidden, help=SUPPRESS)
+    args = parser.parse_args()
+
+    if args.phase:
+        run_phase(args.phase, args.source, args.destination, args.state,
+                  args.engine, args.shards)
+        return
+    if args.compare:
+        compare_results(*args.compare)
+        return
+    unknown = [name for name in args.scenarios if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenario(s): {", ".join(unknown)}")
+    if args.syscalls and not which("strace"):
+        parser.error("strace is not installed")
+
+    results = {"environment": describe_environment(),
+               "settings": {"engine": args.engine, "shards": args.shards,
+                            "syscalls": args.syscalls,
+                            "hard_links": args.hard_links},
+               "scenarios": {}}
+    for name in args.scenarios:
+        params = dict(SCENARIOS[name])
+        for key in ("files", "sizes", "deletion_ratio"):
+            if getattr(args, key) is not None:
+                params[key] = getattr(args, key)
+        results["scenarios"][name] = run_scenario(name, TreeShape(**params),
+                                                  args)
+
+    output_path = args.output or path.join(
+        REPO_DIR, "benchmarks", "results",
+        f"{results["environment"]["commit"][:10]}.json")
+    makedirs(path.dirname(path.abspath(output_path)), exist_ok=True)
+    with NamedTemporaryFile("w", encoding="utf-8", delete=False,
+                            dir=path.dirname(path.abspath(output_path)),
+                            suffix=".tmp") as file:
+        dump(results, file, indent=2)
+    replace(file.name, output_path)
+    print(f"Results written to {output_path}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,220 @@
+"""
+arXive: A simple CLI/GUI frontend for rsync.
+
+This file generates synthetic source/destination trees for the
+benchmarks of arXive (see `run_benchmarks.py`).
+
+Check the documentation for details: https://arxive.readthedocs.io
+
+    Copyright (C) 2025 David Gaal (gaaldvd@proton.me)
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from os import path, makedirs, link, utime
+from random import Random
+from shutil import copyfile
+
+# The modification time of the files present on both sides (so that rsync
+# finds them unchanged)
+MTIME = 1_600_000_000
+
+# The contents of the files are slices of this block of random bytes
+BLOCK_SIZE = 1 << 20
+
+# The largest generated file
+MAX_SIZE = 64 << 20
+
+LAYOUTS = ("tree", "flat")
+
+
+def parse_sizes(spec):
+    """Parse the size distribution of the files.
+
+    - `fixed:N`: every file is `N` bytes (`fixed:0` for empty files)
+    - `uniform:A:B`: between `A` and `B` bytes
+    - `lognormal:M:S`: log-normal with a median of `M` bytes and a sigma
+      of `S` (many small files and a few big ones, like real trees)
+
+    :param str spec: The distribution.
+
+    :return: Function returning a size from a `random.Random`.
+    :rtype: function
+
+    :raises ValueError: If the distribution is invalid.
+    """
+
+    kind, *params = spec.split(":")
+    try:
+        params = [float(param) for param in params]
+    except ValueError as e:
+        raise ValueError(f"Invalid size distribution: {spec}") from e
+
+    if kind == "fixed" and len(params) == 1:
+        return lambda rng: int(params[0])
+    if kind == "uniform" and len(params) == 2:
+        return lambda rng: rng.randint(int(params[0]), int(params[1]))
+    if kind == "lognormal" and len(params) == 2:
+        return lambda rng: min(MAX_SIZE, int(rng.lognormvariate(
+            0, params[1]) * params[0]))
+    raise ValueError(f"Invalid size distribution: {spec}")
+
+
+class TreeShape:
+    """Holds the shape of a synthetic tree.
+
+    The files are spread evenly over the deepest directories (`tree`
+    layout: `fanout` subdirectories in every directory, `depth` levels), or
+    all of them are in a single directory (`flat` layout). Every file
+    is on both sides, only on the destination (a deletion) or only on the
+    source (new data for the sync).
+
+    :ivar int files: The number of files.
+    :ivar int depth: The number of directory levels.
+    :ivar int fanout: The number of subdirectories of a directory.
+    :ivar str layout: `tree` or `flat`.
+    :ivar str sizes: The size distribution (see
+        :ref:`parse_sizes <parse-sizes>`).
+    :ivar float deletion_ratio: The ratio of files only on the destination.
+    :ivar float new_ratio: The ratio of files only on the source.
+    :ivar int seed: The seed of the random generator (the same shape
+        always gives the same tree).
+
+    :raises ValueError: If the shape is invalid.
+
+    Methods:
+        directories():
+            Returns the directories of the tree.
+
+        to_dict():
+            Returns the parameters of the shape.
+    """
+
+    def __init__(self, files, depth=3, fanout=10, layout="tree",
+                 sizes="lognormal:1024:1.5", deletion_ratio=0.05,
+                 new_ratio=0.05, seed=0):
+        if layout not in LAYOUTS:
+            raise ValueError(f"Invalid layout: {layout}")
+        if deletion_ratio + new_ratio > 1:
+            raise ValueError("The deletion and the new ratio add up to "
+                             "more than 1!")
+        parse_sizes(sizes)
+        self.files = files
+        self.depth = depth
+        self.fanout = fanout
+        self.layout = layout
+        self.sizes = sizes
+        self.deletion_ratio = deletion_ratio
+        self.new_ratio = new_ratio
+        self.seed = seed
+
+    def directories(self):
+        """Return the deepest directories of the tree (the ones holding
+        the files).
+
+        :return: The paths of the directories relative to the root.
+        :rtype: list
+        """
+
+        if self.layout == "flat":
+            return [""]
+        level = [""]
+        for _ in range(self.depth):
+            level = [path.join(parent, f"d{index:03d}") for parent in level
+                     for index in range(self.fanout)]
+        return level
+
+    def to_dict(self):
+        """Return the parameters of the shape.
+
+        :return: The parameters (the arguments of the constructor).
+        :rtype: dict
+        """
+
+        return {"files": self.files, "depth": self.depth,
+                "fanout": self.fanout, "layout": self.layout,
+                "sizes": self.sizes, "deletion_ratio": self.deletion_ratio,
+                "new_ratio": self.new_ratio, "seed": self.seed}
+
+
+def generate_tree(shape, source, destination, hard_links=False):
+    """Generate the source and the destination tree of a shape.
+
+    The files on both sides are copies of each other with the same size and
+    modification time (so rsync skips them). With `hard_links` they are
+    hard links instead (the tree takes the disk space once, but both sides
+    share their inodes, unlike real trees), copies if they are on different
+    file systems.
+
+    :param TreeShape shape: The shape of the tree.
+    :param str source: The source directory (created).
+    :param str destination: The destination directory (created).
+    :param bool hard_links: Link the files on both sides.
+
+    :return: The number of files on both sides, of the deletions and of the
+        new files, the number of directories and the size of the new files.
+    :rtype: dict
+
+    :raises OSError: If a file cannot be written.
+    """
+
+    rng = Random(shape.seed)
+    size_of = parse_sizes(shape.sizes)
+    block = rng.randbytes(BLOCK_SIZE)
+    directories = shape.directories()
+    for directory in directories:
+        makedirs(path.join(source, directory), exist_ok=True)
+        makedirs(path.join(destination, directory), exist_ok=True)
+
+    counts = {"shared": 0, "deletions": 0, "new": 0,
+              "directories": len(directories), "new_bytes": 0}
+    for index in range(shape.files):
+        entity = path.join(directories[index % len(directories)],
+                           f"f{index:08d}.dat")
+        size = size_of(rng)
+        side = rng.random()
+        if side < shape.deletion_ratio:
+            _write_file(path.join(destination, entity), block, size, rng)
+            counts["deletions"] += 1
+        elif side < shape.deletion_ratio + shape.new_ratio:
+            _write_file(path.join(source, entity), block, size, rng)
+            counts["new"] += 1
+            counts["new_bytes"] += size
+        else:
+            _write_file(path.join(source, entity), block, size, rng)
+            utime(path.join(source, entity), (MTIME, MTIME))
+            linked = False
+            if hard_links:
+                try:
+                    link(path.join(source, entity),
+                         path.join(destination, entity))
+                    linked = True
+                except OSError:
+                    pass
+            if not linked:
+                copyfile(path.join(source, entity),
+                         path.join(destination, entity))
+                utime(path.join(destination, entity), (MTIME, MTIME))
+            counts["shared"] += 1
+    return counts
+
+def _write_file(file_path, block, size, rng):
+    """Write a file of random contents (slices of `block`)."""
+
+    with open(file_path, 'wb') as file:
+        while size > 0:
+            start = rng.randrange(BLOCK_SIZE)
+            chunk = block[start:start + size]
+            file.write(chunk)
+            size -= len(chunk)
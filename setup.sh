@@ -39,6 +39,6 @@ Categories=System
 EOF
 
 echo "> Creating configuration file..."
-echo '{"source": "", "destination": "", "options": null}' >> ~/.config/arxive
+echo '{"source": "", "destination": "", "options": null, "engine": "rsync"}' >> ~/.config/arxive
 
 echo "> Done. Goodbye!"
@@ -0,0 +1,385 @@
+"""
+arXive: A simple CLI/GUI frontend for rsync.
+
+This file contains the asyncio API of arXive sessions.
+
+Check the documentation for details: https://arxive.readthedocs.io
+
+    Copyright (C) 2025 David Gaal (gaaldvd@proton.me)
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import asyncio
+import re
+import sys
+from codecs import getincrementaldecoder
+from subprocess import PIPE, STDOUT, CalledProcessError, CompletedProcess
+from time import monotonic
+
+from arxive_common import Session
+from arxive_journal import PARTIAL_DIR
+from arxive_records import (PlanRecords, DELETE, parse_record,
+                            parse_progress, parse_stats)
+
+
+class AsyncSession(Session):
+    """Handles an arXive session driven by an asyncio event loop.
+
+    The methods running rsync are coroutines (or async iterators) built on
+    `asyncio.create_subprocess_exec`, so one event loop can run many
+    sessions at the same time without a thread for each. They give the
+    same results as the methods of :ref:`Session <session-class>` (and set
+    the same attributes: `records`, `stats`, `returncode`, `timings`...).
+
+    Cancelling the task awaiting a method (or closing an async iterator
+    early) stops the rsync process: it gets `SIGTERM` (so that it removes
+    its temporary files) and `SIGKILL` if it does not exit in
+    `kill_timeout` seconds. :ref:`cancel <cancel>` stops every running
+    rsync process of the session.
+
+    The `native` and `indexed` engines, the sharded sync and deleting the
+    entities run in a worker thread (with the methods of `Session`). The
+    sessions logging into the same file share one session log (and one
+    :ref:`LogWriter <logwriter-class>` thread).
+
+    Methods:
+        iter_deletions():
+            Streams deletions from the source (async iterator).
+
+        get_deletions():
+            Lists deletions from the source.
+
+        estimate():
+            Estimates the cost of the sync.
+
+        delete_entities(entities, workers=8):
+            Deletes files and directories.
+
+        iter_sync(files_from=None):
+            Synchronizes, streaming the progress (async iterator).
+
+        sync(files_from=None):
+            Synchronizes the source with the destination.
+
+        cancel():
+            Stops the running rsync processes.
+    """
+
+    # Seconds to wait for rsync to exit after `SIGTERM`
+    kill_timeout = 5.0
+
+    # The log writers shared by the sessions (by the path of their log)
+    writers = {}
+
+    # The deletions listed in a worker thread are passed on in batches of
+    # this many entities (or after this many seconds)
+    batch_size = 500
+    batch_interval = 0.1
+
+    def _open_log(self):
+        """Initialize the session log and start its writer only for the
+        first session logging into it, the others share the writer.
+        """
+
+        if self.log_path not in AsyncSession.writers:
+            AsyncSession.writers[self.log_path] = Session._open_log(self)
+        return AsyncSession.writers[self.log_path]
+
+    async def _stop(self, process):
+        """Stop an rsync process (`SIGTERM`, then `SIGKILL`) if it is
+        still running and forget it.
+        """
+
+        try:
+            if process.returncode is None:
+                process.terminate()
+                await asyncio.wait_for(process.wait(), self.kill_timeout)
+        except ProcessLookupError:
+            pass
+        except TimeoutError:
+            process.kill()
+            await process.wait()
+        finally:
+            if process in self.processes:
+                self.processes.remove(process)
+
+    async def _spawn(self, cmd, stderr):
+        """Start an rsync process (stopped right away if the session
+        is cancelled).
+        """
+
+        process = await asyncio.create_subprocess_exec(
+            *cmd, stdout=PIPE, stderr=stderr)
+        self.processes.append(process)
+        if self.cancelled:
+            await self._stop(process)
+        return process
+
+    def cancel(self):
+        """Cancel the running operation: the running rsync processes are
+        terminated and `cancelled` is set (until the next operation
+        starts).
+        """
+
+        self.cancelled = True
+        for process in list(self.processes):
+            if process.returncode is None:
+                try:
+                    process.terminate()
+                except ProcessLookupError:
+                    pass
+
+    async def _stream_lines(self, cmd):
+        """Run rsync and stream the lines of its output (see
+        :ref:`stream_lines <stream-lines>`), tracing the invocation.
+
+        :raises CalledProcessError: If rsync exits with a non-zero code.
+        """
+
+        start, returncode = monotonic(), None
+        process = await self._spawn(cmd, PIPE)
+        errors = asyncio.ensure_future(process.stderr.read())
+        try:
+            async for line in process.stdout:
+                yield line.decode(errors="surrogateescape")
+            returncode = await process.wait()
+            if returncode:
+                raise CalledProcessError(
+                    returncode, cmd,
+                    stderr=(await errors).decode(errors="replace"))
+        finally:
+            await self._stop(process)
+            errors.cancel()
+            self.trace_event("rsync", argv=cmd, returncode=returncode,
+                             duration=round(monotonic() - start, 6))
+
+    async def _dry_run(self):
+        """Stream the records of an itemized rsync dry-run and store them
+        in `records` (see :ref:`dry_run <dry-run>`).
+        """
+
+        self.records = PlanRecords()
+        async for line in self._stream_lines(self._dry_run_cmd()):
+            record = parse_record(line)
+            if record:
+                self.records.append(*record)
+                yield record
+
+    async def iter_deletions(self):
+        """Stream the files and directories that have been deleted from
+        `source` but are still present on `destination` (see
+        :ref:`iter_deletions <iter-deletions>`).
+
+        :return: Async iterator of the paths of deleted entities.
+        :rtype: async generator
+
+        :raises CalledProcessError: If rsync exits with a non-zero code
+            or (with the `native` engine) a directory cannot be read.
+        """
+
+        self.cancelled = False
+        if self.engine != "rsync" or self.sharded():
+            async for entity in self._iter_thread_deletions():
+                yield entity
+            return
+
+        self.moved, self.moved_bytes = 0, 0
+        with self.phase("list_deletions", engine=self.engine):
+            async for kind, _, entity in self._dry_run():
+                if kind == DELETE and f"/{PARTIAL_DIR}/" not in f"/{entity}":
+                    yield entity
+
+    async def _iter_thread_deletions(self):
+        """Stream the deletions listed by the method of `Session` in a
+        worker thread (`self.iter_deletions` is an async generator), passed
+        on in batches through a queue. The listing stops if the iterator
+        is closed early.
+        """
+
+        loop, queue = asyncio.get_running_loop(), asyncio.Queue()
+        stopped = False
+
+        def list_deletions():
+            batch, shown, error = [], monotonic(), None
+            entities = Session.iter_deletions(self)
+            try:
+                for entity in entities:
+                    if stopped:
+                        break
+                    batch.append(entity)
+                    if (len(batch) >= self.batch_size
+                            or monotonic() - shown > self.batch_interval):
+                        loop.call_soon_threadsafe(queue.put_nowait,
+                                                  (batch, False, None))
+                        batch, shown = [], monotonic()
+            except Exception as e:
+                error = e
+            finally:
+                entities.close()
+                loop.call_soon_threadsafe(queue.put_nowait,
+                                          (batch, True, error))
+
+        lister = asyncio.ensure_future(asyncio.to_thread(list_deletions))
+        try:
+            while True:
+                batch, done, error = await queue.get()
+                for entity in batch:
+                    yield entity
+                if done:
+                    break
+            if error:
+                raise error
+        finally:
+            stopped = True
+            await lister
+
+    async def get_deletions(self):
+        """List the files and directories that have been deleted from
+        `source` but are still present on `destination`.
+
+        :return: The paths of deleted entities or the exception raised
+            by :ref:`iter_deletions <iter-deletions>`.
+        :rtype: list or CalledProcessError
+        """
+
+        try:
+            return [entity async for entity in self.iter_deletions()]
+        except CalledProcessError as e:
+            return e
+
+    async def estimate(self):
+        """Estimate the cost of the sync (see :ref:`estimate <estimate>`).
+
+        :return: The number of entities to create, update and delete,
+            the bytes to send and the predicted duration in seconds.
+        :rtype: dict
+
+        :raises CalledProcessError: If rsync exits with a non-zero code.
+        """
+
+        self.cancelled = False
+        if self.records is None:
+            with self.phase("dry_run"):
+                async for _ in self._dry_run():
+                    pass
+        return Session.estimate(self)
+
+    async def delete_entities(self, entities, workers=8):
+        """Delete the files and directories chosen from `deletions` from
+        `destination` in a worker thread (see
+        :ref:`delete_entities <delete-entities>`).
+
+        :return: The paths and exceptions of the entities that could not
+            be deleted.
+        :rtype: list
+        """
+
+        return await asyncio.to_thread(Session.delete_entities, self,
+                                       entities, workers)
+
+    async def iter_sync(self, files_from=None):
+        """Run rsync to synchronize `source` with `destination` (see
+        :ref:`sync <sync>`), streaming the overall progress.
+
+        The progress is passed on at most every `progress_interval`
+        seconds (and at 100%), the other output of rsync is written to the
+        standard output. The exit code is kept in `returncode`, the
+        statistics (with `collect_stats`) in `stats`.
+
+        :param list files_from: Only synchronize these paths (relative to
+            :ref:`transfer_root <transfer-root>`) instead of the whole source.
+
+        :return: Async iterator of the progress (see
+            :ref:`parse_progress <parse-progress>`).
+        :rtype: async generator
+
+        :raises CalledProcessError: If rsync exits with a non-zero code.
+        """
+
+        self.cancelled = False
+        if files_from is None and not self.single_pass and self.sharded():
+            await asyncio.to_thread(Session.sync, self)
+            return
+
+        with self._sync_cmd(files_from, False, True) as cmd:
+            start = monotonic()
+            with self.phase("sync", files=None if files_from is None
+                            else len(files_from)):
+                async for progress in self._tee_progress(cmd):
+                    yield progress
+        if self.returncode:
+            raise CalledProcessError(self.returncode, cmd)
+        await asyncio.to_thread(self._sync_finished, files_from,
+                                monotonic() - start)
+
+    async def _tee_progress(self, cmd):
+        """Run rsync, stream its progress and write its other output to the
+        standard output (see :ref:`Session.run_rsync <run-rsync>`).
+        """
+
+        decoder = getincrementaldecoder("utf-8")(errors="replace")
+        tail, pending = "", ""
+        last, latest, shown = None, None, 0.0
+        start, self.returncode = monotonic(), None
+        process = await self._spawn(cmd, STDOUT)
+        try:
+            while chunk := await process.stdout.read(65536):
+                text = decoder.decode(chunk)
+                tail = (tail + text)[-8192:]
+
+                # Splitting the output after line feeds and carriage
+                # returns, the progress lines end with the latter
+                *segments, pending = re.split(r"(?<=[\r\n])",
+                                              pending + text)
+                for segment in segments:
+                    progress = parse_progress(segment)
+                    if progress:
+                        latest = progress
+                        if (monotonic() - shown >= self.progress_interval
+                                or progress["percent"] == 100):
+                            shown, last = monotonic(), progress
+                            yield progress
+                    elif segment.strip():
+                        sys.stdout.write(segment.replace("\r", "\n"))
+            self.returncode = await process.wait()
+        finally:
+            await self._stop(process)
+            self.trace_event("rsync", argv=cmd, returncode=self.returncode,
+                             duration=round(monotonic() - start, 6))
+        if pending.strip():
+            sys.stdout.write(pending)
+        self.stats = parse_stats(tail)
+
+        # Passing on the final progress if it was held back
+        if latest is not last:
+            yield latest
+
+    async def sync(self, files_from=None):
+        """Run rsync to synchronize `source` with `destination` (see
+        :ref:`sync <sync>`), passing the progress on to
+        `progress_callback` (if set).
+
+        :param list files_from: Only synchronize these paths.
+
+        :return: The result object of rsync.
+        :rtype: subprocess.CompletedProcess
+
+        :raises CalledProcessError: If rsync exits with a non-zero code.
+        """
+
+        async for progress in self.iter_sync(files_from):
+            if self.progress_callback:
+                self.progress_callback(progress)
+        return CompletedProcess(["rsync"], self.returncode)
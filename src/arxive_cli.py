@@ -21,9 +21,14 @@ Check the documentation for details: https://arxive.readthedocs.io
     along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 
+from os.path import expanduser
 from shutil import get_terminal_size
-from sys import argv, exit as close
+from sys import argv, exit as close, stdout
 from arxive_common import *
+from arxive_metrics import write_metrics
+from arxive_rules import DeletionRules
+from arxive_jobs import Job, run_jobs, format_summary
+from arxive_journal import Journal
 
 
 # Maximum number of characters in a line of the terminal
@@ -45,29 +50,97 @@ def shorten_path(entity, limit):
         return (f"{entity[:int(limit / 2 - 5)]}"
                 f" ... {entity[-int(limit / 2 - 5):]}")
 
-def main():
-    """arXive CLI script.
+def describe_deletion(tree, entity, node, limit):
+    """Describe a deletion of a :ref:`DeletionTree <deletiontree-class>`
+    in one line: its path and, for directories, the number of files deleted
+    with it (and the size if known).
 
-    The purpose of the script is to run the arXive application in a command line
-    environment. Details on usage can be found in the
-    `README <https://github.com/gaaldvd/arxive?tab=readme-ov-file#arxive>`_
-    of the repository.
-    `Technical documentation <https://arxive.readthedocs.io/en/latest/reference.html>`_
-    is also available for developers.
+    :param DeletionTree tree: The deletions.
+    :param str entity: The path of the deletion.
+    :param DeletionNode node: The node of the deletion.
+    :param int limit: The maximum number of characters in the description.
 
-    :var Session session: Handles the arXive session.
-    :var Config config: Holds and handles configurations.
-    :var bool no_interrupt: Shows if no-interruption mode is active
-        for the current session.
-    :var subprocess.CompletedProcess result: The result object
-        of the `subprocess.run` method.
+    :return: The description.
+    :rtype: str
+    """
+
+    details = []
+    if entity.endswith("/"):
+        details.append(f"{node.files} files")
+    if tree.sized:
+        details.append(format_size(node.size))
+    details = f" ({', '.join(details)})" if details else ""
+    return f"{shorten_path(entity, max(limit - len(details), 20))}{details}"
+
+def print_deletions(session):
+    """Print :ref:`Session.deletions <session-class>`, every deleted
+    directory in one line (instead of every entity in it).
+
+    :param Session session: Handles the arXive session.
+
+    :return: The deletions in a trie.
+    :rtype: DeletionTree
+    """
+
+    tree = session.deletion_tree()
+    for entity, node in tree.nodes():
+        print(f"  {describe_deletion(tree, entity, node, TERMINAL_SIZE - 4)}")
+    return tree
+
+def get_argument(flag):
+    """Return the value of an extra argument passed by `arxive.sh`
+    (e.g. `--profile <name>`).
+
+    :param str flag: The name of the argument.
+
+    :return: The value (`None` if the argument is not set).
+    :rtype: str
+    """
+
+    if flag not in argv[4:-1]:
+        return None
+    return argv[argv.index(flag, 4) + 1]
+
+def draw_progress(progress):
+    """Draw the progress of the sync in a single line of the terminal
+    (used as :ref:`Session.progress_callback <session-class>`).
+
+    :param dict progress: The progress (see
+        :ref:`parse_progress <parse-progress>`), `None` clears the line.
+    """
+
+    if progress is None:
+        stdout.write("\r\033[K")
+    else:
+        filled = 20 * min(progress["percent"], 100) // 100
+        line = (f"[{"#" * filled}{"-" * (20 - filled)}] "
+                f"{describe_progress(progress)}")
+        stdout.write(f"\r{line[:TERMINAL_SIZE - 1]}\033[K")
+    stdout.flush()
+
+def start_session(source, destination):
+    """Create the session log, load the configurations, then set and
+    validate the source and the destination.
+
+    The script exits if any of these fail. With `--profile <name>` the
+    source, the destination and the options are taken from a profile of
+    the configurations (otherwise the default options of the configurations
+    are used), with `--log <path>` the session log is written to another
+    file.
+
+    :param str source: The source directory.
+    :param str destination: The destination directory.
+
+    :return: The session, the configurations and whether no-interruption
+        mode is active.
+    :rtype: tuple
     """
 
     session, config = None, None
 
     # Creating session log
     try:
-        session = Session()
+        session = Session(get_argument("--log"))
         session.log("Session log created.")
     except (FileNotFoundError, PermissionError, OSError) as e:
         print(f"Error while creating session log: {e}")
@@ -81,13 +154,65 @@ def main():
         session.log("Error while loading configurations!", e)
         close("Goodbye!")
 
+    # Loading the profile
+    name = get_argument("--profile")
+    if name:
+        profile = config.profiles.get(name)
+        if not isinstance(profile, dict):
+            session.log(f"Error: Profile {name} cannot be found!")
+            close("Goodbye!")
+        session.log(f"Profile: {name}")
+        source = profile.get("source")
+        destination = profile.get("destination")
+        session.options = validate_options(profile.get("options"))
+
+    # The default options apply to every mode without a profile
+    else:
+        session.options = validate_options(config.options)
+    if session.options:
+        session.log(f"Additional options: {", ".join(session.options)}")
+
     # Checking if no-interruption mode is enabled
     no_interrupt = True if argv[3] == "true" else False
     if no_interrupt:
         session.log("No-interruption mode is ACTIVE!")
 
+    # Setting the console verbosity
+    session.verbosity = config.verbosity
+
+    # Setting the engine used for listing deletions
+    session.engine = config.engine
+    if session.engine != "rsync":
+        session.log(f"Deletions are listed by the {session.engine} engine.")
+
+    # Checking if single-pass mode is enabled
+    session.single_pass = config.single_pass
+    if session.single_pass:
+        session.log("Single-pass mode is ACTIVE!")
+
+    # Setting the number of parallel rsync processes
+    session.shards = config.shards
+    if session.shards > 1:
+        session.log(f"The source is split into shards for {session.shards} "
+                    f"parallel rsync processes.")
+
+    # Checking if moved files are detected
+    session.detect_moves = config.detect_moves
+    if session.detect_moves:
+        session.log("Moved files are detected before the sync.")
+
+    # Compiling the deletion rules
+    if config.deletion_rules:
+        try:
+            session.rules = DeletionRules(config.deletion_rules)
+            session.log(f"{len(config.deletion_rules)} deletion rule(s) "
+                        f"loaded.")
+        except (ValueError, TypeError, AttributeError) as e:
+            session.log("Error while loading deletion rules!", e)
+            close("Goodbye!")
+
     # Setting and validating source and destination
-    session.source, session.destination = argv[1], argv[2]
+    session.source, session.destination = source, destination
     if not session.source or not session.destination:
         session.log("Error: Source and destination must be provided!")
         close("Goodbye!")
@@ -106,61 +231,333 @@ def main():
             session.log("Error: Source and destination must be different!")
         close("Goodbye!")
 
-    # Getting list of deletions from the source
-    session.log("Listing deletions...")
-    session.deletions = session.get_deletions()
-    if isinstance(session.deletions, CalledProcessError):
-        e, c = session.deletions.stderr, session.deletions.returncode
-        session.log(f"Error while listing deletions ({c})!", e)
-
-    # Prompting the user for deletions and deleting files/directories
-    session.log(f"\n{len(session.deletions)} deletion(s) found.\n")
-    if len(session.deletions) > 0:
-        for entity in session.deletions:
-            print(f"  {shorten_path(entity, TERMINAL_SIZE - 4)}")
-        if no_interrupt:
-            del_choice = "a"
-        else:
-            del_choice = input("\nDelete [a]ll, [n]one or "
-                               "prompt for each (default)? : ").strip().lower()
-        if del_choice == "a":
-            entities = [path.join(session.destination, file)
-                        for file in session.deletions]
-            session.deleted = 0
-            for entity in entities:
-                try:
-                    session.delete_entity(entity)
-                    session.deleted += 1
-                    session.log(f"{shorten_path(entity, TERMINAL_SIZE - 10)}"
-                                f" deleted.")
-                except (FileNotFoundError, PermissionError, OSError) as e:
-                    session.log(f"Error while deleting "
-                                f"{shorten_path(entity, TERMINAL_SIZE - 22)}"
-                                f"!", e)
-            session.log(f"{session.deleted} entities deleted.")
-        elif del_choice == "n":
-            session.log(f"Deletion of {len(session.deletions)} "
-                        f"entities skipped.")
+    # Starting the event trace
+    if config.trace:
+        try:
+            session.start_trace(expanduser(config.trace))
+            session.log(f"Tracing events to {config.trace}.")
+        except (FileNotFoundError, PermissionError, OSError) as e:
+            session.log("Error while starting the event trace!", e)
+
+    # Collecting the statistics of rsync for the metrics
+    session.collect_stats = bool(config.metrics_dir)
+
+    # Showing the progress of the sync (unless the output is redirected)
+    if stdout.isatty():
+        session.progress_callback = draw_progress
+
+    return session, config, no_interrupt
+
+def choose_deletions(session, no_interrupt, tree=None):
+    """Prompt the user which entities of
+    :ref:`Session.deletions <session-class>` should be deleted from the
+    destination and store them in :ref:`Session.chosen <session-class>`.
+
+    When prompting for each, a deleted directory is one question (for
+    everything in it) unless the user expands it.
+
+    :param Session session: Handles the arXive session.
+    :param bool no_interrupt: Choose everything (or what
+        :ref:`Session.rules <session-class>` choose) without prompting.
+    :param DeletionTree tree: The deletions in a trie (created from
+        :ref:`Session.deletions <session-class>` if omitted).
+
+    :return: The chosen entities.
+    :rtype: list
+    """
+
+    if no_interrupt:
+        del_choice = "r" if session.rules else "a"
+    elif session.rules:
+        del_choice = input("\nDelete [a]ll, [n]one, by the [r]ules or "
+                           "prompt for each (default)? : ").strip().lower()
+    else:
+        del_choice = input("\nDelete [a]ll, [n]one or "
+                           "prompt for each (default)? : ").strip().lower()
+    if del_choice == "r" and session.rules:
+        session.chosen = session.rules.choose(session.deletions,
+                                              session.destination)
+        session.log(f"{len(session.chosen)} of {len(session.deletions)} "
+                    f"deletion(s) chosen by the deletion rules.")
+    elif del_choice == "a":
+        session.chosen = list(session.deletions)
+    elif del_choice == "n":
+        session.chosen = []
+        session.log(f"Deletion of {len(session.deletions)} "
+                    f"entities skipped.")
+    else:
+        if tree is None:
+            tree = session.deletion_tree()
+        session.chosen = []
+        for entity, node in tree.nodes():
+            _choose_node(session, tree, entity, node, session.chosen)
+    return session.chosen
+
+def _choose_node(session, tree, entity, node, chosen):
+    """Prompt for a deletion of a :ref:`DeletionTree <deletiontree-class>`,
+    an expanded directory prompts for its entries one by one.
+
+    :return: Whether everything below the deletion was chosen.
+    :rtype: bool
+    """
+
+    expandable = entity.endswith("/") and bool(node.children)
+    choice = input(f"Delete "
+                   f"{describe_deletion(tree,
+                                        path.join(session.destination, entity),
+                                        node, TERMINAL_SIZE - 22)}"
+                   f" [Y/n{"/e" if expandable else ""}]: ").strip().lower()
+    if choice == "e" and expandable:
+
+        # The directory itself is only chosen if all of its entries are
+        results = [_choose_node(session, tree, child_entity, child, chosen)
+                   for child_entity, child in tree.nodes(entity)]
+        if all(results):
+            chosen.append(entity)
+        return all(results)
+    if choice == "n":
+        return False
+    chosen.extend(tree.paths(entity))
+    return True
+
+def prompt_deletions(session, no_interrupt, tree=None):
+    """Prompt the user which entities of
+    :ref:`Session.deletions <session-class>` should be deleted from the
+    destination, then delete them with
+    :ref:`Session.delete_entities <delete-entities>`.
+
+    :param Session session: Handles the arXive session.
+    :param bool no_interrupt: Delete everything without prompting.
+    :param DeletionTree tree: The deletions in a trie (optional).
+    """
+
+    entities = choose_deletions(session, no_interrupt, tree)
+
+    # Moving the deleted files found on the source under a new path
+    # instead of deleting them and transferring them again
+    if session.detect_moves:
+        session.log("Detecting moved files...")
+        try:
+            entities, failures = session.move_entities(entities)
+            for entity, e in failures:
+                session.log(f"Error while moving to "
+                            f"{shorten_path(path.join(session.destination,
+                                                      entity),
+                                            TERMINAL_SIZE - 22)}"
+                            f"!", e)
+            session.log(f"{session.moved} file(s) moved on the destination "
+                        f"({format_size(session.moved_bytes)} not "
+                        f"transferred).")
+        except CalledProcessError as e:
+            session.log(f"Error while detecting moved files "
+                        f"({e.returncode})!", e.stderr)
+    if not entities:
+        return
+
+    # In single-pass mode the chosen entities are deleted by rsync
+    if session.single_pass:
+        session.log(f"{len(entities)} entities will be deleted "
+                    f"while synchronizing.")
+        return
+
+    # Deleting the chosen entities in one batch, only the failures
+    # are reported one by one
+    session.log(f"Deleting {len(entities)} entities...")
+    for entity, e in session.delete_entities(entities):
+        session.log(f"Error while deleting "
+                    f"{shorten_path(path.join(session.destination, entity),
+                                    TERMINAL_SIZE - 22)}"
+                    f"!", e)
+    session.log(f"\n{session.deleted} entities deleted.")
+
+def export_metrics(session, config):
+    """Write the metrics of the session for the Prometheus textfile
+    collector (if :ref:`Config.metrics_dir <config-class>` is set).
+
+    :param Session session: Handles the arXive session.
+    :param Config config: Holds and handles configurations.
+    """
+
+    if not config.metrics_dir:
+        return
+    try:
+        metrics_path = write_metrics(session, expanduser(config.metrics_dir))
+        session.log(f"Metrics written to {metrics_path}.")
+    except (FileNotFoundError, PermissionError, OSError) as e:
+        session.log("Error while writing metrics!", e)
+
+def start_journal(session, resume):
+    """Start the :ref:`Journal <journal-class>` of the sync, or load the
+    journal of the interrupted sync of the same source and destination
+    (with `--resume`).
+
+    A journal is only resumed if the options and the number of shards
+    are the same as in the interrupted sync.
+
+    :param Session session: Handles the arXive session.
+    :param bool resume: Resume the interrupted sync.
+
+    :return: Whether the deletions can be skipped (they were handled
+        by the interrupted sync).
+    :rtype: bool
+    """
+
+    session.journal = Journal(session.get_profile())
+    plan = {"source": session.source, "destination": session.destination,
+            "options": session.options or [], "shards": session.shards}
+    state = None
+    if resume:
+        try:
+            state = session.journal.load()
+        except (PermissionError, OSError) as e:
+            session.log("Error while loading the journal!", e)
+        if state is None:
+            session.log("There is no interrupted sync to resume.")
+        elif any(state.get(key) != value for key, value in plan.items()):
+            session.log("The options changed since the interrupted sync, "
+                        "starting over.")
+            state = session.journal.state = None
+    if state:
+        return "deleted" in state["events"] and not session.single_pass
+
+    # Writing the plan ahead of the work
+    try:
+        session.journal.begin(**plan)
+    except (PermissionError, OSError) as e:
+        session.log("Error while starting the journal!", e)
+        session.journal = None
+    return False
+
+def run_all():
+    """Synchronize every profile of the configurations concurrently
+    with :ref:`run_jobs <run-jobs>` (every profile is synchronized by a
+    separate arXive process in no-interruption mode), then print the
+    combined summary. With `--resume` the interrupted syncs of the profiles
+    are resumed.
+
+    :return: The exit code of the runner (`1` if any job failed).
+    :rtype: int
+    """
+
+    try:
+        session = Session()
+        session.log("Session log created.")
+    except (FileNotFoundError, PermissionError, OSError) as e:
+        print(f"Error while creating session log: {e}")
+        return 1
+    try:
+        config = Config()
+        session.log("Configurations loaded.")
+    except (FileNotFoundError, PermissionError, OSError) as e:
+        session.log("Error while loading configurations!", e)
+        return 1
+
+    try:
+        jobs = [Job(name, profile, "--resume" in argv[4:])
+                for name, profile in config.profiles.items()]
+    except (KeyError, TypeError) as e:
+        session.log("Error: Invalid profile in the configurations!", e)
+        return 1
+    if not jobs:
+        session.log("Error: No profiles in the configurations!")
+        return 1
+    if not (isinstance(config.jobs, int) and config.jobs >= 1
+            and isinstance(config.jobs_per_device, int)
+            and config.jobs_per_device >= 1):
+        session.log("Error: jobs and jobs_per_device must be at least 1 "
+                    "in the configurations!")
+        return 1
+
+    session.log(f"Running {len(jobs)} profile(s), {config.jobs} at a time "
+                f"({config.jobs_per_device} per device)...\n")
+    run_jobs(session, jobs, config.jobs, config.jobs_per_device)
+    session.log(f"\nSummary:\n{format_summary(jobs)}")
+    return 0 if all(job.returncode == 0 for job in jobs) else 1
+
+def main():
+    """arXive CLI script.
+
+    The purpose of the script is to run the arXive application in a command line
+    environment. Details on usage can be found in the
+    `README <https://github.com/gaaldvd/arxive?tab=readme-ov-file#arxive>`_
+    of the repository.
+    `Technical documentation <https://arxive.readthedocs.io/en/latest/reference.html>`_
+    is also available for developers.
+
+    :var Session session: Handles the arXive session.
+    :var Config config: Holds and handles configurations.
+    :var bool no_interrupt: Shows if no-interruption mode is active
+        for the current session.
+    """
+
+    # Running every profile
+    if "--all" in argv[4:]:
+        close(run_all())
+
+    session, config, no_interrupt = start_session(argv[1], argv[2])
+
+    # Rebuilding the directory index if requested
+    if "--rebuild-index" in argv[4:]:
+        session.log("Rebuilding directory index...")
+        try:
+            session.update_index(rebuild=True)
+            session.log("Directory index rebuilt.")
+        except (PermissionError, OSError) as e:
+            session.log("Error while rebuilding directory index!", e)
+
+    # Resuming an interrupted sync: the deletions were already handled
+    # (except in single-pass mode, where rsync deletes them), the syncs are
+    # only journaled if it is set in the configurations or when resuming
+    resume = "--resume" in argv[4:]
+    if (config.journal or resume) and start_journal(session, resume):
+        session.log("Resuming the interrupted sync, the deletions were "
+                    "already handled.")
+    else:
+
+        # Getting list of deletions from the source, the number of deletions
+        # is shown while they are listed
+        session.log("Listing deletions...\n")
+        session.deletions = []
+        listed = False
+        try:
+            for entity in session.iter_deletions():
+                session.deletions.append(entity)
+                if stdout.isatty() and len(session.deletions) % 1000 == 0:
+                    stdout.write(f"\r  {len(session.deletions)} "
+                                 f"deletion(s)...")
+                    stdout.flush()
+            listed = True
+        except CalledProcessError as e:
+            session.log(f"Error while listing deletions ({e.returncode})!",
+                        e.stderr)
+        if stdout.isatty():
+            stdout.write("\r\033[K")
+
+        # Prompting the user for deletions and deleting files/directories
+        # (every deleted directory is listed and prompted for as one entry),
+        # a partial list is not handled (it could miss protected entries)
+        if not listed:
+            session.log("\nThe deletions are not handled, since they could "
+                        "not be listed completely.\n")
+            session.deletions = []
         else:
-            entities = [path.join(session.destination, entity)
-                        for entity in session.deletions
-                        if input(f"Delete "
-                                 f"{shorten_path(
-                                     path.join(session.destination, entity), 
-                                     TERMINAL_SIZE - 16)}"
-                                 f" [Y/n]: ").strip().lower() != "n"]
-            session.deleted = 0
-            for entity in entities:
-                try:
-                    session.delete_entity(entity)
-                    session.deleted += 1
-                    session.log(f"{shorten_path(entity, TERMINAL_SIZE - 10)}"
-                                f" deleted.")
-                except (FileNotFoundError, PermissionError, OSError) as e:
-                    session.log(f"Error while deleting "
-                                f"{shorten_path(entity, TERMINAL_SIZE - 22)}"
-                                f"!", e)
-            session.log(f"\n{session.deleted} entities deleted.")
+            session.log(f"\n{len(session.deletions)} deletion(s) found.\n")
+        if len(session.deletions) > 0:
+            tree = print_deletions(session)
+            prompt_deletions(session, no_interrupt, tree)
+        if session.journal and listed:
+            session.journal.checkpoint("deleted",
+                                       entities=session.deleted or 0)
+
+        # Estimating the cost of the sync (not with the native and
+        # indexed engines, unless a dry-run was done anyway, they are used
+        # to avoid the dry-run)
+        if session.records is not None or session.engine == "rsync":
+            try:
+                session.log(describe_estimate(session.estimate()))
+            except CalledProcessError as e:
+                session.log(f"Error while estimating the sync "
+                            f"({e.returncode})!", e.stderr)
 
     # Synchronizing source and destination with rsync
     if no_interrupt:
@@ -170,16 +567,22 @@ def main():
                             "[Y/n]: ").strip().lower()
     if sync_choice == "n":
         session.log("\nSynchronization stopped.")
+        export_metrics(session, config)
         close("Goodbye!")
     else:
         session.log(f"Syncing from {session.source} "
                     f"to {session.destination}...")
-        result = session.sync()
-        if result.returncode == 0:
+        try:
+            session.sync()
             session.log("\nSynchronization finished. Goodbye!")
-        else:
+        except CalledProcessError as e:
             session.log("Warning: something went wrong "
-                             "while running rsync!", result.returncode)
+                        "while running rsync!", e.returncode)
+        export_metrics(session, config)
+
+        # Passing on the exit code of rsync (e.g. to the job runner)
+        if session.returncode:
+            close(session.returncode)
 
 
 if __name__ == '__main__':
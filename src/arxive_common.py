@@ -21,13 +21,29 @@ Check the documentation for details: https://arxive.readthedocs.io
     along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 
+import re
+import sys
+from codecs import getincrementaldecoder
 from json import load, dump
-from subprocess import run, CalledProcessError
-from os import path, remove, rmdir
+from subprocess import (Popen, PIPE, STDOUT, CalledProcessError,
+                        CompletedProcess)
+from tempfile import TemporaryFile, NamedTemporaryFile
+from contextlib import contextmanager, nullcontext
+from os import (path, scandir, open as open_fd, close as close_fd, unlink,
+                rmdir, makedirs, rename, link, stat, O_RDONLY, O_DIRECTORY,
+                O_NOFOLLOW)
 from datetime import datetime
-from os.path import expanduser
+from threading import Lock
+from time import monotonic
 
-from PySide6.QtWidgets import QFileDialog
+from arxive_records import *
+from arxive_log import LogWriter, Trace, NORMAL, VERBOSE
+from arxive_journal import PARTIAL_DIR
+
+# The core never imports Qt, and the modules only some of the runs need
+# (`concurrent.futures`, `arxive_index` with `sqlite3`, `arxive_shards`)
+# are imported where they are used, so that starting the CLI stays fast
+# (see `benchmarks/check_startup.py`)
 
 
 def validate_options(options):
@@ -50,31 +66,288 @@ def validate_options(options):
                                                 "-a", "--verbose", "-v")]
     return options
 
-def set_dir(parent, directory):
-    """Set a directory chosen by the user in a dialog window.
+def has_filters(options):
+    """Check if any of the additional options filters the transferred
+    files (`--exclude`, `--include`, `--filter`, `--files-from`, `-C` and
+    their variants), which only rsync applies to the deletions.
+
+    :param list options: Additional rsync options.
+
+    :rtype: bool
+    """
+
+    for option in options or ():
+        if option.startswith(("--exclude", "--include", "--filter",
+                              "--files-from", "--cvs-exclude")):
+            return True
+        # Short options can be grouped (e.g. -zC)
+        if (option.startswith("-") and not option.startswith("--")
+                and set(option[1:]) & set("fFC")):
+            return True
+    return False
 
-    :param MainWindow or ConfigDialog parent: The window from which
-        the dialog is opened.
-    :param str directory: The type of the directory (source or destination).
+def stream_lines(cmd, started=None):
+    """Run a command and read its output line by line as it arrives.
+
+    The output is read through a pipe, while the error messages are
+    collected in a temporary file so that the command cannot get blocked
+    on a full stderr pipe. The command is stopped if the caller stops
+    reading the lines.
+
+    :param list cmd: The command and its arguments.
+    :param callable started: Called with the `subprocess.Popen` object
+        of the command once it is started.
+
+    :return: Generator of the lines of the standard output.
+    :rtype: generator
+
+    :raises CalledProcessError: If the command exits with a non-zero code.
     """
 
-    # Opening a dialog for choosing the directory
-    dir_path = QFileDialog.getExistingDirectory(
-        parent=parent, caption=f"Select {directory}", dir=expanduser("~"))
-
-    # If the parent is the main window the 'Run sync' button is disabled and the
-    # directories get validated when the 'List deletions' button is pressed
-    if dir_path:
-        if parent.objectName() == "MainWindow":
-            parent.syncButton.setEnabled(False)
-        if directory == "source":
-            parent.sourceEdit.setText(dir_path)
-            if parent.objectName() == "MainWindow":
-                parent.session.log(f"{directory.capitalize()}: {dir_path}")
+    with TemporaryFile() as errors:
+        process = Popen(cmd, stdout=PIPE, stderr=errors, text=True)
+        if started:
+            started(process)
+        try:
+            yield from process.stdout
+            process.wait()
+        finally:
+            if process.poll() is None:
+                process.terminate()
+                process.wait()
+            process.stdout.close()
+
+        if process.returncode != 0:
+            errors.seek(0)
+            raise CalledProcessError(
+                process.returncode, cmd,
+                stderr=errors.read().decode(errors="replace"))
+
+def get_transfer_root(source):
+    """Return the directory that the paths of a transfer are relative to:
+    `source` itself if it has a trailing slash, otherwise its parent
+    directory (just like rsync).
+
+    :param str source: The source directory.
+
+    :return: The root of the transfer on the source side.
+    :rtype: str
+    """
+
+    if source.endswith("/"):
+        return source
+    return path.join(path.dirname(source) or ".", "")
+
+def list_subtree(root, rel):
+    """List a directory of the destination recursively, children first,
+    the same way rsync reports a deleted directory.
+
+    :param str root: The root of the transfer on the destination.
+    :param str rel: The path of the directory relative to `root`.
+
+    :return: The relative paths of the entities in the directory followed by
+        the directory itself (with a trailing `/`).
+    :rtype: list
+    """
+
+    entities = []
+    with scandir(path.join(root, rel)) as entries:
+        for entry in sorted(entries, key=lambda e: e.name, reverse=True):
+            entity = f"{rel}/{entry.name}"
+            if entry.is_dir(follow_symlinks=False):
+                entities.extend(list_subtree(root, entity))
+            else:
+                entities.append(entity)
+    entities.append(f"{rel}/")
+    return entities
+
+def _compare_dirs(source_root, dest_root, rel):
+    """Compare one directory of the source and the destination with a sorted
+    merge-join of their entries.
+
+    :param str source_root: The root of the transfer on the source.
+    :param str dest_root: The root of the transfer on the destination.
+    :param str rel: The path of the directory relative to the roots.
+
+    :return: The deletions found in the directory and the common
+        subdirectories that need to be compared as well.
+    :rtype: tuple
+    """
+
+    with scandir(path.join(source_root, rel)) as entries:
+        source = sorted(((e.name, e.is_dir(follow_symlinks=False))
+                         for e in entries), reverse=True)
+    with scandir(path.join(dest_root, rel)) as entries:
+        dest = sorted(((e.name, e.is_dir(follow_symlinks=False))
+                       for e in entries), reverse=True)
+
+    # Walking both (reverse sorted) lists at the same time, every entry of
+    # the destination that is missing from the source is a deletion
+    deletions, subdirs = [], []
+    i = 0
+    for name, is_dir in dest:
+        while i < len(source) and source[i][0] > name:
+            i += 1
+        entity = f"{rel}/{name}" if rel else name
+        if i < len(source) and source[i][0] == name:
+            if is_dir and source[i][1]:
+                subdirs.append(entity)
+        elif is_dir:
+            deletions.extend(list_subtree(dest_root, entity))
         else:
-            parent.destEdit.setText(dir_path)
-            if parent.objectName() == "MainWindow":
-                parent.session.log(f"{directory.capitalize()}: {dir_path}")
+            deletions.append(entity)
+    return deletions, subdirs
+
+def scan_deletions(source, destination, workers=16, errors=None):
+    """Find the files and directories that have been deleted from `source`
+    but are still present on `destination` without running rsync.
+
+    Both trees are read with `os.scandir` and compared directory by
+    directory, the subdirectories are distributed over a thread pool since
+    listing directories (especially on network mounts) is mostly waiting.
+    Just like rsync, a source without a trailing slash is synchronized into
+    a directory of the same name on the destination.
+
+    :param str source: The source directory.
+    :param str destination: The destination directory.
+    :param int workers: The number of threads listing directories.
+    :param list errors: Collects the directories that could not be read
+        (if omitted, the errors are ignored).
+
+    :return: Generator of the paths of deleted entities relative to
+        `destination` (directories with a trailing `/`).
+    :rtype: generator
+    """
+
+    # Setting the roots of the transfer
+    if source.endswith("/"):
+        source_root, dest_root, prefix = source, destination, ""
+    else:
+        name = path.basename(source)
+        source_root = path.dirname(source)
+        dest_root = destination
+        prefix = name
+        if not path.isdir(path.join(destination, name)):
+            return
+
+    from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = {executor.submit(_compare_dirs, source_root,
+                                   dest_root, prefix): prefix}
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                rel = pending.pop(future)
+                try:
+                    deletions, subdirs = future.result()
+                except OSError as e:
+                    if errors is not None:
+                        errors.append(f"{rel or '.'}: {e}")
+                    continue
+                yield from deletions
+                for subdir in subdirs:
+                    pending[executor.submit(_compare_dirs, source_root,
+                                            dest_root, subdir)] = subdir
+
+
+def _remove_tree(parent_fd, name, rel, failures):
+    """Delete a directory with everything in it, bottom-up, using file
+    descriptors so that no path has to be resolved more than once.
+
+    :param int parent_fd: File descriptor of the parent directory.
+    :param str name: The name of the directory in the parent directory.
+    :param str rel: The path of the directory (for the error messages).
+    :param list failures: Collects the entities that could not be deleted.
+
+    :return: Whether the directory got deleted.
+    :rtype: bool
+    """
+
+    try:
+        fd = open_fd(name, O_RDONLY | O_DIRECTORY | O_NOFOLLOW,
+                     dir_fd=parent_fd)
+    except OSError as e:
+        failures.append((rel, e))
+        return False
+
+    try:
+        with scandir(fd) as entries:
+            entries = list(entries)
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                _remove_tree(fd, entry.name, f"{rel}{entry.name}/", failures)
+            else:
+                try:
+                    unlink(entry.name, dir_fd=fd)
+                except OSError as e:
+                    failures.append((f"{rel}{entry.name}", e))
+    except OSError as e:
+        failures.append((rel, e))
+    finally:
+        close_fd(fd)
+
+    try:
+        rmdir(name, dir_fd=parent_fd)
+        return True
+    except OSError as e:
+        failures.append((rel, e))
+        return False
+
+def _delete_group(root_fd, parent, names, failures):
+    """Delete entities of the same parent directory.
+
+    :param int root_fd: File descriptor of the destination.
+    :param str parent: The path of the parent directory relative to the
+        destination.
+    :param list names: The names of the entities, directories with
+        a trailing `/` are deleted with all their contents.
+    :param list failures: Collects the entities that could not be deleted.
+
+    :return: The names that got deleted.
+    :rtype: list
+    """
+
+    try:
+        parent_fd = (open_fd(parent, O_RDONLY | O_DIRECTORY, dir_fd=root_fd)
+                     if parent else root_fd)
+    except OSError as e:
+        failures.extend((path.join(parent, name), e) for name in names)
+        return []
+
+    deleted = []
+    try:
+        for name in names:
+            rel = path.join(parent, name)
+            if name.endswith("/"):
+                if _remove_tree(parent_fd, name[:-1], rel, failures):
+                    deleted.append(name)
+            else:
+                try:
+                    unlink(name, dir_fd=parent_fd)
+                    deleted.append(name)
+                except OSError as e:
+                    failures.append((rel, e))
+    finally:
+        if parent_fd != root_fd:
+            close_fd(parent_fd)
+    return deleted
+
+
+def protect_rule(entity):
+    """Create an rsync filter rule protecting an entity from deletion.
+
+    :param str entity: The path of the entity relative to the destination
+        (with a trailing `/` for directories).
+
+    :return: The filter rule anchored to the root of the transfer.
+    :rtype: str
+    """
+
+    # Backslashes are only escape characters in patterns with wildcards
+    if any(char in entity for char in "*?["):
+        for char in "\\*?[":
+            entity = entity.replace(char, f"\\{char}")
+    return f"P /{entity}"
 
 
 class Config:
@@ -88,7 +361,27 @@ class Config:
         {
             "source": "/path/to/source",
             "destination": "/path/to/destination",
-            "options": ["--progress", "-l"]
+            "options": ["--progress", "-l"],
+            "engine": "rsync",
+            "single_pass": false,
+            "debounce": 2.0,
+            "verbosity": 1,
+            "trace": null,
+            "metrics_dir": null,
+            "console_lines": 10000,
+            "deletion_rules": [],
+            "profiles": {
+                "documents": {
+                    "source": "/home/me/Documents",
+                    "destination": "/mnt/backup",
+                    "options": ["-l"]
+                }
+            },
+            "jobs": 4,
+            "jobs_per_device": 1,
+            "shards": 1,
+            "detect_moves": false,
+            "journal": false
         }
 
     :ivar str config_path: The path to the JSON file with the configurations.
@@ -96,6 +389,35 @@ class Config:
     :ivar str source: The source directory.
     :ivar str destination: The destination directory.
     :ivar list options: Additional options passed to the rsync command.
+    :ivar str engine: The engine listing the deletions (`rsync`, `native`
+        or `indexed`).
+    :ivar bool single_pass: Let rsync delete the chosen deletions
+        during the sync.
+    :ivar float debounce: Seconds of inactivity after which the changes
+        collected in watch mode are synchronized.
+    :ivar int verbosity: Console verbosity, 0: quiet, 1: normal,
+        2: every deleted entity is printed.
+    :ivar str trace: The path to the JSON-lines event trace
+        (see :ref:`Trace <trace-class>`), `None` to disable tracing.
+    :ivar str metrics_dir: The directory of the Prometheus textfile
+        collector the metrics of CLI sessions are written into,
+        `None` to disable the export.
+    :ivar int console_lines: The number of lines kept in the console
+        of the GUI (`0` keeps every line).
+    :ivar list deletion_rules: The ordered rules choosing the deletions in
+        no-interruption mode (see :ref:`DeletionRules <deletionrules-class>`).
+    :ivar dict profiles: Named source/destination/options triples
+        (run together by :ref:`run_jobs <run-jobs>`).
+    :ivar int jobs: The number of profiles synchronized at the same time.
+    :ivar int jobs_per_device: The number of profiles synchronized at the
+        same time on the same device (of the source or the destination).
+    :ivar int shards: The number of parallel rsync processes listing the
+        deletions and synchronizing (`1` runs a single rsync process).
+    :ivar bool detect_moves: Move the deleted files found on the source
+        under a new path on the destination instead of transferring them
+        again.
+    :ivar bool journal: Keep a :ref:`Journal <journal-class>` of every CLI
+        sync, so that it can be resumed (with `--resume`).
 
     Methods:
         load():
@@ -113,6 +435,20 @@ class Config:
         self.source = self.config_data['source']
         self.destination = self.config_data['destination']
         self.options = self.config_data['options']
+        self.engine = self.config_data.get('engine', "rsync")
+        self.single_pass = self.config_data.get('single_pass', False)
+        self.debounce = self.config_data.get('debounce', 2.0)
+        self.verbosity = self.config_data.get('verbosity', 1)
+        self.trace = self.config_data.get('trace')
+        self.metrics_dir = self.config_data.get('metrics_dir')
+        self.console_lines = self.config_data.get('console_lines', 10000)
+        self.deletion_rules = self.config_data.get('deletion_rules', [])
+        self.profiles = self.config_data.get('profiles', {})
+        self.jobs = self.config_data.get('jobs', 4)
+        self.jobs_per_device = self.config_data.get('jobs_per_device', 1)
+        self.shards = self.config_data.get('shards', 1)
+        self.detect_moves = self.config_data.get('detect_moves', False)
+        self.journal = self.config_data.get('journal', False)
 
     def load(self):
         """Load configurations from `config_path`.
@@ -141,7 +477,20 @@ class Config:
         # if the file was missing
         with open(self.config_path, 'w', encoding="utf-8") as file:
             config = {"source": self.source, "destination": self.destination,
-                      "options": self.options}
+                      "options": self.options, "engine": self.engine,
+                      "single_pass": self.single_pass,
+                      "debounce": self.debounce,
+                      "verbosity": self.verbosity,
+                      "trace": self.trace,
+                      "metrics_dir": self.metrics_dir,
+                      "console_lines": self.console_lines,
+                      "deletion_rules": self.deletion_rules,
+                      "profiles": self.profiles,
+                      "jobs": self.jobs,
+                      "jobs_per_device": self.jobs_per_device,
+                      "shards": self.shards,
+                      "detect_moves": self.detect_moves,
+                      "journal": self.journal}
 
             # Serializing dictionary to JSON data
             dump(config, file)
@@ -150,40 +499,167 @@ class Config:
 class Session:
     """Handles an arXive session.
 
-    :ivar str log_path: The path to the session log.
+    :ivar str log_path: The path to the session log (`session.log` in the
+        installation folder unless another path is passed).
+    :ivar LogWriter writer: Writes the session log on a background thread.
+    :ivar int verbosity: The console verbosity (`QUIET`, `NORMAL` or
+        `VERBOSE`).
     :ivar str source: The source directory.
     :ivar str destination: The destination directory.
     :ivar list options: Additional options passed to the rsync command.
+    :ivar str engine: The engine listing the deletions, `rsync` (dry-run),
+        `native` (see :ref:`scan_deletions <scan-deletions>`) or `indexed`
+        (see :ref:`DirectoryIndex <directoryindex-class>`).
+    :ivar bool single_pass: Delete the chosen deletions with rsync
+        in the same pass as the sync instead of deleting them beforehand.
+    :ivar int shards: The number of parallel rsync processes (see
+        :ref:`plan_shards <plan-shards>`), a local source is split into
+        shards if it is more than `1`.
+    :ivar bool detect_moves: Move the deleted files found on `source` under
+        a new path before the sync (see :ref:`move_entities
+        <move-entities>`).
+    :ivar int moved: The number of new files moved or linked from
+        deletions on `destination`.
+    :ivar int moved_bytes: The size of the moved and linked files.
     :ivar list deletions: The list of files/directories deleted from `source`.
+    :ivar list chosen: The deletions chosen to be deleted.
+    :ivar DeletionRules rules: Choose the deletions in no-interruption mode
+        (`None` deletes everything).
+    :ivar PlanRecords records: The records of the last itemized dry-run.
+    :ivar Trace trace: The JSON-lines event trace (`None` if not traced).
+    :ivar dict timings: The durations of the phases of the session
+        in seconds.
+    :ivar bool collect_stats: Run the sync with `--stats` and keep the
+        statistics of rsync in `stats`.
+    :ivar dict stats: The statistics of the last sync
+        (see :ref:`parse_stats <parse-stats>`).
+    :ivar int returncode: The exit code of the last sync.
+    :ivar int failed: The number of entities that could not be deleted.
+    :ivar callable progress_callback: Receives the overall progress of the
+        sync (see :ref:`parse_progress <parse-progress>`) at most every
+        `progress_interval` seconds, and `None` before other output of
+        rsync is written (so that the progress line can be cleared). If set,
+        rsync is run with `--info=progress2`.
+    :ivar subprocess.Popen process: The last rsync process started.
+    :ivar list processes: The rsync processes started (the running ones
+        are terminated by :ref:`cancel <cancel>`).
+    :ivar threading.Lock lock: Guards `processes` (the rsync processes of
+        the shards are started by several threads).
+    :ivar bool cancelled: Shows if the running operation was cancelled
+        (see :ref:`cancel <cancel>`).
+    :ivar Journal journal: The journal of the sync (`None` if the sync is
+        not journaled). Journaled syncs keep the partially transferred
+        files (in `PARTIAL_DIR`) and the shards already synchronized are
+        skipped when the sync is resumed.
+    :ivar tuple shard_plan: The shards and the split directories of the
+        source with the modification times of the latter (the sync reuses
+        the shards of the listing while the split directories are
+        unchanged).
 
     Methods:
         init_log():
             Initializes the session log.
 
-        log(msg, exception=None):
+        log(msg, exception=None, level=NORMAL):
             Writes messages to the standard output and the session log.
 
+        flush_log():
+            Waits until the messages are written into the session log.
+
+        start_trace(trace_path):
+            Starts the JSON-lines event trace.
+
+        trace_event(name, **fields):
+            Writes an event into the trace.
+
+        phase(name, **fields):
+            Context manager tracing a phase of the session.
+
+        run_rsync(cmd, lines=False):
+            Runs rsync and traces the invocation.
+
+        cancel():
+            Cancels the running operation.
+
+        dry_run():
+            Streams the records of an itemized dry-run.
+
+        iter_deletions():
+            Streams deletions from the source.
+
         get_deletions():
             Lists deletions from the source.
 
-        delete_entity(entity_path):
-            Deletes a file or directory.
+        sharded():
+            Checks if the source is split into shards.
 
-        sync():
+        deletion_tree():
+            Returns the deletions in a path trie.
+
+        estimate():
+            Estimates the cost of the sync.
+
+        delete_entities(entities, workers=8):
+            Deletes files and directories.
+
+        move_entities(entities, workers=8):
+            Moves the deleted files found under a new path.
+
+        transfer_root():
+            Returns the directory the transferred paths are relative to.
+
+        sync(files_from=None):
             Runs rsync to synchronize the source with the destination.
+
+        update_index(rebuild=False):
+            Updates the directory index of the source and the destination.
     """
 
+    # Minimum number of seconds between two progress updates
+    progress_interval = 0.25
+
     # arXive installation folder
     log_path = (f"{path.dirname(path.dirname(path.abspath(__file__)))}"
                 f"/session.log")
 
-    def __init__(self):
-        self.init_log()
+    def __init__(self, log_path=None):
+        if log_path:
+            self.log_path = log_path
+        self.writer = self._open_log()
+        self.verbosity = NORMAL
         self.source = None
         self.destination = None
         self.options = None
+        self.engine = "rsync"
+        self.single_pass = False
+        self.shards = 1
+        self.detect_moves = False
+        self.moved = 0
+        self.moved_bytes = 0
         self.deletions = None
+        self.chosen = None
+        self.rules = None
+        self.records = None
         self.deleted = None
+        self.trace = None
+        self.timings = {}
+        self.collect_stats = False
+        self.stats = {}
+        self.returncode = None
+        self.failed = 0
+        self.progress_callback = None
+        self.process = None
+        self.processes = []
+        self.lock = Lock()
+        self.cancelled = False
+        self.journal = None
+        self.shard_plan = None
+
+    def _open_log(self):
+        """Initialize the session log and start its writer."""
+
+        self.init_log()
+        return LogWriter(self.log_path)
 
     def init_log(self):
         """Initialize the session log in the installation folder."""
@@ -194,75 +670,833 @@ class Session:
                       f"{datetime.now().strftime("%Y %b %d. - %X")}\n"
                       f"=============================================\n")
 
-    def log(self, msg, exception=None):
+    def log(self, msg, exception=None, level=NORMAL):
         """Print messages and status updates to the standard output
         and write them into the session log.
 
+        The messages are written by a :ref:`LogWriter <logwriter-class>`
+        in batches on a background thread.
+
         :param str msg: The message to print.
         :param Exception or int exception: Exception or `subprocess.run` result
             code forwarded with the message.
+        :param int level: The message is only printed if `verbosity` is at
+            least `level` (`VERBOSE` messages, e.g. the deleted entities,
+            only go to the session log by default).
         """
 
-        print(msg)
+        if level <= self.verbosity:
+            print(msg)
 
         # If there is an `exception` it gets attached to the message
         # and written into the session log
         if exception:
             msg = f"{msg} - {exception}"
-        with open(self.log_path, 'a', encoding="utf-8") as log:
-            log.write(f"{msg}\n")
+            self.trace_event("error", message=msg)
+        self.writer.write(f"{msg}\n")
+
+    def flush_log(self):
+        """Wait until every message is written into the session log."""
+
+        self.writer.flush()
+
+    def start_trace(self, trace_path):
+        """Start writing the events of the session into a JSON-lines
+        :ref:`Trace <trace-class>` (next to the human-readable session log).
+
+        :param str trace_path: The path to the trace file (the events are
+            appended to it).
+        """
+
+        self.trace = Trace(trace_path, source=self.source,
+                           destination=self.destination, engine=self.engine)
+
+    def trace_event(self, name, **fields):
+        """Write an event into the trace (if the session is traced).
+
+        :param str name: The name of the event.
+        :param fields: The data of the event.
+        """
+
+        if self.trace:
+            self.trace.event(name, **fields)
+
+    @contextmanager
+    def phase(self, name, **fields):
+        """Measure the duration of a phase (added to `timings`) and trace
+        its start and end.
+
+        :param str name: The name of the phase.
+        :param fields: The data written with the start of the phase.
+        """
+
+        start = monotonic()
+        try:
+            with (self.trace.phase(name, **fields) if self.trace
+                  else nullcontext()):
+                yield
+        finally:
+            self.timings[name] = (self.timings.get(name, 0.0)
+                                  + monotonic() - start)
+
+    def run_rsync(self, cmd, lines=False):
+        """Run rsync and trace the invocation (arguments, exit code and
+        duration).
+
+        :param list cmd: The rsync command.
+        :param bool lines: Stream the lines of the output
+            (see :ref:`stream_lines <stream-lines>`) instead of running
+            rsync with the inherited standard output.
+
+        :return: Generator of the lines of the output or the result object
+            of the `subprocess.run` method.
+        :rtype: generator or subprocess.CompletedProcess
+
+        :raises CalledProcessError: If rsync exits with a non-zero code.
+        """
+
+        if lines:
+            return self._trace_lines(cmd)
+        start = monotonic()
+        try:
+            result = self._tee_output(cmd)
+        except CalledProcessError as e:
+            self.trace_event("rsync", argv=cmd, returncode=e.returncode,
+                             duration=round(monotonic() - start, 6))
+            raise
+        self.trace_event("rsync", argv=cmd, returncode=result.returncode,
+                         duration=round(monotonic() - start, 6))
+        return result
+
+    def _tee_output(self, cmd):
+        """Run rsync, pass its output (and its error messages) on to the
+        standard output as it arrives and parse the statistics at its end
+        into `stats`.
+
+        If there is a `progress_callback`, the progress lines are passed
+        to it (throttled) instead of the standard output. The end of the
+        output is kept in the `stdout` of the result (and the `output` of
+        the exception).
+        """
+
+        decoder = getincrementaldecoder("utf-8")(errors="replace")
+        tail, pending = "", ""
+        last, shown = None, 0.0
+        process = Popen(cmd, stdout=PIPE, stderr=STDOUT)
+        self._started(process)
+        try:
+            while chunk := process.stdout.read1(65536):
+                text = decoder.decode(chunk)
+
+                # Keeping the end of the output for the statistics
+                tail = (tail + text)[-8192:]
+                if not self.progress_callback:
+                    sys.stdout.write(text)
+                    sys.stdout.flush()
+                    continue
+
+                # Splitting the output after line feeds and carriage
+                # returns, the progress lines end with the latter
+                *segments, pending = re.split(r"(?<=[\r\n])",
+                                              pending + text)
+                for segment in segments:
+                    progress = parse_progress(segment)
+                    if progress:
+                        last = progress
+                        if (monotonic() - shown >= self.progress_interval
+                                or progress["percent"] == 100):
+                            self.progress_callback(progress)
+                            shown = monotonic()
+                    elif segment.strip():
+                        self.progress_callback(None)
+                        sys.stdout.write(segment.replace("\r", "\n"))
+                        sys.stdout.flush()
+        finally:
+            process.stdout.close()
+            returncode = process.wait()
+
+        # Showing the final progress, then ending the progress line
+        if self.progress_callback:
+            if last:
+                self.progress_callback(last)
+            self.progress_callback(None)
+            if pending.strip():
+                sys.stdout.write(pending)
+                sys.stdout.flush()
+        self.stats = parse_stats(tail)
+        if returncode:
+            raise CalledProcessError(returncode, cmd, output=tail)
+        return CompletedProcess(cmd, returncode, stdout=tail)
+
+    def _started(self, process):
+        """Keep the running rsync processes so that they can be
+        cancelled.
+        """
+
+        with self.lock:
+            self.process = process
+            self.processes[:] = [running for running in self.processes
+                                 if running.poll() is None]
+            self.processes.append(process)
+            if self.cancelled:
+                process.terminate()
+
+    def cancel(self):
+        """Cancel the running operation: the running rsync processes are
+        terminated (rsync removes its temporary files on `SIGTERM`) and
+        `cancelled` is set for the listing of the deletions.
+        """
+
+        with self.lock:
+            self.cancelled = True
+            processes = list(self.processes)
+        for process in processes:
+            if process.poll() is None:
+                process.terminate()
+
+    def _trace_lines(self, cmd):
+        """Stream the output of rsync and trace the invocation."""
+
+        start, returncode = monotonic(), None
+        try:
+            yield from stream_lines(cmd, started=self._started)
+            returncode = 0
+        except CalledProcessError as e:
+            returncode = e.returncode
+            raise
+        finally:
+            self.trace_event("rsync", argv=cmd, returncode=returncode,
+                             duration=round(monotonic() - start, 6))
+
+    def dry_run(self):
+        """Stream the records of an itemized rsync dry-run (with `--delete`
+        and the additional options) and store them in `records`.
+
+        :return: Generator of the records (kind, size and path, see
+            :ref:`parse_record <parse-record>`).
+        :rtype: generator
+
+        :raises CalledProcessError: If rsync exits with a non-zero code.
+        """
+
+        self.records = PlanRecords()
+        for line in self.run_rsync(self._dry_run_cmd(), lines=True):
+            record = parse_record(line)
+            if record:
+                self.records.append(*record)
+                yield record
+
+    def _dry_run_cmd(self):
+        """Return the command of the itemized dry-run (see
+        :ref:`dry_run <dry-run>`).
+        """
+
+        cmd = ["rsync", "-a", "--delete", "--dry-run", RECORD_FORMAT]
+        if self.options:
+            cmd.extend(self.options)
+        cmd.extend(self._partial_dir())
+        cmd.extend([self.source, self.destination])
+        return cmd
+
+    def _partial_dir(self):
+        """Return the option keeping the partially transferred files of a
+        journaled sync in `PARTIAL_DIR` (rsync refuses it together with
+        `--inplace` and `--append`, and the user's own `--partial-dir`
+        is kept).
+
+        :return: The options to add.
+        :rtype: list
+        """
+
+        if not self.journal or any(
+                option in ("--inplace", "--append", "--append-verify")
+                or option.startswith("--partial-dir")
+                for option in self.options or ()):
+            return []
+        return [f"--partial-dir={PARTIAL_DIR}"]
+
+    def iter_deletions(self):
+        """Stream the files and directories that have been deleted from
+        `source` but are still present on `destination`.
+
+        The output of the rsync :ref:`dry-run <dry-run>` is parsed line by
+        line as it arrives, so the first deletions are available right away
+        and only the changes are kept in memory (in `records`). If `engine`
+        is `native`, the trees are compared by
+        :ref:`scan_deletions <scan-deletions>` instead of rsync (unless
+        `options` filter the files, see :ref:`has_filters <has-filters>`).
+
+        :return: Generator of the paths of deleted entities.
+        :rtype: generator
+
+        :raises CalledProcessError: If rsync exits with a non-zero code
+            or (with the `native` engine) a directory cannot be read.
+        """
+
+        # The files moved after an earlier listing are not counted again,
+        # the source is split into shards again
+        self.moved, self.moved_bytes = 0, 0
+        self.shard_plan = None
+
+        # The partially transferred files of journaled syncs are kept
+        with self.phase("list_deletions", engine=self.engine):
+            for entity in self._iter_deletions():
+                if f"/{PARTIAL_DIR}/" not in f"/{entity}":
+                    yield entity
+
+    def _iter_deletions(self):
+        """Stream the deletions with the engine of the session
+        (see :ref:`iter_deletions <iter-deletions>`).
+        """
+
+        # The filter options (--exclude etc.) are only applied by rsync
+        native = self.engine in ("native", "indexed")
+        if native and has_filters(self.options):
+            self.log(f"The {self.engine} engine ignores the filter options, "
+                     "listing the deletions with rsync.")
+            native = False
+
+        if native:
+            self.records = None
+            if self.engine == "native":
+                errors = []
+                yield from scan_deletions(self.source, self.destination,
+                                          errors=errors)
+            else:
+                from arxive_index import DirectoryIndex
+                index = DirectoryIndex(self.source, self.destination)
+                try:
+                    yield from index.scan_deletions()
+                finally:
+                    index.close()
+                errors = index.errors
+
+            # Reporting unreadable directories the same way as rsync does
+            # (partial transfer due to error)
+            if errors:
+                raise CalledProcessError(
+                    23, ["scandir", self.source, self.destination],
+                    stderr="\n".join(errors))
+            return
+
+        # Listing the deletions with parallel rsync processes
+        if self.sharded() and path.isdir(self.destination):
+            yield from self._iter_sharded_deletions()
+            return
+
+        # Doing an itemized dry-run of `rsync --delete` and passing on only
+        # the deletions (the other records are kept for the estimate)
+        for kind, _, entity in self.dry_run():
+            if kind == DELETE:
+                yield entity
+
+    def sharded(self):
+        """Check if the source is split into shards (`shards` is more than
+        `1`, the source is a local directory and `options` do not filter
+        the files, as the split directories are compared without rsync).
+
+        :rtype: bool
+        """
+
+        return (self.shards > 1 and path.isdir(self.source)
+                and not has_filters(self.options))
+
+    def _plan_shards(self):
+        """Split the source into shards (see :ref:`plan_shards
+        <plan-shards>`), or take the shards of the sync being resumed
+        from the `journal`. The shards are kept in `shard_plan`, so that the
+        source is only measured again if a split directory changed.
+
+        :return: The shards and the split directories.
+        :rtype: tuple
+
+        :raises CalledProcessError: If the source cannot be read.
+        """
+
+        from arxive_shards import Shard, plan_shards
+        state = self.journal.state if self.journal else None
+        if state and state["events"].get("sync_start", {}).get("shards"):
+            shards = []
+            for paths in state["events"]["sync_start"]["shards"]:
+                shards.append(Shard())
+                shards[-1].paths = paths
+            return shards, []
+
+        # Reusing the shards while no entry was added to or removed from the
+        # split directories (which changes their modification times)
+        root = self.transfer_root()
+        if self.shard_plan:
+            shards, split, mtimes = self.shard_plan
+            try:
+                if mtimes == [stat(path.join(root, rel)).st_mtime_ns
+                              for rel in split]:
+                    return shards, split
+            except OSError:
+                pass
+
+        prefix = "" if self.source.endswith("/") else path.basename(
+            self.source)
+        try:
+            shards, split = plan_shards(root, prefix, self.shards)
+            mtimes = [stat(path.join(root, rel)).st_mtime_ns
+                      for rel in split]
+        except OSError as e:
+            raise CalledProcessError(23, ["scandir", self.source],
+                                     stderr=str(e)) from e
+        self.trace_event("shards", shards=len(shards), split=len(split),
+                         sizes=[shard.size for shard in shards])
+        self.shard_plan = shards, split, mtimes
+        return shards, split
+
+    def _shard_cmd(self, cmd, shard, file_list):
+        """Complete an rsync command for a shard: its paths are passed in a
+        NUL-separated file, the directories are synchronized recursively.
+        """
+
+        file_list.write("\0".join(shard.paths))
+        file_list.flush()
+        return cmd + ["-r", f"--files-from={file_list.name}", "--from0",
+                      "--ignore-missing-args", self.transfer_root(),
+                      self.destination]
+
+    def _iter_sharded_deletions(self):
+        """Stream the deletions found by parallel itemized dry-runs,
+        one for every shard of the source.
+
+        The processes take the shards from the queue of a thread pool (the
+        biggest first), the deletions of a shard are passed on when it is
+        done. The deletions inside the directories split into shards are
+        found by comparing the directories (see
+        :ref:`plan_shards <plan-shards>`). The records of the shards are
+        merged into `records`, and if any of the dry-runs fails, the
+        highest exit code is raised after the others are done.
+        """
+
+        shards, split = self._plan_shards()
+        self.records = PlanRecords()
+        root = self.transfer_root()
+        for rel in split:
+            try:
+                deletions, _ = _compare_dirs(root, self.destination, rel)
+            except FileNotFoundError:
+                continue
+            except OSError as e:
+                raise CalledProcessError(
+                    23, ["scandir", self.source, self.destination],
+                    stderr=f"{rel or '.'}: {e}") from e
+            for entity in deletions:
+                self.records.append(DELETE, 0, entity)
+                yield entity
+
+        cmd = ["rsync", "-a", "--delete", "--dry-run", RECORD_FORMAT]
+        if self.options:
+            cmd.extend(self.options)
+        cmd.extend(self._partial_dir())
+        errors = []
+        from concurrent.futures import ThreadPoolExecutor, as_completed
+        with ThreadPoolExecutor(max_workers=self.shards) as executor:
+            futures = [executor.submit(self._dry_run_shard, cmd, shard)
+                       for shard in shards]
+            for future in as_completed(futures):
+                try:
+                    records = future.result()
+                except CalledProcessError as e:
+                    errors.append(e)
+                    continue
+                for record in records:
+                    self.records.append(*record)
+                    if record[0] == DELETE:
+                        yield record[2]
+        if errors:
+            error = max(errors, key=lambda e: e.returncode)
+            raise CalledProcessError(
+                error.returncode, error.cmd,
+                stderr="\n".join(e.stderr for e in errors if e.stderr))
+
+    def _dry_run_shard(self, cmd, shard):
+        """Do the itemized dry-run of a shard (on a thread of the pool).
+
+        :return: The records of the dry-run.
+        :rtype: list
+        """
+
+        with NamedTemporaryFile("w", encoding="utf-8",
+                                errors="surrogateescape") as file_list:
+            return [record for record in map(parse_record, self.run_rsync(
+                self._shard_cmd(cmd, shard, file_list), lines=True))
+                    if record]
+
+    def _sync_shards(self, cmd):
+        """Synchronize the shards of the source with parallel rsync
+        processes (see :ref:`sync <sync>`).
+
+        The statistics of the processes are added up in `stats`, and if
+        any of them fails, the highest exit code is raised (with the error
+        messages of all the failed ones) after the others are done. The
+        finished shards are recorded in the `journal` (and skipped when the
+        sync is resumed).
+        """
+
+        shards, _ = self._plan_shards()
+        done = set()
+        if self.journal:
+            if self.journal.state and "sync_start" in self.journal.state[
+                    "events"]:
+                done = self.journal.state["done"]
+            else:
+                self.journal.checkpoint(
+                    "sync_start", shards=[shard.paths for shard in shards])
+        results, errors = [], []
+
+        def sync_shard(shard):
+            with NamedTemporaryFile("w", encoding="utf-8",
+                                    errors="surrogateescape") as file_list:
+                return self.run_rsync(self._shard_cmd(cmd, shard, file_list))
+
+        from concurrent.futures import ThreadPoolExecutor, as_completed
+        with ThreadPoolExecutor(max_workers=self.shards) as executor:
+            futures = {executor.submit(sync_shard, shard): index
+                       for index, shard in enumerate(shards)
+                       if index not in done}
+            for future in as_completed(futures):
+                try:
+                    results.append(future.result().stdout)
+                    if self.journal:
+                        self.journal.checkpoint("shard_done",
+                                                shard=futures[future])
+                except CalledProcessError as e:
+                    errors.append(e)
+                    results.append(e.output)
+
+        # Merging the results of the processes
+        self.stats = {}
+        for output in results:
+            for key, value in parse_stats(output or "").items():
+                self.stats[key] = self.stats.get(key, 0) + value
+        # Passing on the error messages of the failed processes (their
+        # output is merged, the messages are the lines of rsync)
+        if errors:
+            raise CalledProcessError(
+                max(e.returncode for e in errors), cmd,
+                stderr="\n".join(line for e in errors
+                                 for line in (e.output or "").splitlines()
+                                 if line.startswith("rsync")))
+        return CompletedProcess(cmd, 0)
 
     def get_deletions(self):
         """List the files and directories that have been deleted from `source`
         but are still present on `destination`.
 
-        :return: The paths of deleted entities.
-        :rtype: list
+        :return: The paths of deleted entities or the exception raised
+            by :ref:`iter_deletions <iter-deletions>`.
+        :rtype: list or CalledProcessError
         """
 
-        # Doing a dry-run of `rsync --delete` and catching the output
-        cmd = ["rsync", "-av", "--delete", "--dry-run",
-               self.source, self.destination]
-        deletions = []
         try:
-            result = run(cmd, capture_output=True, text=True, check=True)
+            return list(self.iter_deletions())
         except CalledProcessError as e:
             return e
 
-        # Extracting the list of deletions from the output
-        for line in result.stdout.splitlines():
-            if line.startswith("deleting "):
-                filepath = line[len("deleting "):].strip()
-                deletions.append(filepath)
+    def deletion_tree(self):
+        """Return `deletions` in a :ref:`DeletionTree <deletiontree-class>`,
+        with the sizes of the itemized dry-run (if there are `records`).
 
-        # Returning the list of extracted paths
-        return deletions
+        :rtype: DeletionTree
+        """
 
-    def delete_entity(self, entity_path):
-        """Delete an file or directory from the `deletions` list
-        returned by `get_deletions`.
+        sizes = {}
+        if self.records is not None:
+            sizes = {entity: size for kind, size, entity in self.records
+                     if kind == DELETE}
+        tree = DeletionTree(sized=self.records is not None)
+        for entity in self.deletions or ():
+            tree.add(entity, sizes.get(entity, 0))
+        return tree
 
-        :param str entity_path: The full path of the entity.
+    def get_profile(self):
+        """Return the name of the source/destination pair used in the
+        :ref:`ThroughputHistory <throughputhistory-class>`.
 
-        :raises FileNotFoundError: If `entity_path` cannot be found.
+        :rtype: str
         """
 
-        # Checking whether the entity is a file or a directory and deleting it
-        if path.isfile(entity_path):
-            remove(entity_path)
-            self.deleted += 1
-        elif path.isdir(entity_path):
-            rmdir(entity_path)
-            self.deleted += 1
-        else:
-            raise FileNotFoundError(f"Error: {entity_path}"
-                                    f" could not be deleted.")
+        return f"{self.source} -> {self.destination}"
+
+    def estimate(self):
+        """Estimate the cost of the sync from the `records` of the itemized
+        dry-run (a dry-run is done if there are no records yet) and the
+        throughput of the previous syncs.
+
+        :return: The number of entities to create, update and delete,
+            the bytes to send and the predicted duration in seconds
+            (`None` if there is no history).
+        :rtype: dict
+
+        :raises CalledProcessError: If rsync exits with a non-zero code.
+        """
+
+        if self.records is None:
+            with self.phase("dry_run"):
+                for _ in self.dry_run():
+                    pass
+
+        # The moved files are not transferred
+        created = self.records.count(CREATE) - self.moved
+        updated = self.records.count(UPDATE)
+        size = self.records.total_size(CREATE, UPDATE) - self.moved_bytes
+        deleted = (len(self.chosen) if self.chosen is not None
+                   else self.records.count(DELETE))
+        try:
+            seconds = ThroughputHistory().predict(
+                self.get_profile(), size, created + updated)
+        except (PermissionError, OSError, ValueError):
+            seconds = None
+        return {"created": created, "updated": updated, "deleted": deleted,
+                "bytes": size, "seconds": seconds}
+
+    def delete_entities(self, entities, workers=8):
+        """Delete the files and directories chosen from `deletions`
+        from `destination`.
+
+        A directory is deleted with everything in it if none of the
+        deletions below it were left out of `entities`, so the entities
+        inside it need no separate work. Otherwise only the chosen entities
+        are deleted from it (and the directory itself if it got empty).
+        Independent directories are deleted in parallel.
+
+        :param list entities: The paths of the entities relative to
+            `destination` (as listed by :ref:`get_deletions
+            <get-deletions>`, with a trailing `/` for directories).
+        :param int workers: The number of threads deleting entities.
+
+        :return: The paths and exceptions of the entities that could not
+            be deleted (their number is kept in `failed`).
+        :rtype: list
+        """
+
+        chosen = set(entities)
+
+        # Directories containing deletions which were not chosen
+        # cannot be deleted as a whole
+        blocked = set()
+        for entity in set(self.deletions or ()) - chosen:
+            parent = path.dirname(entity.rstrip("/"))
+            while parent and f"{parent}/" not in blocked:
+                blocked.add(f"{parent}/")
+                parent = path.dirname(parent)
+
+        # Collapsing the chosen entities to the topmost directories (sorted
+        # paths below a directory directly follow the directory), then
+        # grouping them by parent directory
+        groups, covered, emptied = {}, {}, []
+        top = None
+        for entity in sorted(chosen):
+            if top and entity.startswith(top):
+                covered[top] += 1
+                continue
+            if entity.endswith("/") and entity in blocked:
+                emptied.append(entity)
+                continue
+            if entity.endswith("/"):
+                top = entity
+            covered[entity] = 1
+            parent, name = path.split(entity.rstrip("/"))
+            groups.setdefault(parent, []).append(
+                f"{name}/" if entity.endswith("/") else name)
+
+        failures = []
+        self.deleted = 0
+        with self.phase("delete", entities=len(chosen), groups=len(groups)):
+            self._delete_groups(groups, covered, emptied, failures, workers)
+        self.failed = len(failures)
+        return failures
+
+    def _delete_groups(self, groups, covered, emptied, failures, workers):
+        """Delete the grouped entities in parallel, then the emptied
+        directories (see :ref:`delete_entities <delete-entities>`).
+        """
+
+        from concurrent.futures import ThreadPoolExecutor
+        root_fd = open_fd(self.destination, O_RDONLY | O_DIRECTORY)
+        try:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                futures = {executor.submit(_delete_group, root_fd, parent,
+                                           names, failures): parent
+                           for parent, names in groups.items()}
+                for future in futures:
+                    deleted = future.result()
+                    self.trace_event("delete_batch", parent=futures[future],
+                                     entities=len(groups[futures[future]]),
+                                     deleted=len(deleted))
+                    for name in deleted:
+                        entity = path.join(futures[future], name)
+                        self.deleted += covered[entity]
+                        self.log(f"{entity} deleted.", level=VERBOSE)
+
+            # Deleting the directories that were not deleted as a whole
+            # after their contents, the deepest first
+            for entity in sorted(emptied, reverse=True):
+                try:
+                    rmdir(entity, dir_fd=root_fd)
+                    self.deleted += 1
+                    self.log(f"{entity} deleted.", level=VERBOSE)
+                except OSError as e:
+                    failures.append((entity, e))
+        finally:
+            close_fd(root_fd)
+
+    def move_entities(self, entities, workers=8):
+        """Move the deleted files found on the source under a new path
+        (see :ref:`find_moves <find-moves>`) to their new paths on
+        `destination`, so that rsync finds them there instead of
+        transferring them again.
+
+        A chosen deletion is renamed (to its last new path), a deletion
+        which is kept or has several new paths is hard linked (no links are
+        made with `--inplace` or `--append`, rsync would change both paths).
+        The renamed files are no longer deletions. Both trees have to be
+        local, the records of a dry-run are needed (a dry-run is done if
+        there are no records yet).
+
+        :param list entities: The chosen deletions.
+        :param int workers: The number of threads hashing files.
+
+        :return: The chosen deletions still to be deleted and the paths and
+            exceptions of the files that could not be moved.
+        :rtype: tuple
+
+        :raises CalledProcessError: If rsync exits with a non-zero code.
+        """
+
+        from arxive_moves import find_moves
+
+        self.moved, self.moved_bytes = 0, 0
+        if any(":" in directory.split("/")[0]
+               for directory in (self.source, self.destination)):
+            return entities, []
+        if self.records is None:
+            with self.phase("dry_run"):
+                for _ in self.dry_run():
+                    pass
+
+        failures, renamed = [], set()
+        linkable = not set(self.options or ()) & {"--inplace", "--append",
+                                                  "--append-verify"}
+        chosen = set(entities)
+        with self.phase("move"):
+            moves, sizes = find_moves(self.records, self.transfer_root(),
+                                      self.destination, workers)
+            for old, news in moves.items():
+                old_path = path.join(self.destination, old)
+                for index, new in enumerate(news):
+                    new_path = path.join(self.destination, new)
+                    renaming = old in chosen and index == len(news) - 1
+                    if not renaming and not linkable:
+                        continue
+                    try:
+                        makedirs(path.dirname(new_path), exist_ok=True)
+                        if path.lexists(new_path):
+                            raise FileExistsError(f"{new} already exists")
+                        if renaming:
+                            rename(old_path, new_path)
+                            renamed.add(old)
+                        else:
+                            link(old_path, new_path)
+                    except OSError as e:
+                        failures.append((new, e))
+                        continue
+                    self.moved += 1
+                    self.moved_bytes += sizes[old]
+                    self.log(f"{old} {"moved" if renaming else "linked"} to "
+                             f"{new}.", level=VERBOSE)
+            self.trace_event("moves", moved=self.moved,
+                             bytes=self.moved_bytes, renamed=len(renamed))
+
+        # The renamed files are neither deletions nor chosen any more
+        if renamed:
+            self.deletions = [entity for entity in self.deletions or ()
+                              if entity not in renamed]
+            entities = [entity for entity in entities
+                        if entity not in renamed]
+            if self.chosen is not None:
+                self.chosen = entities
+        return entities, failures
+
+    def transfer_root(self):
+        """Return the directory that the paths of the transfer (e.g. the
+        deletions) are relative to: `source` itself if it has a trailing
+        slash, otherwise its parent directory (just like rsync).
+
+        :return: The root of the transfer on the source side.
+        :rtype: str
+        """
 
-    def sync(self):
+        return get_transfer_root(self.source)
+
+    def sync(self, files_from=None):
         """Run rsync to synchronize `source` with `destination`.
 
-        :return: The result object of the `subprocess.run` method.
+        In `single_pass` mode rsync also deletes the `chosen` deletions:
+        `--delete` is added and every other entity of `deletions` is
+        protected by a filter rule (if `chosen` is `None`, nothing is
+        deleted). Note that entities deleted from `source`
+        after the deletions were listed are deleted as well. Otherwise, if
+        the source is :ref:`sharded <sharded>`, the shards are synchronized
+        by parallel rsync processes (without the progress line). A journaled
+        sync (see `journal`) is checkpointed, and removes the journal
+        when it is done.
+
+        :param list files_from: Only synchronize these paths (relative to
+            :ref:`transfer_root <transfer-root>`) instead of the whole source.
+
+        :return: The result object of rsync.
         :rtype: subprocess.CompletedProcess
+
+        :raises CalledProcessError: If rsync exits with a non-zero code.
+        """
+
+        # Splitting the source into shards synchronized in parallel
+        # (in single-pass mode rsync deletes the deletions, which needs
+        # a single process, and so does an empty source without shards)
+        sharded = (files_from is None and not self.single_pass
+                   and self.sharded())
+        if sharded:
+            try:
+                sharded = bool(self._plan_shards()[0])
+            except CalledProcessError as e:
+                self.returncode = e.returncode
+                raise
+
+        with self._sync_cmd(files_from, sharded,
+                            bool(self.progress_callback)) as cmd:
+
+            # Running rsync
+            start = monotonic()
+            with self.phase("sync", files=None if files_from is None
+                            else len(files_from)):
+                try:
+                    result = (self._sync_shards(cmd) if sharded
+                              else self.run_rsync(cmd))
+                except CalledProcessError as e:
+                    self.returncode = e.returncode
+                    raise
+            self.returncode = result.returncode
+        self._sync_finished(files_from, monotonic() - start)
+
+        # Returning the result object
+        return result
+
+    @contextmanager
+    def _sync_cmd(self, files_from, sharded, progress):
+        """Create the rsync command of the sync (see :ref:`sync <sync>`)
+        with the temporary files it needs while it runs.
+
+        :param list files_from: Only synchronize these paths.
+        :param bool sharded: Leave out the source and the destination
+            (they are attached to the commands of the shards).
+        :param bool progress: Show the overall progress.
+
+        :return: Context manager of the command.
         """
 
         cmd = ["rsync", "-av"]
@@ -271,9 +1505,88 @@ class Session:
         if self.options:
             for option in self.options:
                 cmd.append(option)
+        if self.collect_stats and "--stats" not in cmd:
+            cmd.append("--stats")
+        if progress and not sharded:
+            cmd.append("--info=progress2")
+        cmd.extend(self._partial_dir())
+        if self.journal and not sharded:
+            self.journal.checkpoint("sync_start")
+
+        with (NamedTemporaryFile("w", encoding="utf-8",
+                                 errors="surrogateescape") as file_list,
+              NamedTemporaryFile("w", encoding="utf-8",
+                                 errors="surrogateescape") as filters):
+
+            # Protecting the deletions that were not chosen, the rules are
+            # passed in a file since there can be millions of them (nothing
+            # gets deleted if the deletions were not chosen at all)
+            if (self.single_pass and files_from is None
+                    and self.chosen is not None):
+                chosen = set(self.chosen)
+                for entity in self.deletions or ():
+                    if entity not in chosen:
+                        filters.write(f"{protect_rule(entity)}\n")
+                filters.flush()
+                cmd.extend(["--delete", f"--filter=merge {filters.name}"])
+
+            # Passing the paths in a NUL-separated file, the ones that have
+            # disappeared since are skipped by rsync
+            if files_from is not None:
+                file_list.write("\0".join(files_from))
+                file_list.flush()
+                cmd.extend([f"--files-from={file_list.name}", "--from0",
+                            "--ignore-missing-args",
+                            self.transfer_root(), self.destination])
+
+            # Attaching source and destination (the shards are attached
+            # to their own commands)
+            elif not sharded:
+                cmd.extend([self.source, self.destination])
+            yield cmd
+
+    def _sync_finished(self, files_from, seconds):
+        """Finish a successful sync: remove the journal, update the
+        directory index (incrementally, after a full sync) and save the
+        throughput of a full sync for the next estimates.
+        """
 
-        # Attaching source and destination
-        cmd.extend([self.source, self.destination])
+        if self.journal:
+            self.journal.finish()
+        # The index is only updated after a full sync (the changed paths
+        # of watch mode are read again when the deletions are listed)
+        if (self.engine == "indexed" and self.returncode == 0
+                and files_from is None):
+            self.update_index()
+
+        # Saving the throughput of a full sync for the next estimates (the
+        # moved and linked files were not transferred)
+        if files_from is None and self.records is not None:
+            try:
+                ThroughputHistory().record(
+                    self.get_profile(),
+                    self.records.total_size(CREATE, UPDATE) - self.moved_bytes,
+                    self.records.count(CREATE) + self.records.count(UPDATE)
+                    - self.moved,
+                    seconds)
+            except (PermissionError, OSError, ValueError):
+                pass
+
+    def update_index(self, rebuild=False):
+        """Update the :ref:`DirectoryIndex <directoryindex-class>` of
+        `source` and `destination` (only the directories that changed since
+        the last update are read).
+
+        :param bool rebuild: Drop the index and read both trees again.
+        """
 
-        # Running rsync and returning the result object
-        return run(cmd, text=True, check=True)
+        from arxive_index import DirectoryIndex
+        with self.phase("update_index", rebuild=rebuild):
+            index = DirectoryIndex(self.source, self.destination)
+            try:
+                if rebuild:
+                    index.rebuild()
+                else:
+                    index.update()
+            finally:
+                index.close()
@@ -21,19 +21,23 @@ Check the documentation for details: https://arxive.readthedocs.io
     along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 
+import re
 import sys
+from threading import Lock
 
 from arxive_common import *
 from arxive_gui_dialogs import *
+from arxive_gui_workers import ListWorker, SyncWorker, UpdateWorker
+from arxive_gui_models import DeletionModel
 
 from PySide6.QtWidgets import (QApplication, QMainWindow, QWidget, QSizePolicy,
-                               QListWidgetItem)
-from PySide6.QtCore import Slot, Qt
+                               QProgressBar)
+from PySide6.QtCore import QObject, QThread, QTimer, Slot, Qt
 from PySide6.QtGui import QAction, QIcon, QTextCursor, QColor, QTextCharFormat
 from ui.MainWindow import Ui_MainWindow
 
 
-class OutputRedirector:
+class OutputRedirector(QObject):
     """Handles the redirection of the standard output
     to the :ref:`MainWindow.consoleOutput <mainwindow-class>` widget.
 
@@ -42,41 +46,91 @@ class OutputRedirector:
     of the :ref:`Session.log <log>` method to a `QPlainTextEdit` widget.
     It also colorizes the output based on the nature of the message
     (errors, warnings and successful tasks).
+
+    The writes (from any thread) are only collected in a buffer, which is
+    written into the widget by a timer on the GUI thread, so bursts of
+    thousands of lines are inserted at once. The widget keeps only the
+    last lines (see `set_max_lines`), the messages are still written into
+    the session log in full.
+
+    :ivar int interval: Milliseconds between two updates of the widget.
     """
 
+    # Colors of the lines, the first matching pattern wins
+    COLORS = ((re.compile("error", re.IGNORECASE), QColor("red")),
+              (re.compile("warning", re.IGNORECASE), QColor("orange")),
+              (re.compile("ready|finished|saved", re.IGNORECASE),
+               QColor("green")))
+
+    interval = 100
+
     def __init__(self, plain_text_edit):
+        super().__init__()
         self.plain_text_edit = plain_text_edit
+        self.pending = []
+        self.lock = Lock()
+
+        # Creating the text formats once
+        self.formats = [(pattern, self._text_format(color))
+                        for pattern, color in self.COLORS]
+        self.default_format = self._text_format(QColor("black"))
+
+        self.timer = QTimer(self)
+        self.timer.setInterval(self.interval)
+        self.timer.timeout.connect(self.flush_pending)
+        self.timer.start()
+
+    @staticmethod
+    def _text_format(color):
+        text_format = QTextCharFormat()
+        text_format.setForeground(color)
+        return text_format
 
     def write(self, text):
-        if text.strip():  # Avoid empty lines
-            # Determine color based on content
-            if "error" in text.lower():
-                color = QColor("red")
-            elif "warning" in text.lower():
-                color = QColor("orange")
-            elif any(keyword in text.lower() for keyword in
-                     ["ready", "finished", "saved"]):
-                color = QColor("green")
-            else:
-                color = QColor("black")
-
-            # Append text with the determined color
-            self.append_colored_text(text.strip(), color)
+        with self.lock:
+            self.pending.append(text)
 
     def flush(self):
         pass  # Required for compatibility with `sys.stdout`
 
-    def append_colored_text(self, text, color):
+    def set_max_lines(self, max_lines):
+        """Set the number of lines kept in the widget (the oldest lines
+        are dropped, `0` keeps every line).
+
+        :param int max_lines: The maximum number of lines.
+        """
+
+        self.plain_text_edit.setMaximumBlockCount(max_lines)
+
+    @Slot()
+    def flush_pending(self):
+        """Write the complete lines collected since the last update into
+        the widget (timer slot).
+        """
+
+        with self.lock:
+            text = "".join(self.pending)
+            *lines, rest = text.split("\n")
+            self.pending = [rest] if rest else []
+        if not lines:
+            return
+
         # Move cursor to the end
         cursor = self.plain_text_edit.textCursor()
         cursor.movePosition(QTextCursor.End)
 
-        # Set text format
-        text_format = QTextCharFormat()
-        text_format.setForeground(color)
-
-        # Insert text with the format
-        cursor.insertText(text + "\n", text_format)
+        # Insert the lines in one edit block with the format
+        # of their color
+        cursor.beginEditBlock()
+        for line in lines:
+            line = line.strip()
+            if not line:  # Avoid empty lines
+                continue
+            text_format = next((text_format for pattern, text_format
+                                in self.formats if pattern.search(line)),
+                               self.default_format)
+            cursor.insertText(f"{line}\n", text_format)
+        cursor.endEditBlock()
 
         # Ensure the cursor remains at the end
         self.plain_text_edit.setTextCursor(cursor)
@@ -95,10 +149,15 @@ class MainWindow(QMainWindow, Ui_MainWindow):
 
     :ivar Session session: Handles arXive session.
     :ivar Config config: Holds configurations.
+    :ivar DeletionModel deletion_model: The deletions shown in `delList`.
+    :ivar Worker worker: The operation running in the background.
+    :ivar QThread worker_thread: The thread of `worker`.
 
     Toolbar actions:
         defaults_action(): Sets the default source, destination and options.
 
+        cancel_action(): Cancels the running operation.
+
         update_action(): Updates the Git repository and the Python environment.
 
         config_action(): Opens the configuration dialog.
@@ -114,8 +173,26 @@ class MainWindow(QMainWindow, Ui_MainWindow):
 
         mark_all(): Marks all entities for deletion.
 
+        mark_selected(checked): Marks/unmarks the selected entities.
+
+        invert_marks(): Inverts the marks of all entities.
+
+        add_deletions(batch): Adds listed deletions to the list.
+
+        deletions_listed(deletions): Finishes listing the deletions.
+
         run_sync(): Runs rsync to synchronize the source with the destination.
 
+        sync_finished(succeeded): Finishes the synchronization.
+
+        show_progress(progress): Shows the progress of the sync
+        in the status bar.
+
+    Methods:
+        start_worker(worker, finished): Runs an operation in the background.
+
+        set_busy(busy): Enables/disables the controls while an operation runs.
+
     """
 
     def __init__(self):
@@ -124,6 +201,8 @@ class MainWindow(QMainWindow, Ui_MainWindow):
 
         self.session = None
         self.config = None
+        self.worker = None
+        self.worker_thread = None
         self.listdelButton.setFocus()
 
         # Redirecting standard output
@@ -162,15 +241,22 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         show_log_action.triggered.connect(self.show_log_action)
         self.toolbar.addAction(show_log_action)
 
+        # Cancel the running operation
+        self.cancel_button = QAction(
+            QIcon.fromTheme("process-stop"), "Cancel", self)
+        self.cancel_button.triggered.connect(self.cancel_action)
+        self.cancel_button.setEnabled(False)
+        self.toolbar.addAction(self.cancel_button)
+
         # <--- left side
         self.toolbar.addWidget(spacer)
         # right side --->
 
         # Update
-        update_action = QAction(
+        self.update_button = QAction(
             QIcon('src/ui/update.svg'), "Update", self)
-        update_action.triggered.connect(self.update_action)
-        self.toolbar.addAction(update_action)
+        self.update_button.triggered.connect(self.update_action)
+        self.toolbar.addAction(self.update_button)
 
         # Configuration
         config_action = QAction(
@@ -190,10 +276,31 @@ class MainWindow(QMainWindow, Ui_MainWindow):
 
         # -------------------
 
+        # Deletions, marked with the checkboxes or the context menu
+        # (for the selected rows)
+        self.deletion_model = DeletionModel(self)
+        self.delList.setModel(self.deletion_model)
+        self.delList.setContextMenuPolicy(
+            Qt.ContextMenuPolicy.ActionsContextMenu)
+        for text, slot in (("Mark selected", lambda: self.mark_selected(True)),
+                           ("Unmark selected",
+                            lambda: self.mark_selected(False)),
+                           ("Invert marks", self.invert_marks)):
+            action = QAction(text, self.delList)
+            action.triggered.connect(slot)
+            self.delList.addAction(action)
+
         self.listdelButton.clicked.connect(self.list_deletions)
         self.syncButton.clicked.connect(self.run_sync)
         self.delallRadio.clicked.connect(self.mark_all)
 
+        # Progress bar of the sync in the status bar
+        self.progressBar = QProgressBar()
+        self.progressBar.setRange(0, 100)
+        self.progressBar.setMaximumWidth(200)
+        self.progressBar.hide()
+        self.statusbar.addPermanentWidget(self.progressBar)
+
     # -----------------
     # ----- SLOTS -----
     # -----------------
@@ -227,57 +334,37 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         :var LogViewerDialog dialog: Session log dialog.
         """
 
+        self.session.flush_log()
         dialog = LogViewerDialog(self.session.log_path, self)
-        dialog.exec()
+        dialog.setAttribute(Qt.WidgetAttribute.WA_DeleteOnClose)
+        dialog.show()
+
+    @Slot()
+    def cancel_action(self):
+        """Cancel the running operation (toolbar action): the running rsync
+        process is terminated.
+        """
+
+        if self.worker_thread:
+            self.statusbar.showMessage("Cancelling...")
+            self.session.cancel()
 
     @Slot()
     def update_action(self):
         """Update Git repository and Python environment (toolbar action)."""
 
-        self.listdelButton.setEnabled(False)
         self.statusbar.showMessage("Updating...")
+        self.start_worker(UpdateWorker(self.session), self.update_finished)
+
+    @Slot(object)
+    def update_finished(self, succeeded):
+        """Finish the update started by
+        :ref:`MainWindow.update_action <mainwindow-class>`.
 
-        # Updating Git repo
-        self.session.log("Updating Git repository...")
-        try:
-            result = run(["git", "pull"], text=True)
-            if result.returncode == 0:
-                self.session.log("Git repository update finished.")
-            else:
-                self.session.log("Warning: something went wrong "
-                                 "while updating Git repository!",
-                                 result.returncode)
-        except (FileNotFoundError, PermissionError, OSError) as e:
-            self.session.log("Error while updating Git repository!", e)
-
-        # Updating Python env
-        self.session.log("Updating Python environment...")
-        try:
-            result = run(["pipenv", "update"], text=True)
-            if result.returncode == 0:
-                self.session.log("Python environment update finished.")
-            else:
-                self.session.log("Warning: something went wrong "
-                                 "while updating Python environment!",
-                                 result.returncode)
-        except (FileNotFoundError, PermissionError, OSError) as e:
-            self.session.log("Error while updating Python environment!", e)
-
-        # Verifying Python packages
-        self.session.log("Verifying Python packages...")
-        try:
-            result = run(["pipenv", "verify"], text=True)
-            if result.returncode == 0:
-                self.session.log("Python package verification finished.")
-            else:
-                self.session.log("Warning: something went wrong "
-                                 "while verifying Python packages!",
-                                 result.returncode)
-        except (FileNotFoundError, PermissionError, OSError) as e:
-            self.session.log("Error while verifying Python packages!", e)
+        :param bool succeeded: Shows if every step of the update succeeded.
+        """
 
         self.statusbar.showMessage("Ready.")
-        self.listdelButton.setEnabled(True)
 
     @Slot()
     def config_action(self):
@@ -303,12 +390,61 @@ class MainWindow(QMainWindow, Ui_MainWindow):
 
     @Slot()
     def exit_action(self):
-        """Close the application (toolbar action)."""
+        """Close the application (toolbar action), the running operation
+        is cancelled first.
+        """
 
+        if self.worker_thread:
+            self.session.cancel()
+            self.worker_thread.quit()
+            self.worker_thread.wait()
         sys.exit("Goodbye!")
 
     # -------------------
 
+    def start_worker(self, worker, finished):
+        """Run an operation on a `QThread`.
+
+        :param Worker worker: The operation.
+        :param callable finished: Slot called (on the GUI thread) with
+            the result of the operation.
+        """
+
+        self.worker = worker
+        self.worker_thread = QThread(self)
+        worker.moveToThread(self.worker_thread)
+        self.worker_thread.started.connect(worker.run)
+        worker.finished.connect(finished)
+        worker.finished.connect(self.worker_finished)
+        self.set_busy(True)
+        self.worker_thread.start()
+
+    @Slot(object)
+    def worker_finished(self, _):
+        """Stop the thread of the finished worker."""
+
+        self.worker_thread.quit()
+        self.worker_thread.wait()
+        self.worker.deleteLater()
+        self.worker_thread.deleteLater()
+        self.worker, self.worker_thread = None, None
+        self.set_busy(False)
+
+    def set_busy(self, busy):
+        """Enable or disable the controls while an operation runs.
+
+        :param bool busy: Shows if an operation is running.
+        """
+
+        self.listdelButton.setEnabled(not busy)
+        self.update_button.setEnabled(not busy)
+        self.cancel_button.setEnabled(busy)
+        if busy:
+            self.syncButton.setEnabled(False)
+            self.delallRadio.setEnabled(False)
+
+    # -------------------
+
     @Slot()
     def config_updated(self):
         """Reload configurations and validate source and destination.
@@ -320,6 +456,12 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         """
 
         self.config = Config()
+        self.output_redirector.set_max_lines(self.config.console_lines)
+        self.session.engine = self.config.engine
+        self.session.single_pass = self.config.single_pass
+        self.session.shards = self.config.shards
+        self.session.detect_moves = self.config.detect_moves
+        self.session.verbosity = self.config.verbosity
 
         # Validating source
         if not path.exists(self.config.source):
@@ -333,7 +475,7 @@ class MainWindow(QMainWindow, Ui_MainWindow):
     @Slot()
     def list_deletions(self):
         """Validate source and destination, then call
-        :ref:`Session.get_deletions <get-deletions>` to list
+        :ref:`Session.iter_deletions <iter-deletions>` to list
         the deletions to :ref:`MainWindow.consoleOutput <mainwindow-class>`.
         """
 
@@ -346,28 +488,13 @@ class MainWindow(QMainWindow, Ui_MainWindow):
                 and path.exists(self.session.destination)
                 and self.session.source != self.session.destination):
 
-            # Getting list of deletions from the source
+            # Getting list of deletions from the source in the background,
+            # the entities are added to the list while rsync is still running
             self.statusbar.showMessage("Listing deletions...")
-            deletions = self.session.get_deletions()
-            if deletions:
-                self.session.log(f"{len(deletions)} deletion(s) found, "
-                                    f"ready to synchronize.")
-                self.delallRadio.setEnabled(True)
-                for file in deletions:
-                    item = QListWidgetItem(file)
-                    item.setFlags(item.flags() |
-                                    Qt.ItemFlag.ItemIsUserCheckable)
-                    item.setCheckState(Qt.CheckState.Unchecked)
-                    self.delList.addItem(item)
-            elif isinstance(deletions, CalledProcessError):
-                e, c = deletions.stderr, deletions.returncode
-                self.session.log(f"Error while listing deletions ({c})!", e)
-                self.statusbar.showMessage("Error while listing deletions.")
-            else:
-                self.session.log("No deletions found, "
-                                    "ready to synchronize.")
-            self.statusbar.showMessage("Ready to synchronize.")
-            self.syncButton.setEnabled(True)
+            self.deletion_model.clear()
+            worker = ListWorker(self.session)
+            worker.found.connect(self.add_deletions)
+            self.start_worker(worker, self.deletions_listed)
         else:
             if not path.exists(self.session.source):
                 self.session.log("Error: Invalid source!")
@@ -377,14 +504,60 @@ class MainWindow(QMainWindow, Ui_MainWindow):
                 self.session.log("Error: Source and destination "
                                  "must be different!")
 
+    @Slot(list)
+    def add_deletions(self, batch):
+        """Add a batch of deletions listed by the
+        :ref:`ListWorker <listworker-class>` to
+        :ref:`MainWindow.delList <mainwindow-class>`.
+
+        :param list batch: The paths of the deleted entities.
+        """
+
+        self.deletion_model.append(batch)
+
+    @Slot(object)
+    def deletions_listed(self, deletions):
+        """Finish listing the deletions.
+
+        :param list deletions: The deletions (`None` if listing failed
+            or was cancelled).
+        """
+
+        if deletions is None:
+            self.statusbar.showMessage("Deletions could not be listed.")
+            return
+        self.delallRadio.setEnabled(bool(deletions))
+        self.syncButton.setEnabled(True)
+        self.statusbar.showMessage("Ready to synchronize.")
+
     @Slot()
     def mark_all(self):
         """Mark all entities listed by
         :ref:`MainWindow.list_deletions <list-deletions-action>` for deletion.
         """
 
-        for index in range(self.delList.count()):
-            self.delList.item(index).setCheckState(Qt.CheckState.Checked)
+        self.deletion_model.set_all(True)
+
+    @Slot(bool)
+    def mark_selected(self, checked):
+        """Mark or unmark the entities selected in
+        :ref:`MainWindow.delList <mainwindow-class>` (context menu action).
+
+        :param bool checked: Mark or unmark the entities.
+        """
+
+        for selection in self.delList.selectionModel().selection():
+            self.deletion_model.set_checked(selection.top(),
+                                            selection.bottom(), checked)
+        if not checked:
+            self.delallRadio.setChecked(False)
+
+    @Slot()
+    def invert_marks(self):
+        """Invert the marks of all entities (context menu action)."""
+
+        self.deletion_model.invert()
+        self.delallRadio.setChecked(False)
 
     @Slot()
     def run_sync(self):
@@ -393,27 +566,10 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         :ref:`Session.destination <session-class>`.
 
         :var list entities: Files and directories marked for deletion.
-        :var subprocess.CompletedProcess result: The result object
-            of the `subprocess.run` method.
         """
 
-        # Concatenating source/destination with entity path for deletions
-        entities = [path.join(self.session.destination,
-                              self.delList.item(index).text())
-                    for index in range(self.delList.count())
-                    if self.delList.item(index).checkState()
-                    == Qt.CheckState.Checked]
-
-        # Deleting files/directories
-        self.session.deleted = 0
-        for entity in entities:
-            try:
-                self.session.delete_entity(entity)
-                self.session.deleted += 1
-                self.session.log(f"{entity} deleted.")
-            except (FileNotFoundError, PermissionError, OSError) as e:
-                self.session.log(f"Error while deleting {entity}!", e)
-        self.session.log(f"{self.session.deleted} entities deleted.")
+        # Collecting the entities marked for deletion
+        entities = self.deletion_model.checked_paths()
 
         # Setting and validating options
         self.session.options = list(set(
@@ -423,27 +579,52 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         if self.session.options:
             self.optionsEdit.setText(", ".join(self.session.options))
 
-        # Synchronizing source and destination with rsync
+        # Deleting the chosen entities and synchronizing source and
+        # destination in the background
         self.session.log(f"Syncing from {self.session.source} "
                          f"to {self.session.destination}"
                          f"{" with additional options: " +
                             ", ".join(self.session.options) + "..."
                          if self.session.options else "..."}")
         self.statusbar.showMessage("Synchronizing...")
-        result = self.session.sync()
-        if result.returncode == 0:
-            self.session.log("Synchronization finished.")
-        else:
-            self.session.log("Warning: something went wrong "
-                                "while running rsync!",
-                                result.returncode)
+        self.progressBar.setValue(0)
+        self.progressBar.show()
+        worker = SyncWorker(self.session, entities)
+        worker.progress.connect(self.show_progress)
+        self.start_worker(worker, self.sync_finished)
+
+    @Slot(object)
+    def sync_finished(self, succeeded):
+        """Finish the synchronization started by
+        :ref:`MainWindow.run_sync <mainwindow-class>`.
+
+        :param bool succeeded: Shows if the synchronization finished.
+        """
 
-        self.statusbar.showMessage("Ready.")
-        self.delList.clear()
+        self.progressBar.hide()
+        self.statusbar.showMessage("Ready." if succeeded
+                                   else "Synchronization not finished.")
+        self.deletion_model.clear()
         self.delallRadio.setChecked(False)
         self.delallRadio.setEnabled(False)
         self.syncButton.setEnabled(False)
 
+    @Slot(object)
+    def show_progress(self, progress):
+        """Show the progress of the sync in
+        :ref:`MainWindow.progressBar <mainwindow-class>` and the status bar
+        (used as :ref:`Session.progress_callback <session-class>`).
+
+        :param dict progress: The progress (see
+            :ref:`parse_progress <parse-progress>`), `None` is ignored.
+        """
+
+        if progress is None:
+            return
+        self.progressBar.setValue(min(progress["percent"], 100))
+        self.statusbar.showMessage(
+            f"Synchronizing... {describe_progress(progress)}")
+
 
 # main function
 def main():
@@ -474,6 +655,7 @@ def main():
     # Loading config file
     try:
         window.config = Config()
+        window.output_redirector.set_max_lines(window.config.console_lines)
         window.session.log("Configurations loaded.")
     except (FileNotFoundError, PermissionError, OSError) as e:
         window.session.log("Error while loading configurations!", e)
@@ -491,6 +673,11 @@ def main():
     window.destEdit.setText(window.session.destination)
 
     window.session.options = window.config.options
+    window.session.engine = window.config.engine
+    window.session.single_pass = window.config.single_pass
+    window.session.shards = window.config.shards
+    window.session.detect_moves = window.config.detect_moves
+    window.session.verbosity = window.config.verbosity
 
     if window.session.source != "":
         window.session.log(f"Source: {window.session.source}")
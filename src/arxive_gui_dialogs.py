@@ -21,17 +21,46 @@ Check the documentation for details: https://arxive.readthedocs.io
     along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 
-from arxive_gui import set_dir
+from os.path import expanduser
+
 from arxive_common import validate_options
+from arxive_gui_models import LogModel
 
-from PySide6.QtWidgets import QDialog
-from PySide6.QtCore import Signal, Slot
+from PySide6.QtWidgets import QDialog, QFileDialog
+from PySide6.QtCore import QTimer, Signal, Slot
 
 from ui.Config import Ui_Dialog as ConfigDlg
 from ui.About import Ui_Dialog as AboutDlg
 from ui.LogViewer import Ui_Dialog as LogViewerDlg
 
 
+def set_dir(parent, directory):
+    """Set a directory chosen by the user in a dialog window.
+
+    :param MainWindow or ConfigDialog parent: The window from which
+        the dialog is opened.
+    :param str directory: The type of the directory (source or destination).
+    """
+
+    # Opening a dialog for choosing the directory
+    dir_path = QFileDialog.getExistingDirectory(
+        parent=parent, caption=f"Select {directory}", dir=expanduser("~"))
+
+    # If the parent is the main window the 'Run sync' button is disabled and the
+    # directories get validated when the 'List deletions' button is pressed
+    if dir_path:
+        if parent.objectName() == "MainWindow":
+            parent.syncButton.setEnabled(False)
+        if directory == "source":
+            parent.sourceEdit.setText(dir_path)
+            if parent.objectName() == "MainWindow":
+                parent.session.log(f"{directory.capitalize()}: {dir_path}")
+        else:
+            parent.destEdit.setText(dir_path)
+            if parent.objectName() == "MainWindow":
+                parent.session.log(f"{directory.capitalize()}: {dir_path}")
+
+
 class ConfigDialog(ConfigDlg, QDialog):
     """Handles the Configurations dialog of the application.
 
@@ -152,8 +181,25 @@ class LogViewerDialog(LogViewerDlg, QDialog):
     pyside6-uic from the QtDesigner .ui file and can be found in
     `src/ui/LogViewer.py <https://github.com/gaaldvd/arxive/blob/main/src/ui/LogViewer.py>`_
     in the repository.
+
+    The log is shown through a :ref:`LogModel <logmodel-class>`, so even
+    huge logs open at once. The dialog checks the log for new lines
+    regularly, so it can stay open during a sync (in follow mode it keeps
+    scrolling to the last line).
+
+    :ivar LogModel model: The lines of the session log.
+
+    Methods:
+        search(next_match=False):
+            Selects the next line containing the searched text.
+
+        lines_added():
+            Scrolls to the last line in follow mode.
     """
 
+    # Milliseconds between two checks of the log
+    interval = 500
+
     def __init__(self, log_path, parent=None):
         """Constructor method.
 
@@ -164,6 +210,43 @@ class LogViewerDialog(LogViewerDlg, QDialog):
         super().__init__(parent)
         self.setupUi(self)
 
-        with open(log_path, 'r', encoding="utf-8") as log:
-            for line in log:
-                self.sessionLog.appendPlainText(line.strip())
\ No newline at end of file
+        self.model = LogModel(log_path, self)
+        self.sessionLog.setModel(self.model)
+        self.model.rowsInserted.connect(self.lines_added)
+
+        self.searchEdit.textChanged.connect(lambda: self.search())
+        self.searchEdit.returnPressed.connect(lambda: self.search(True))
+        self.nextButton.clicked.connect(lambda: self.search(True))
+        self.endButton.clicked.connect(self.sessionLog.scrollToBottom)
+        self.finished.connect(self.model.close)
+
+        self.timer = QTimer(self)
+        self.timer.setInterval(self.interval)
+        self.timer.timeout.connect(self.model.refresh)
+        self.timer.start()
+
+    @Slot()
+    def lines_added(self):
+        """Scroll to the last line in follow mode."""
+
+        if self.followCheck.isChecked():
+            self.sessionLog.scrollToBottom()
+
+    def search(self, next_match=False):
+        """Select the first line containing the text of `searchEdit`
+        from the current line on (incremental search), wrapping around
+        at the end of the log.
+
+        :param bool next_match: Start from the line after the current one.
+        """
+
+        current = max(self.sessionLog.currentIndex().row(), 0)
+        start = current + 1 if next_match else current
+        row = self.model.find(self.searchEdit.text(), start)
+        if row < 0 and start > 0:
+            row = self.model.find(self.searchEdit.text(), 0)
+        if row >= 0:
+            self.followCheck.setChecked(False)
+            index = self.model.index(row)
+            self.sessionLog.setCurrentIndex(index)
+            self.sessionLog.scrollTo(index)
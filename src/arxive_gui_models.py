@@ -0,0 +1,441 @@
+"""
+arXive: A simple CLI/GUI frontend for rsync.
+
+This file contains the item models of the GUI of arXive.
+
+Check the documentation for details: https://arxive.readthedocs.io
+
+    Copyright (C) 2025 David Gaal (gaaldvd@proton.me)
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from array import array
+from bisect import bisect_right
+from itertools import accumulate
+from mmap import mmap, ACCESS_READ
+from os import path
+
+from PySide6.QtCore import (QAbstractListModel, QModelIndex, QObject, QThread,
+                            Qt, Signal, Slot)
+
+# Inverting every bit of a byte with `bytes.translate`
+INVERT = bytes(255 - byte for byte in range(256))
+
+# Bytes of the log indexed at once
+INDEX_CHUNK = 4 * 1024 * 1024
+
+
+class DeletionModel(QAbstractListModel):
+    """Holds the deletions listed in the main window.
+
+    There can be millions of deletions, so instead of an item object for
+    every row the paths are kept in a single buffer (separated by NUL
+    characters, with their offsets in an array) and the check states in a
+    bitset. The view only asks for the rows it shows, and checking,
+    unchecking or inverting many rows at once works on whole bytes
+    of the bitset.
+
+    Methods:
+        append(entities):
+            Adds deletions to the end of the list.
+
+        clear():
+            Removes every deletion.
+
+        path(row):
+            Returns the path of a deletion.
+
+        set_checked(first, last, checked):
+            Checks or unchecks a range of rows.
+
+        set_all(checked):
+            Checks or unchecks every row.
+
+        invert():
+            Inverts the check state of every row.
+
+        checked_paths():
+            Returns the paths of the checked rows.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.buffer = bytearray()
+        self.offsets = array('Q', [0])
+        self.bits = bytearray()
+        self.rows = 0
+
+    # ----- QAbstractListModel -----
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self.rows
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid() or index.row() >= self.rows:
+            return None
+        if role == Qt.ItemDataRole.DisplayRole:
+            return self.path(index.row())
+        if role == Qt.ItemDataRole.CheckStateRole:
+            return (Qt.CheckState.Checked if self.is_checked(index.row())
+                    else Qt.CheckState.Unchecked)
+        return None
+
+    def flags(self, index):
+        return super().flags(index) | Qt.ItemFlag.ItemIsUserCheckable
+
+    def setData(self, index, value, role=Qt.ItemDataRole.EditRole):
+        if role != Qt.ItemDataRole.CheckStateRole or not index.isValid():
+            return False
+        self.set_checked(index.row(), index.row(),
+                         Qt.CheckState(value) == Qt.CheckState.Checked)
+        return True
+
+    # ------------------------------
+
+    def append(self, entities):
+        """Add deletions to the end of the list (unchecked).
+
+        :param list entities: The paths of the deleted entities.
+        """
+
+        if not entities:
+            return
+        self.beginInsertRows(QModelIndex(), self.rows,
+                             self.rows + len(entities) - 1)
+        for entity in entities:
+            self.buffer += entity.encode(errors="surrogateescape") + b"\0"
+            self.offsets.append(len(self.buffer))
+        self.rows += len(entities)
+        self.bits.extend(bytes((self.rows + 7) // 8 - len(self.bits)))
+        self.endInsertRows()
+
+    def clear(self):
+        """Remove every deletion."""
+
+        self.beginResetModel()
+        self.buffer = bytearray()
+        self.offsets = array('Q', [0])
+        self.bits = bytearray()
+        self.rows = 0
+        self.endResetModel()
+
+    def path(self, row):
+        """Return the path of a deletion.
+
+        :param int row: The row of the deletion.
+
+        :return: The path of the deleted entity.
+        :rtype: str
+        """
+
+        return self.buffer[self.offsets[row]:
+                           self.offsets[row + 1] - 1].decode(
+            errors="surrogateescape")
+
+    def is_checked(self, row):
+        """Return the check state of a row.
+
+        :param int row: The row of the deletion.
+
+        :rtype: bool
+        """
+
+        return bool(self.bits[row >> 3] & (1 << (row & 7)))
+
+    def set_checked(self, first, last, checked):
+        """Check or uncheck a range of rows (e.g. a selection).
+
+        The bits of the first and the last byte of the range are set one by
+        one, the bytes between them at once.
+
+        :param int first: The first row of the range.
+        :param int last: The last row of the range (inclusive).
+        :param bool checked: Check or uncheck the rows.
+        """
+
+        row = first
+        while row <= last and row & 7:
+            self._set_bit(row, checked)
+            row += 1
+        full = (last + 1 - row) // 8
+        if full > 0:
+            self.bits[row >> 3:(row >> 3) + full] = (b"\xff" if checked
+                                                     else b"\0") * full
+            row += full * 8
+        while row <= last:
+            self._set_bit(row, checked)
+            row += 1
+        self.dataChanged.emit(self.index(first), self.index(last),
+                              [Qt.ItemDataRole.CheckStateRole])
+
+    def _set_bit(self, row, checked):
+        """Set the bit of a row."""
+
+        if checked:
+            self.bits[row >> 3] |= 1 << (row & 7)
+        else:
+            self.bits[row >> 3] &= ~(1 << (row & 7)) & 0xff
+
+    def set_all(self, checked):
+        """Check or uncheck every row.
+
+        :param bool checked: Check or uncheck the rows.
+        """
+
+        if self.rows:
+            self.set_checked(0, self.rows - 1, checked)
+
+    def invert(self):
+        """Invert the check state of every row."""
+
+        if not self.rows:
+            return
+        self.bits = bytearray(self.bits.translate(INVERT))
+
+        # Clearing the bits after the last row
+        if self.rows & 7:
+            self.bits[-1] &= (1 << (self.rows & 7)) - 1
+        self.dataChanged.emit(self.index(0), self.index(self.rows - 1),
+                              [Qt.ItemDataRole.CheckStateRole])
+
+    def checked_paths(self):
+        """Return the paths of the checked rows.
+
+        :return: The paths in the order of the list.
+        :rtype: list
+        """
+
+        paths = []
+        for position, byte in enumerate(self.bits):
+            if byte:
+                for bit in range(8):
+                    if byte & (1 << bit):
+                        paths.append(self.path(position * 8 + bit))
+        return paths
+
+
+class LogIndexer(QObject):
+    """Finds the lines of a log file on a background thread.
+
+    :ivar str log_path: The path to the log file.
+    :ivar Signal indexed: Emitted with the generation of the request and
+        the offsets of the lines found (the offsets of the line ends)
+        after every chunk.
+    :ivar Signal finished: Emitted with the generation of the request
+        when it is done.
+    """
+
+    indexed = Signal(int, object)
+    finished = Signal(int)
+
+    def __init__(self, log_path):
+        super().__init__()
+        self.log_path = log_path
+
+    @Slot(int, int, int)
+    def index(self, generation, start, end):
+        """Find the complete lines between two offsets of the file.
+
+        :param int generation: Passed on with the results.
+        :param int start: The offset of the first line.
+        :param int end: The size of the file.
+        """
+
+        try:
+            with open(self.log_path, 'rb') as log:
+                log.seek(start)
+                while start < end:
+                    chunk = log.read(min(INDEX_CHUNK, end - start))
+                    last = chunk.rfind(b"\n")
+                    if last < 0:
+                        break
+
+                    # The end of every complete line of the chunk (the
+                    # partial line at its end is read with the next chunk)
+                    offsets = array('Q', accumulate(
+                        (len(line) + 1
+                         for line in chunk[:last].split(b"\n")),
+                        initial=start))[1:]
+                    self.indexed.emit(generation, offsets)
+                    start += last + 1
+                    log.seek(start)
+        except OSError:
+            pass
+        self.finished.emit(generation)
+
+
+class LogModel(QAbstractListModel):
+    """Shows the lines of a log file without reading it into memory.
+
+    The file is memory-mapped and the offsets of its lines are found by a
+    :ref:`LogIndexer <logindexer-class>` on a background thread, so the rows
+    show up while the file is indexed and only the visible lines are ever
+    decoded. Calling `refresh` picks up the lines appended since.
+
+    Methods:
+        refresh():
+            Maps the file again if it changed and indexes the new lines.
+
+        find(text, row):
+            Finds the next line containing a text.
+
+        close():
+            Stops the indexer and unmaps the file.
+    """
+
+    request_index = Signal(int, int, int)
+
+    def __init__(self, log_path, parent=None):
+        super().__init__(parent)
+        self.log_path = log_path
+        self.offsets = array('Q', [0])
+        self.map = None
+        self.size = 0
+        self.head = b""
+        self.requested = 0
+        self.generation = 0
+        self.indexing = False
+
+        self.indexer_thread = QThread(self)
+        self.indexer = LogIndexer(log_path)
+        self.indexer.moveToThread(self.indexer_thread)
+        self.request_index.connect(self.indexer.index)
+        self.indexer.indexed.connect(self.add_lines)
+        self.indexer.finished.connect(self.index_finished)
+        self.indexer_thread.start()
+        self.refresh()
+
+    # ----- QAbstractListModel -----
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.offsets) - 1
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if (role != Qt.ItemDataRole.DisplayRole or not index.isValid()
+                or index.row() >= len(self.offsets) - 1):
+            return None
+        return self.map[self.offsets[index.row()]:
+                        self.offsets[index.row() + 1] - 1].decode(
+            "utf-8", errors="replace")
+
+    # ------------------------------
+
+    def refresh(self):
+        """Map the file again if it changed and index the new lines.
+
+        If the beginning of the file changed (e.g. a new session truncated
+        the session log), the lines are indexed from the start again.
+        """
+
+        try:
+            size = path.getsize(self.log_path)
+        except OSError:
+            return
+        if size == self.size:
+            return
+
+        if self.map:
+            self.map.close()
+            self.map = None
+        if size:
+            with open(self.log_path, 'rb') as log:
+                self.map = mmap(log.fileno(), size, access=ACCESS_READ)
+        head = self.map[:128] if self.map else b""
+
+        # Starting over with a new file
+        if head[:len(self.head)] != self.head:
+            self.beginResetModel()
+            self.offsets = array('Q', [0])
+            self.requested = 0
+            self.generation += 1
+            self.indexing = False
+            self.endResetModel()
+        self.head = head
+        self.size = size
+        if not self.indexing:
+            self._request_index()
+
+    def _request_index(self):
+        """Ask the indexer for the lines after the last complete line
+        if the file grew since the last request.
+        """
+
+        if self.size > self.requested:
+            self.indexing = True
+            self.requested = self.size
+            self.request_index.emit(self.generation, self.offsets[-1],
+                                    self.size)
+
+    @Slot(int, object)
+    def add_lines(self, generation, offsets):
+        """Add the lines found by the indexer.
+
+        :param int generation: The generation of the request (the lines of
+            the file before it was truncated are dropped).
+        :param array offsets: The offsets of the line ends.
+        """
+
+        if generation != self.generation or not offsets:
+            return
+        rows = len(self.offsets) - 1
+        self.beginInsertRows(QModelIndex(), rows, rows + len(offsets) - 1)
+        self.offsets.extend(offsets)
+        self.endInsertRows()
+
+    @Slot(int)
+    def index_finished(self, generation):
+        """Index the lines appended while the indexer was running."""
+
+        if generation != self.generation:
+            return
+        self.indexing = False
+        self._request_index()
+
+    def find(self, text, row):
+        """Find the first line containing a text (case-sensitive) from
+        a row on, searching in the mapped file.
+
+        :param str text: The text to find.
+        :param int row: The row the search starts from.
+
+        :return: The row of the line (`-1` if not found).
+        :rtype: int
+        """
+
+        rows = len(self.offsets) - 1
+        if not text or not self.map or row >= rows:
+            return -1
+        needle = text.encode("utf-8")
+        start = self.offsets[max(row, 0)]
+        while True:
+            position = self.map.find(needle, start, self.offsets[-1])
+            if position < 0:
+                return -1
+            found = bisect_right(self.offsets, position) - 1
+
+            # Matches across line ends do not count
+            if position + len(needle) < self.offsets[found + 1]:
+                return found
+            start = self.offsets[found + 1]
+
+    def close(self):
+        """Stop the indexer and unmap the file."""
+
+        self.generation += 1
+        self.indexer_thread.quit()
+        self.indexer_thread.wait()
+        if self.map:
+            self.map.close()
+            self.map = None
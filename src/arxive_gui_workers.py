@@ -0,0 +1,252 @@
+"""
+arXive: A simple CLI/GUI frontend for rsync.
+
+This file contains the background workers of the GUI of arXive.
+
+Check the documentation for details: https://arxive.readthedocs.io
+
+    Copyright (C) 2025 David Gaal (gaaldvd@proton.me)
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from os import path
+from subprocess import run, CalledProcessError
+from time import monotonic
+
+from arxive_records import describe_estimate
+
+from PySide6.QtCore import QObject, Signal, Slot
+
+
+class Worker(QObject):
+    """Base class of the operations running on a `QThread`, so that the
+    main window keeps repainting while they run.
+
+    The worker talks to the main window only through signals (the messages
+    of :ref:`Session.log <log>` reach the console through the thread-safe
+    :ref:`OutputRedirector <outputredirector-class>`).
+
+    :ivar Session session: Handles the arXive session.
+    :ivar Signal finished: Emitted with the result of the operation
+        when it is done.
+
+    Methods:
+        run():
+            Runs the operation (slot connected to `QThread.started`).
+
+        work():
+            The operation itself (implemented by the subclasses).
+    """
+
+    finished = Signal(object)
+
+    def __init__(self, session):
+        super().__init__()
+        self.session = session
+
+    @Slot()
+    def run(self):
+        """Run the operation, `finished` is always emitted (with `None`
+        if the operation failed unexpectedly).
+        """
+
+        result = None
+        try:
+            self.session.cancelled = False
+            result = self.work()
+        except Exception as e:
+            self.session.log("Error while running the operation!", e)
+        finally:
+            self.finished.emit(result)
+
+    def work(self):
+        """Run the operation.
+
+        :return: The result passed on by `finished`.
+        """
+
+        raise NotImplementedError
+
+
+class ListWorker(Worker):
+    """Lists the deletions with :ref:`Session.iter_deletions
+    <iter-deletions>`, then estimates the cost of the sync.
+
+    :ivar Signal found: Emitted with batches of the deletions
+        while they are listed.
+    """
+
+    found = Signal(list)
+
+    # Emitting the deletions at least this often (seconds)
+    interval = 0.1
+
+    def work(self):
+        """List the deletions.
+
+        :return: The deletions (`None` if listing failed or was cancelled).
+        :rtype: list
+        """
+
+        deletions, batch = [], []
+        shown = monotonic()
+        entities = self.session.iter_deletions()
+        try:
+            for entity in entities:
+                if self.session.cancelled:
+                    break
+                deletions.append(entity)
+                batch.append(entity)
+                if len(batch) >= 500 or monotonic() - shown > self.interval:
+                    self.found.emit(batch)
+                    batch, shown = [], monotonic()
+        except CalledProcessError as e:
+            if not self.session.cancelled:
+                self.session.log(f"Error while listing deletions "
+                                 f"({e.returncode})!", e.stderr)
+                return None
+        finally:
+            entities.close()
+        if batch:
+            self.found.emit(batch)
+        if self.session.cancelled:
+            self.session.log("Listing deletions cancelled.")
+            return None
+
+        self.session.deletions = deletions
+        if deletions:
+            self.session.log(f"{len(deletions)} deletion(s) found, "
+                             f"ready to synchronize.")
+        else:
+            self.session.log("No deletions found, ready to synchronize.")
+
+        # Estimating the cost of the sync (not with the native and
+        # indexed engines, unless a dry-run was done anyway, they are used
+        # to avoid the dry-run)
+        if self.session.records is None and self.session.engine != "rsync":
+            return deletions
+        try:
+            self.session.log(describe_estimate(self.session.estimate()))
+        except CalledProcessError as e:
+            if not self.session.cancelled:
+                self.session.log(f"Error while estimating the sync "
+                                 f"({e.returncode})!", e.stderr)
+        return deletions
+
+
+class SyncWorker(Worker):
+    """Deletes the chosen entities (unless rsync deletes them in single-pass
+    mode), then runs :ref:`Session.sync <sync>`.
+
+    :ivar list entities: Files and directories marked for deletion.
+    :ivar Signal progress: Emitted with the progress of the sync
+        (see :ref:`parse_progress <parse-progress>`).
+    """
+
+    progress = Signal(object)
+
+    def __init__(self, session, entities):
+        super().__init__(session)
+        self.entities = entities
+
+    def work(self):
+        """Delete the chosen entities and synchronize.
+
+        :return: Shows if the synchronization finished.
+        :rtype: bool
+        """
+
+        # Moving the deleted files found on the source under a new path,
+        # then deleting files/directories in one batch (in single-pass mode
+        # they are deleted by rsync)
+        self.session.chosen = self.entities
+        if self.session.detect_moves:
+            try:
+                self.entities, failures = self.session.move_entities(
+                    self.entities)
+                for entity, e in failures:
+                    self.session.log(
+                        f"Error while moving to "
+                        f"{path.join(self.session.destination, entity)}!", e)
+                self.session.log(f"{self.session.moved} file(s) moved on "
+                                 f"the destination.")
+            except CalledProcessError as e:
+                self.session.log("Error while detecting moved files!",
+                                 e.returncode)
+        if self.session.single_pass:
+            self.session.log(f"{len(self.entities)} entities will be deleted "
+                             f"while synchronizing.")
+        elif self.entities:
+            for entity, e in self.session.delete_entities(self.entities):
+                self.session.log(
+                    f"Error while deleting "
+                    f"{path.join(self.session.destination, entity)}!", e)
+            self.session.log(f"{self.session.deleted} entities deleted.")
+        if self.session.cancelled:
+            self.session.log("Synchronization cancelled.")
+            return False
+
+        # Synchronizing source and destination with rsync
+        self.session.progress_callback = self.progress.emit
+        try:
+            self.session.sync()
+            self.session.log("Synchronization finished.")
+            return True
+        except CalledProcessError as e:
+            if self.session.cancelled:
+                self.session.log("Synchronization cancelled.")
+            else:
+                self.session.log("Warning: something went wrong "
+                                 "while running rsync!", e.returncode)
+            return False
+        finally:
+            self.session.progress_callback = None
+
+
+class UpdateWorker(Worker):
+    """Updates the Git repository and the Python environment."""
+
+    # The steps of the update: the command, the task and its result
+    steps = ((["git", "pull"], "updating Git repository",
+              "Git repository update"),
+             (["pipenv", "update"], "updating Python environment",
+              "Python environment update"),
+             (["pipenv", "verify"], "verifying Python packages",
+              "Python package verification"))
+
+    def work(self):
+        """Run the steps of the update.
+
+        :return: Shows if every step succeeded.
+        :rtype: bool
+        """
+
+        succeeded = True
+        for cmd, task, result_name in self.steps:
+            self.session.log(f"{task[0].upper()}{task[1:]}...")
+            try:
+                result = run(cmd, text=True, capture_output=True)
+                if result.stdout.strip():
+                    print(result.stdout.strip())
+                if result.returncode == 0:
+                    self.session.log(f"{result_name} finished.")
+                else:
+                    succeeded = False
+                    self.session.log(f"Warning: something went wrong "
+                                     f"while {task}!", result.returncode)
+            except (FileNotFoundError, PermissionError, OSError) as e:
+                succeeded = False
+                self.session.log(f"Error while {task}!", e)
+        return succeeded
@@ -0,0 +1,309 @@
+"""
+arXive: A simple CLI/GUI frontend for rsync.
+
+This file contains the code for the persistent directory index of arXive.
+
+Check the documentation for details: https://arxive.readthedocs.io
+
+    Copyright (C) 2025 David Gaal (gaaldvd@proton.me)
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import sqlite3
+from hashlib import sha1
+from threading import Lock
+from time import time_ns
+from os import path, makedirs, scandir, stat, fsencode, fsdecode
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+# Directories modified this close (in nanoseconds) to the time they were
+# indexed are read again, since a later change could keep the same mtime
+RACY_NS = 2_000_000_000
+
+
+class DirectoryIndex:
+    """Handles the on-disk index of a source/destination pair.
+
+    Every directory of both trees is stored with its mtime, ctime, number of
+    entries, the list of its entries and a digest rolled up from the entries
+    and the digests of its subdirectories (like a Merkle tree). Directories
+    whose mtime has not changed are not read again, and subtrees with the
+    same digest on both sides are skipped when the deletions are listed.
+
+    The index is kept in an SQLite database in `index_dir`, one file for
+    every source/destination pair.
+
+    :ivar str index_dir: The directory of the index files.
+    :ivar str source: The source directory.
+    :ivar str destination: The destination directory.
+    :ivar int workers: The number of threads reading directories.
+    :ivar str db_path: The path to the index file of the pair.
+    :ivar dict roots: The roots of the two trees (`source`/`destination`).
+    :ivar list errors: The directories that could not be read.
+    :ivar dict failed: The paths of the directories that could not be read
+        by side (their subtrees are not compared and keep their rows).
+
+    Methods:
+        update():
+            Brings the index up to date with the trees.
+
+        rebuild():
+            Drops the index and builds it again.
+
+        scan_deletions():
+            Lists deletions using the index.
+    """
+
+    # Next to the configuration file (`Config.config_path`)
+    index_dir = path.expanduser('~/.config/arxive-index')
+
+    def __init__(self, source, destination, workers=16):
+        self.source = source
+        self.destination = destination
+        self.workers = workers
+        self.errors = []
+        self.failed = {"source": set(), "destination": set()}
+
+        # Setting the roots of the trees the same way as rsync does
+        # (a source without a trailing slash goes into a directory
+        # of the same name)
+        if source.endswith("/"):
+            self.roots = {"source": source.rstrip("/") or "/",
+                          "destination": destination}
+            self.prefix = ""
+        else:
+            self.roots = {"source": source,
+                          "destination": path.join(destination,
+                                                   path.basename(source))}
+            self.prefix = path.basename(source)
+
+        key = sha1(f"{path.abspath(source)}\0{path.abspath(destination)}"
+                   f"\0{self.prefix}".encode(errors="surrogateescape"))
+        self.db_path = path.join(self.index_dir,
+                                 f"{key.hexdigest()[:16]}.sqlite")
+        makedirs(self.index_dir, exist_ok=True)
+        self.lock = Lock()
+        self.db = sqlite3.connect(self.db_path, check_same_thread=False)
+        self.db.execute("CREATE TABLE IF NOT EXISTS dirs ("
+                        "side TEXT, rel TEXT, mtime_ns INTEGER, "
+                        "ctime_ns INTEGER, count INTEGER, entries BLOB, "
+                        "digest BLOB, scanned_ns INTEGER, "
+                        "PRIMARY KEY (side, rel))")
+        self.digests = {"source": {}, "destination": {}}
+
+    def close(self):
+        """Close the index file."""
+
+        self.db.close()
+
+    def rebuild(self):
+        """Drop every directory of the index and read both trees again."""
+
+        with self.lock, self.db:
+            self.db.execute("DELETE FROM dirs")
+        self.update()
+
+    def entries(self, side, rel):
+        """Return the entries of an indexed directory.
+
+        :param str side: `source` or `destination`.
+        :param str rel: The path of the directory relative to the root.
+
+        :return: The names of the entries (directories with a trailing `/`).
+        :rtype: list
+        """
+
+        with self.lock:
+            row = self.db.execute(
+                "SELECT entries FROM dirs WHERE side = ? AND rel = ?",
+                (side, rel)).fetchone()
+        if not row or not row[0]:
+            return []
+        return [fsdecode(name) for name in row[0].split(b"\0")]
+
+    def _read_dir(self, side, rel, known):
+        """Stat a directory and read it only if it changed since indexing.
+
+        :return: The path, the subdirectories, and the new row of the
+            directory (`None` if it did not change).
+        :rtype: tuple
+        """
+
+        dir_path = path.join(self.roots[side], rel)
+        st = stat(dir_path)
+        row = known.get(rel)
+        if (row and row[0] == st.st_mtime_ns and row[1] == st.st_ctime_ns
+                and st.st_mtime_ns + RACY_NS < row[2]):
+            names = self.entries(side, rel)
+            return rel, [n[:-1] for n in names if n.endswith("/")], None
+
+        with scandir(dir_path) as entries:
+            names = sorted(f"{e.name}/" if e.is_dir(follow_symlinks=False)
+                           else e.name for e in entries)
+        new_row = (side, rel, st.st_mtime_ns, st.st_ctime_ns, len(names),
+                   b"\0".join(fsencode(n) for n in names), None, time_ns())
+        return rel, [n[:-1] for n in names if n.endswith("/")], new_row
+
+    def _update_side(self, side):
+        """Bring one tree of the index up to date.
+
+        Every directory gets stat-ed, but only the changed ones are read,
+        then the digests of the changed directories and their parents are
+        rolled up again.
+        """
+
+        with self.lock:
+            known = {rel: (mtime, ctime, scanned, digest) for
+                     rel, mtime, ctime, scanned, digest in self.db.execute(
+                         "SELECT rel, mtime_ns, ctime_ns, scanned_ns, digest "
+                         "FROM dirs WHERE side = ?", (side,))}
+
+        # Walking the tree on a thread pool
+        children, changed = {}, {}
+        failed = self.failed[side] = set()
+        if path.isdir(self.roots[side]):
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                pending = {executor.submit(self._read_dir, side, "",
+                                           known): ""}
+                while pending:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        try:
+                            rel, subdirs, row = future.result()
+                        except OSError as e:
+                            self.errors.append(f"{side}: {e}")
+                            failed.add(pending.pop(future))
+                            continue
+                        del pending[future]
+                        children[rel] = [f"{rel}/{d}" if rel else d
+                                         for d in subdirs]
+                        if row:
+                            changed[rel] = row
+                        for subdir in children[rel]:
+                            pending[executor.submit(
+                                self._read_dir, side, subdir, known)] = subdir
+
+        # Rolling up the digests from the deepest directories, a digest is
+        # only computed again if the directory or a subdirectory changed
+        digests, redigested = {}, {}
+        for rel in sorted(children, key=lambda r: r.count("/") + bool(r),
+                          reverse=True):
+            subdirs = [c for c in children[rel] if c in digests]
+            old = known.get(rel)
+            if (rel not in changed and old and old[3]
+                    and all(c in known and known[c][3] == digests[c]
+                            for c in subdirs)):
+                digests[rel] = old[3]
+                continue
+            if rel in changed:
+                entries = changed[rel][5]
+            else:
+                entries = b"\0".join(fsencode(n)
+                                     for n in self.entries(side, rel))
+            digests[rel] = sha1(
+                entries + b"".join(digests[c] for c in subdirs)).digest()
+            if rel in changed:
+                changed[rel] = changed[rel][:6] + (digests[rel],
+                                                   changed[rel][7])
+            else:
+                redigested[rel] = digests[rel]
+
+        # Writing the changes into the index in one transaction (the rows of
+        # the directories that could not be read are kept)
+        with self.lock, self.db:
+            self.db.executemany(
+                "INSERT OR REPLACE INTO dirs VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                changed.values())
+            self.db.executemany(
+                "UPDATE dirs SET digest = ? WHERE side = ? AND rel = ?",
+                [(digest, side, rel) for rel, digest in redigested.items()])
+            self.db.executemany(
+                "DELETE FROM dirs WHERE side = ? AND rel = ?",
+                [(side, rel) for rel in known if rel not in children
+                 and not self._in_failed(side, rel)])
+        self.digests[side] = digests
+
+    def _in_failed(self, side, rel):
+        """Check if a directory is in a subtree that could not be read."""
+
+        return any(rel == failed or rel.startswith(f"{failed}/")
+                   or failed == "" for failed in self.failed[side])
+
+    def update(self):
+        """Bring the index of both trees up to date (after a sync, only the
+        directories that changed are read again).
+        """
+
+        self.errors = []
+        for side in ("source", "destination"):
+            self._update_side(side)
+
+    def _list_subtree(self, rel):
+        """List an indexed directory of the destination recursively,
+        children first, the same way rsync reports a deleted directory.
+        """
+
+        entities = []
+        for name in reversed(self.entries("destination", rel)):
+            entity = f"{rel}/{name}" if rel else name
+            if name.endswith("/"):
+                entities.extend(self._list_subtree(entity[:-1]))
+            else:
+                entities.append(entity)
+        entities.append(f"{rel}/")
+        return entities
+
+    def scan_deletions(self):
+        """Find the files and directories that have been deleted from
+        `source` but are still present on `destination` using the index.
+
+        The index is updated first, then only the subtrees whose digest
+        differs between the two sides are compared. The subtrees that could
+        not be read on either side are skipped (and listed in `errors`).
+
+        :return: Generator of the paths of deleted entities relative to
+            `destination` (directories with a trailing `/`).
+        :rtype: generator
+        """
+
+        self.update()
+        source, dest = self.digests["source"], self.digests["destination"]
+        if "" not in source or "" not in dest:
+            return
+
+        stack = [""]
+        while stack:
+            rel = stack.pop()
+            if rel in self.failed["source"] or rel in self.failed[
+                    "destination"]:
+                continue
+            if source.get(rel) == dest.get(rel):
+                continue
+
+            # Comparing the entries of the directory, an entry only counts
+            # as deleted if its name is missing from the source
+            names = {name.rstrip("/"): name.endswith("/")
+                     for name in self.entries("source", rel)}
+            for name in reversed(self.entries("destination", rel)):
+                is_dir = name.endswith("/")
+                entity = f"{rel}/{name}" if rel else name
+                if name.rstrip("/") in names:
+                    if is_dir and names[name.rstrip("/")]:
+                        stack.append(entity[:-1])
+                elif is_dir:
+                    yield from (path.join(self.prefix, e) for e in
+                                self._list_subtree(entity[:-1]))
+                else:
+                    yield path.join(self.prefix, entity)
@@ -0,0 +1,233 @@
+"""
+arXive: A simple CLI/GUI frontend for rsync.
+
+This file contains the code for running the profiles of arXive
+concurrently.
+
+Check the documentation for details: https://arxive.readthedocs.io
+
+    Copyright (C) 2025 David Gaal (gaaldvd@proton.me)
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import sys
+from os import path, stat, makedirs
+from subprocess import Popen, DEVNULL, STDOUT
+from time import monotonic, sleep
+from urllib.parse import quote
+
+from arxive_records import format_duration
+
+# The directory of the logs of the jobs (next to `session.log`)
+JOBS_DIR = f"{path.dirname(path.dirname(path.abspath(__file__)))}/jobs"
+
+
+def device_key(directory):
+    """Return the device a directory is on, so that the jobs using the
+    same device can be limited.
+
+    The device of a local directory is its `st_dev` (of its closest
+    existing parent if it does not exist yet), a remote directory
+    (`host:path` or `rsync://host/path`) is identified by its host.
+
+    :param str directory: The source or the destination of a job.
+
+    :return: The key of the device (`None` if it cannot be determined).
+    :rtype: int or str
+    """
+
+    if directory.startswith("rsync://"):
+        return f"host:{directory[8:].split("/")[0]}"
+    if ":" in directory.split("/")[0]:
+        return f"host:{directory.split(":")[0]}"
+    directory = path.abspath(directory)
+    while True:
+        try:
+            return stat(directory).st_dev
+        except OSError:
+            if directory == path.dirname(directory):
+                return None
+            directory = path.dirname(directory)
+
+
+class Job:
+    """Holds a profile synchronized by a separate arXive CLI process
+    (in no-interruption mode).
+
+    :ivar str name: The name of the profile.
+    :ivar str source: The source directory.
+    :ivar str destination: The destination directory.
+    :ivar set devices: The keys of the devices of the source and the
+        destination (see :ref:`device_key <device-key>`).
+    :ivar str log_path: The session log of the job (named after the
+        profile, URL-encoded).
+    :ivar str output_path: The console output of the job.
+    :ivar subprocess.Popen process: The process of the job (`None` until
+        it is started).
+    :ivar int returncode: The exit code of the process (`None` until it
+        finished).
+    :ivar float started: The monotonic time the job was started.
+    :ivar float duration: The running time of the job in seconds.
+    :ivar bool resume: Resume the interrupted sync of the profile.
+
+    Methods:
+        start():
+            Starts the process of the job.
+
+        poll():
+            Checks if the process finished.
+    """
+
+    def __init__(self, name, profile, resume=False):
+        self.name = name
+        self.source = profile["source"]
+        self.destination = profile["destination"]
+        self.devices = {device_key(self.source),
+                        device_key(self.destination)} - {None}
+
+        # Encoding the name of the profile, so that every profile gets its
+        # own files inside `JOBS_DIR` (e.g. `a/b` is written as `a%2Fb`)
+        file_name = quote(name, safe="")
+        self.log_path = path.join(JOBS_DIR, f"{file_name}.log")
+        self.output_path = path.join(JOBS_DIR, f"{file_name}.out")
+        self.process = None
+        self.returncode = None
+        self.started = None
+        self.duration = 0.0
+        self.resume = resume
+
+    def start(self):
+        """Start an arXive CLI process synchronizing the profile.
+
+        :raises OSError: If the output file cannot be created or the
+            process cannot be started.
+        """
+
+        cmd = [sys.executable,
+               path.join(path.dirname(path.abspath(__file__)),
+                         "arxive_cli.py"),
+               self.source, self.destination, "true",
+               "--profile", self.name, "--log", self.log_path]
+        if self.resume:
+            cmd.append("--resume")
+        with open(self.output_path, 'w', encoding="utf-8") as output:
+            self.process = Popen(cmd, stdin=DEVNULL, stdout=output,
+                                 stderr=STDOUT)
+        self.started = monotonic()
+
+    def poll(self):
+        """Check if the process of the job finished.
+
+        :return: Whether the job is done.
+        :rtype: bool
+        """
+
+        if self.process.poll() is None:
+            return False
+        self.returncode = self.process.returncode
+        self.duration = monotonic() - self.started
+        return True
+
+
+def run_jobs(session, jobs, max_jobs=4, per_device=1, interval=0.2):
+    """Run jobs concurrently: at most `max_jobs` at the same time, and at
+    most `per_device` of them on the same device, so that jobs on the same
+    disk do not slow each other down. The jobs are started in order, a job
+    waiting for its device does not hold up the ones after it.
+
+    :param Session session: Handles the arXive session (of the runner).
+    :param list jobs: The jobs.
+    :param int max_jobs: The number of jobs running at the same time.
+    :param int per_device: The number of jobs running at the same time
+        on a device.
+    :param float interval: Seconds between checking the running jobs.
+
+    :return: The jobs (with their exit codes).
+    :rtype: list
+
+    :raises ValueError: If `max_jobs` or `per_device` is less than `1`
+        (no job could ever start).
+    """
+
+    if max_jobs < 1 or per_device < 1:
+        raise ValueError("max_jobs and per_device must be at least 1!")
+    makedirs(JOBS_DIR, exist_ok=True)
+    pending, running, busy = list(jobs), [], {}
+    while pending or running:
+
+        # Starting the jobs whose devices are free
+        for job in list(pending):
+            if len(running) >= max_jobs:
+                break
+            if any(busy.get(device, 0) >= per_device
+                   for device in job.devices):
+                continue
+            pending.remove(job)
+            try:
+                job.start()
+            except OSError as e:
+                session.log(f"Error while starting job {job.name}!", e)
+                continue
+            for device in job.devices:
+                busy[device] = busy.get(device, 0) + 1
+            running.append(job)
+            session.log(f"Job {job.name} started: {job.source} -> "
+                        f"{job.destination}")
+
+        sleep(interval)
+        for job in [job for job in running if job.poll()]:
+            running.remove(job)
+            for device in job.devices:
+                busy[device] -= 1
+            session.log(f"Job {job.name} finished "
+                        f"({describe_returncode(job.returncode)}, "
+                        f"{format_duration(job.duration)}).")
+    return jobs
+
+def describe_returncode(returncode):
+    """Describe the exit code of a job.
+
+    :param int returncode: The exit code (`None` if the job did not
+        start).
+
+    :return: The description.
+    :rtype: str
+    """
+
+    if returncode == 0:
+        return "OK"
+    if returncode is None:
+        return "not started"
+    if returncode < 0:
+        return f"killed by signal {-returncode}"
+    return f"failed with exit code {returncode}"
+
+def format_summary(jobs):
+    """Format the combined summary of the jobs: the status and the
+    duration of every job, then the number of failed jobs.
+
+    :param list jobs: The finished jobs.
+
+    :return: The summary.
+    :rtype: str
+    """
+
+    width = max(len(job.name) for job in jobs)
+    lines = [f"  {job.name:<{width}}  {format_duration(job.duration)}  "
+             f"{describe_returncode(job.returncode)}" for job in jobs]
+    failed = sum(1 for job in jobs if job.returncode != 0)
+    lines.append(f"{len(jobs) - failed} of {len(jobs)} job(s) succeeded"
+                 f"{f", see the logs in {JOBS_DIR}" if failed else ""}.")
+    return "\n".join(lines)
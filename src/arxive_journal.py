@@ -0,0 +1,164 @@
+"""
+arXive: A simple CLI/GUI frontend for rsync.
+
+This file contains the code for the session journal of arXive.
+
+Check the documentation for details: https://arxive.readthedocs.io
+
+    Copyright (C) 2025 David Gaal (gaaldvd@proton.me)
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from datetime import datetime
+from hashlib import sha1
+from json import dumps, loads
+from os import (path, makedirs, fsync, replace, unlink, open as open_fd,
+                close as close_fd, O_RDONLY)
+from tempfile import NamedTemporaryFile
+
+# The directory of the partially transferred files (relative to the
+# directories of the destination, see `rsync --partial-dir`)
+PARTIAL_DIR = ".arxive-partial"
+
+
+def fsync_dir(directory):
+    """Flush the entries of a directory (e.g. a renamed file) to the disk.
+
+    :param str directory: The path to the directory.
+    """
+
+    fd = open_fd(directory, O_RDONLY)
+    try:
+        fsync(fd)
+    finally:
+        close_fd(fd)
+
+
+class Journal:
+    """Handles the journal of the sync of a source/destination pair, so
+    that an interrupted sync can be resumed.
+
+    The journal is a JSON-lines file written ahead of the work: the first
+    line is the plan of the sync (written atomically), every following
+    line is a checkpoint appended when a step is done, e.g.:
+
+    .. code-block:: json
+
+        {"event": "start", "time": "...", "source": "...", "options": []}
+        {"event": "deleted", "entities": 120}
+        {"event": "sync_start", "shards": [["src/a", "src/b"], ["src/c"]]}
+        {"event": "shard_done", "shard": 1}
+
+    Every line is flushed to the disk (`fsync`) before the work goes on,
+    so after a crash the journal shows at most less work done than what
+    was actually done (a torn last line is ignored). The journal is
+    removed when the sync finished.
+
+    :ivar str journal_path: The path to the journal file.
+    :ivar dict state: The plan and the checkpoints read by `load`.
+
+    Methods:
+        load():
+            Reads the journal of an unfinished sync.
+
+        begin(**plan):
+            Starts a new journal.
+
+        checkpoint(event, **fields):
+            Appends a checkpoint.
+
+        finish():
+            Removes the journal.
+    """
+
+    # Next to the configuration file (`Config.config_path`)
+    journal_dir = path.expanduser('~/.config/arxive-journal')
+
+    def __init__(self, profile):
+        digest = sha1(profile.encode(errors="surrogateescape")).hexdigest()
+        self.journal_path = path.join(self.journal_dir,
+                                      f"{digest[:16]}.jsonl")
+        self.state = None
+
+    def load(self):
+        """Read the journal of an unfinished sync.
+
+        :return: The plan (the first record) with the events of the
+            checkpoints (`events`) and the finished shards (`done`),
+            or `None` if there is no journal.
+        :rtype: dict
+        """
+
+        if not path.exists(self.journal_path):
+            return None
+        with open(self.journal_path, 'r', encoding="utf-8") as file:
+            records = []
+            for line in file:
+                try:
+                    records.append(loads(line))
+                except ValueError:
+                    break
+        if not records or records[0].get("event") != "start":
+            return None
+
+        self.state = records[0]
+        self.state["events"] = {record["event"]: record
+                                for record in records[1:]}
+        self.state["done"] = {record["shard"] for record in records[1:]
+                              if record["event"] == "shard_done"}
+        return self.state
+
+    def begin(self, **plan):
+        """Start a new journal with the plan of the sync (replacing the
+        previous journal atomically).
+
+        :param plan: The data of the plan.
+        """
+
+        makedirs(self.journal_dir, exist_ok=True)
+        record = {"event": "start",
+                  "time": datetime.now().isoformat(timespec="seconds")}
+        record.update(plan)
+        with NamedTemporaryFile("w", encoding="utf-8", dir=self.journal_dir,
+                                prefix=".journal_", suffix=".tmp",
+                                delete=False) as file:
+            file.write(f"{dumps(record)}\n")
+            file.flush()
+            fsync(file.fileno())
+        replace(file.name, self.journal_path)
+        fsync_dir(self.journal_dir)
+
+    def checkpoint(self, event, **fields):
+        """Append a checkpoint to the journal and flush it to the disk.
+
+        :param str event: The name of the checkpoint.
+        :param fields: The data of the checkpoint.
+        """
+
+        record = {"event": event}
+        record.update(fields)
+        with open(self.journal_path, 'a', encoding="utf-8") as file:
+            file.write(f"{dumps(record)}\n")
+            file.flush()
+            fsync(file.fileno())
+
+    def finish(self):
+        """Remove the journal of the finished sync."""
+
+        try:
+            unlink(self.journal_path)
+            fsync_dir(self.journal_dir)
+        except FileNotFoundError:
+            pass
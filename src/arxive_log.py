@@ -0,0 +1,220 @@
+"""
+arXive: A simple CLI/GUI frontend for rsync.
+
+This file contains the code for the session log writer and the event
+trace of arXive.
+
+Check the documentation for details: https://arxive.readthedocs.io
+
+    Copyright (C) 2025 David Gaal (gaaldvd@proton.me)
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import atexit
+from contextlib import contextmanager
+from datetime import datetime
+from json import dumps
+from os import getpid
+from queue import Queue, Empty
+from sys import stderr
+from threading import Thread
+from time import monotonic
+
+# Console verbosity levels of the messages
+QUIET, NORMAL, VERBOSE = range(3)
+
+# Markers passed to the writer thread through the queue
+FLUSH, STOP = object(), object()
+
+
+class LogWriter:
+    """Writes lines into a file on a background thread.
+
+    The lines are put into a bounded queue (writers get blocked if it is
+    full) and written in batches: when `batch_size` lines are collected or
+    `interval` seconds passed since the first line of the batch. The file
+    is kept open and everything is written when the program exits
+    (normally or because of an exception).
+
+    :ivar str file_path: The path to the file (opened in append mode).
+    :ivar Queue queue: The lines waiting to be written.
+
+    :raises OSError: If the file cannot be opened.
+
+    Methods:
+        write(line):
+            Queues a line.
+
+        flush():
+            Waits until every queued line is written.
+
+        close():
+            Writes the queued lines and stops the thread.
+    """
+
+    batch_size = 1000
+    interval = 0.5
+    max_lines = 100_000
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+
+        # Opening the file here, so that the errors reach the caller
+        # (paths that are not valid UTF-8 are written as they are)
+        self.file = open(file_path, 'a', encoding="utf-8",
+                         errors="surrogateescape")
+        self.queue = Queue(maxsize=self.max_lines)
+        self.error = None
+        self.thread = Thread(target=self._run, name="arxive-log", daemon=True)
+        self.thread.start()
+        atexit.register(self.close)
+
+    def write(self, line):
+        """Queue a line to be written.
+
+        :param str line: The line (with the line break).
+        """
+
+        if self.thread.is_alive():
+            self.queue.put(line)
+
+    def flush(self):
+        """Write the queued lines now and wait until they are written."""
+
+        if self.thread.is_alive():
+            self.queue.put(FLUSH)
+            self.queue.join()
+
+    def close(self):
+        """Write the queued lines, then stop the writer thread."""
+
+        if self.thread.is_alive():
+            self.queue.put(STOP)
+            self.thread.join()
+        atexit.unregister(self.close)
+
+    def _run(self):
+        """Collect the lines into batches and write them (writer thread)."""
+
+        with self.file as file:
+            stop = False
+            while not stop:
+                batch = [self.queue.get()]
+                deadline = monotonic() + self.interval
+
+                # Collecting lines until the batch is full, the time is up
+                # or a marker arrives
+                while (len(batch) < self.batch_size
+                       and batch[-1] is not FLUSH and batch[-1] is not STOP):
+                    try:
+                        batch.append(self.queue.get(
+                            timeout=max(0.0, deadline - monotonic())))
+                    except Empty:
+                        break
+
+                stop = batch[-1] is STOP
+                try:
+                    file.write("".join(line for line in batch
+                                       if isinstance(line, str)))
+                    file.flush()
+                except Exception as e:
+
+                    # The lines are still consumed so that the writers
+                    # do not get blocked, the error is reported once
+                    if not self.error:
+                        self.error = e
+                        print(f"Error while writing the session log: {e}",
+                              file=stderr)
+                finally:
+                    for _ in batch:
+                        self.queue.task_done()
+
+
+class Trace:
+    """Writes a JSON-lines trace of the events of a session.
+
+    Every line is a JSON object with the name of the event and the
+    monotonic time (`t`, in seconds since the trace was started), e.g.:
+
+    .. code-block:: json
+
+        {"event": "phase_start", "t": 0.0012, "phase": "list_deletions"}
+        {"event": "rsync", "t": 4.2, "argv": ["rsync", "..."],
+         "returncode": 0, "duration": 4.19}
+        {"event": "phase_end", "t": 4.21, "phase": "list_deletions",
+         "duration": 4.2089}
+
+    The file is opened in append mode, so the traces of consecutive runs
+    follow each other, every run starts with a `session_start` event.
+
+    :ivar LogWriter writer: Writes the lines on a background thread.
+    :ivar float start: The monotonic time the trace was started.
+
+    Methods:
+        event(name, **fields):
+            Writes an event.
+
+        phase(name, **fields):
+            Context manager writing the start and the end of a phase.
+
+        close():
+            Writes the queued events and closes the trace.
+    """
+
+    def __init__(self, file_path, **fields):
+        self.writer = LogWriter(file_path)
+        self.start = monotonic()
+        self.event("session_start",
+                   time=datetime.now().isoformat(timespec="seconds"),
+                   pid=getpid(), **fields)
+
+    def event(self, name, **fields):
+        """Write an event into the trace.
+
+        :param str name: The name of the event.
+        :param fields: The data of the event (converted to strings
+            if they cannot be serialized).
+        """
+
+        record = {"event": name, "t": round(monotonic() - self.start, 6)}
+        record.update(fields)
+        self.writer.write(f"{dumps(record, default=str)}\n")
+
+    @contextmanager
+    def phase(self, name, **fields):
+        """Write the start and the end of a phase (with its duration and
+        the error that ended it, if any).
+
+        :param str name: The name of the phase.
+        :param fields: The data written with the start of the phase.
+        """
+
+        start = monotonic()
+        self.event("phase_start", phase=name, **fields)
+        error = None
+        try:
+            yield
+        except Exception as e:
+            error = repr(e)
+            raise
+        finally:
+            self.event("phase_end", phase=name,
+                       duration=round(monotonic() - start, 6),
+                       **({"error": error} if error else {}))
+
+    def close(self):
+        """Write the queued events and close the trace."""
+
+        self.writer.close()
@@ -0,0 +1,135 @@
+"""
+arXive: A simple CLI/GUI frontend for rsync.
+
+This file contains the code for the Prometheus metrics export of arXive.
+
+Check the documentation for details: https://arxive.readthedocs.io
+
+    Copyright (C) 2025 David Gaal (gaaldvd@proton.me)
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from hashlib import sha1
+from os import path, makedirs, chmod, replace, unlink
+from tempfile import NamedTemporaryFile
+from time import time
+
+# The phases of a session exported as durations
+PHASES = ("list_deletions", "delete", "sync")
+
+
+def escape_label(value):
+    """Escape a label value for the Prometheus text format.
+
+    :param str value: The value of the label (the undecodable bytes of a
+        path are written as `\\xNN`).
+
+    :return: The escaped value.
+    :rtype: str
+    """
+
+    value = str(value).encode(errors="surrogateescape").decode(
+        errors="backslashreplace")
+    return (value.replace("\\", "\\\\").replace("\"", "\\\"")
+            .replace("\n", "\\n"))
+
+def format_metrics(session):
+    """Format the metrics of a session in the Prometheus text format.
+
+    :param Session session: Handles the arXive session.
+
+    :return: The metrics, labeled with the source/destination profile.
+    :rtype: str
+    """
+
+    labels = (f'profile="{escape_label(session.get_profile())}",'
+              f'source="{escape_label(session.source)}",'
+              f'destination="{escape_label(session.destination)}"')
+    metrics = [
+        ("arxive_phase_duration_seconds", "gauge",
+         "Duration of the phases of the last session.",
+         [(f'{labels},phase="{phase}"', session.timings.get(phase, 0.0))
+          for phase in PHASES]),
+        ("arxive_entities_listed", "gauge",
+         "Entities deleted from the source but present on the destination.",
+         [(labels, len(session.deletions or ()))]),
+        ("arxive_entities_deleted", "gauge",
+         "Entities deleted from the destination.",
+         [(labels, session.deleted or 0)]),
+        ("arxive_entities_failed", "gauge",
+         "Entities that could not be deleted from the destination.",
+         [(labels, session.failed)]),
+        ("arxive_transferred_files", "gauge",
+         "Regular files transferred by rsync.",
+         [(labels, session.stats.get("files", 0))]),
+        ("arxive_transferred_bytes", "gauge",
+         "Size of the files transferred by rsync.",
+         [(labels, session.stats.get("transferred_bytes", 0))]),
+        ("arxive_sent_bytes", "gauge",
+         "Bytes sent by rsync.",
+         [(labels, session.stats.get("sent_bytes", 0))]),
+        ("arxive_rsync_exit_code", "gauge",
+         "Exit code of the sync (-1 if rsync did not run).",
+         [(labels, -1 if session.returncode is None
+           else session.returncode)]),
+        ("arxive_last_run_timestamp_seconds", "gauge",
+         "Time the last session finished.",
+         [(labels, round(time(), 3))])]
+
+    lines = []
+    for name, kind, description, samples in metrics:
+        lines.append(f"# HELP {name} {description}")
+        lines.append(f"# TYPE {name} {kind}")
+        for sample_labels, value in samples:
+            if isinstance(value, float):
+                value = round(value, 6)
+            lines.append(f"{name}{{{sample_labels}}} {value}")
+    return "\n".join(lines) + "\n"
+
+def write_metrics(session, metrics_dir):
+    """Write the metrics of a session into a `.prom` file for the textfile
+    collector of the node exporter.
+
+    The file is named after the profile, so every source/destination pair
+    has its own file. It is written atomically (into a temporary file that
+    replaces the previous one), so the collector never reads a partial file.
+
+    :param Session session: Handles the arXive session.
+    :param str metrics_dir: The directory of the textfile collector.
+
+    :return: The path to the metrics file.
+    :rtype: str
+
+    :raises OSError: If the file cannot be written.
+    """
+
+    makedirs(metrics_dir, exist_ok=True)
+    key = sha1(session.get_profile().encode(errors="surrogateescape"))
+    metrics_path = path.join(metrics_dir,
+                             f"arxive_{key.hexdigest()[:16]}.prom")
+
+    # The temporary file must not end with `.prom`, otherwise the collector
+    # could read it, and it has to be readable by the node exporter
+    file = NamedTemporaryFile("w", encoding="utf-8", dir=metrics_dir,
+                              prefix=".arxive_", suffix=".tmp", delete=False)
+    try:
+        with file:
+            file.write(format_metrics(session))
+        chmod(file.name, 0o644)
+        replace(file.name, metrics_path)
+    except OSError:
+        unlink(file.name)
+        raise
+    return metrics_path
@@ -0,0 +1,138 @@
+"""
+arXive: A simple CLI/GUI frontend for rsync.
+
+This file contains the code for detecting files moved or renamed on
+the source, so that they are not deleted and transferred again.
+
+Check the documentation for details: https://arxive.readthedocs.io
+
+    Copyright (C) 2025 David Gaal (gaaldvd@proton.me)
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from hashlib import blake2b
+from os import path, lstat
+from stat import S_ISREG
+
+from arxive_records import CREATE, DELETE
+
+# Smaller files are transferred again (moving them saves next to nothing)
+MIN_MOVE_SIZE = 4096
+
+# The size of the blocks read while hashing
+HASH_BLOCK = 1 << 20
+
+
+def hash_file(file_path):
+    """Hash the contents of a file.
+
+    :param str file_path: The path to the file.
+
+    :return: The BLAKE2b digest of the contents (`None` if the file
+        cannot be read).
+    :rtype: bytes
+    """
+
+    digest = blake2b()
+    try:
+        with open(file_path, 'rb') as file:
+            while block := file.read(HASH_BLOCK):
+                digest.update(block)
+    except OSError:
+        return None
+    return digest.digest()
+
+def _file_key(file_path):
+    """Return the size and the modification time (in seconds) of a regular
+    file big enough to be moved (`None` otherwise).
+    """
+
+    try:
+        st = lstat(file_path)
+    except OSError:
+        return None
+    if not S_ISREG(st.st_mode) or st.st_size < MIN_MOVE_SIZE:
+        return None
+    return st.st_size, int(st.st_mtime)
+
+def find_moves(records, source_root, destination, workers=8):
+    """Find the deleted files of the destination that are on the source
+    under a new path (moved, renamed or copied).
+
+    The deleted files (`DELETE` records) and the new files (`CREATE`
+    records) are matched by size and modification time first (both are
+    kept by `mv` and by `rsync -a`), then only the files with matching
+    sizes and times are hashed (in parallel) to confirm that their contents
+    are the same. A deleted file can match several new files (copies), the
+    one with the same name is preferred when several deleted files have the
+    same contents.
+
+    :param PlanRecords records: The records of an itemized dry-run.
+    :param str source_root: The root of the transfer on the source (see
+        :ref:`Session.transfer_root <transfer-root>`).
+    :param str destination: The destination directory.
+    :param int workers: The number of threads hashing files.
+
+    :return: The new paths of the deleted files by their paths (relative to
+        `destination`) and the sizes of the deleted files.
+    :rtype: tuple
+    """
+
+    # Indexing the deleted files by size and modification time
+    deleted = {}
+    for kind, _, entity in records:
+        if kind == DELETE and not entity.endswith("/"):
+            key = _file_key(path.join(destination, entity))
+            if key:
+                deleted.setdefault(key, []).append(entity)
+    if not deleted:
+        return {}, {}
+
+    # The new files with a deleted file of the same size and time
+    candidates = {}
+    for kind, _, entity in records:
+        if kind == CREATE and not entity.endswith("/"):
+            key = _file_key(path.join(source_root, entity))
+            if key in deleted:
+                candidates.setdefault(key, []).append(entity)
+    if not candidates:
+        return {}, {}
+
+    # Hashing only the files with matching sizes and times
+    files = [(destination, entity) for key in candidates
+             for entity in deleted[key]]
+    files += [(source_root, entity) for key in candidates
+              for entity in candidates[key]]
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        digests = dict(zip(files, executor.map(
+            lambda file: hash_file(path.join(*file)), files)))
+
+    moves, sizes = {}, {}
+    for key, entities in candidates.items():
+        olds = {}
+        for old in deleted[key]:
+            if digests[(destination, old)] is not None:
+                olds.setdefault(digests[(destination, old)], []).append(old)
+        for new in entities:
+            matching = olds.get(digests[(source_root, new)])
+            if not matching:
+                continue
+            name = path.basename(new)
+            old = next((old for old in matching
+                        if path.basename(old) == name), matching[0])
+            moves.setdefault(old, []).append(new)
+            sizes[old] = key[0]
+    return moves, sizes
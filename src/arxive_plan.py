@@ -0,0 +1,300 @@
+"""
+arXive: A simple CLI/GUI frontend for rsync.
+
+This file contains the code for the sync plans of arXive.
+
+Check the documentation for details: https://arxive.readthedocs.io
+
+    Copyright (C) 2025 David Gaal (gaaldvd@proton.me)
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from hashlib import sha256
+from os import lstat
+
+from arxive_cli import *
+
+
+class Plan:
+    """Holds a sync plan: the result of an itemized rsync dry-run and the
+    deletions chosen by the user.
+
+    The plan file (JSON) has the following format:
+
+    .. code-block:: json
+
+        {
+            "version": 1,
+            "created": "2025 Jan 01. - 12:00:00",
+            "source": "/path/to/source",
+            "destination": "/path/to/destination",
+            "options": ["-l"],
+            "records": [[0, 1024, "source/new.txt"], [2, 10, "source/old"]],
+            "chosen": ["source/old"],
+            "fingerprint": "..."
+        }
+
+    The records are (kind, size, path) triples, see
+    :ref:`PlanRecords <planrecords-class>`.
+
+    :ivar str source: The source directory.
+    :ivar str destination: The destination directory.
+    :ivar list options: Additional options passed to the rsync command.
+    :ivar PlanRecords records: The changes and deletions rsync would make.
+    :ivar list chosen: The deletions chosen to be deleted.
+    :ivar str fingerprint: The fingerprint of the entities of the plan.
+
+    Methods:
+        create(session):
+            Creates a plan with an itemized dry-run.
+
+        load(plan_path):
+            Loads a plan file.
+
+        save(plan_path):
+            Saves the plan file.
+
+        get_fingerprint():
+            Computes the fingerprint of the entities of the plan.
+    """
+
+    # Version 2 keeps the records of the dry-run instead of the transfers
+    # and the deletions
+    version = 2
+
+    def __init__(self, source, destination, options):
+        self.source = source
+        self.destination = destination
+        self.options = options
+        self.created = datetime.now().strftime("%Y %b %d. - %X")
+        self.records = PlanRecords()
+        self.chosen = []
+        self.fingerprint = None
+
+    @classmethod
+    def create(cls, session):
+        """Do an itemized dry-run of the sync of `session`.
+
+        :param Session session: Handles the arXive session.
+
+        :return: The plan (without chosen deletions).
+        :rtype: Plan
+
+        :raises CalledProcessError: If rsync exits with a non-zero code.
+        """
+
+        plan = cls(session.source, session.destination, session.options)
+        with session.phase("dry_run"):
+            for _ in session.dry_run():
+                pass
+        plan.records = session.records
+
+        plan.fingerprint = plan.get_fingerprint()
+        return plan
+
+    @classmethod
+    def load(cls, plan_path):
+        """Load a plan file.
+
+        :param str plan_path: The path to the plan file.
+
+        :return: The loaded plan.
+        :rtype: Plan
+
+        :raises ValueError: If the plan file has a different version.
+        """
+
+        with open(plan_path, 'r', encoding="utf-8") as file:
+            data = load(file)
+        if data.get("version") != cls.version:
+            raise ValueError(f"Unsupported plan version: "
+                             f"{data.get('version')} (expected "
+                             f"{cls.version}), create the plan again")
+        plan = cls(data["source"], data["destination"], data["options"])
+        plan.created = data["created"]
+        for kind, size, entity in data["records"]:
+            plan.records.append(kind, size, entity)
+        plan.chosen = data["chosen"]
+        plan.fingerprint = data["fingerprint"]
+        return plan
+
+    def save(self, plan_path):
+        """Save the plan into a JSON file.
+
+        :param str plan_path: The path to the plan file.
+        """
+
+        with open(plan_path, 'w', encoding="utf-8") as file:
+            dump({"version": self.version, "created": self.created,
+                  "source": self.source, "destination": self.destination,
+                  "options": self.options,
+                  "records": [list(record) for record in self.records],
+                  "chosen": self.chosen,
+                  "fingerprint": self.fingerprint}, file)
+
+    def get_fingerprint(self):
+        """Compute the fingerprint of the entities of the plan: the type,
+        size and mtime of every entity to be transferred (on the source)
+        and of every deleted entity (on the destination).
+
+        :return: The hexadecimal SHA-256 digest.
+        :rtype: str
+        """
+
+        root = get_transfer_root(self.source)
+        digest = sha256()
+        for side, entities in (
+                (root, self.records.paths(CREATE, UPDATE, OTHER)),
+                (self.destination, self.records.paths(DELETE))):
+            for entity in entities:
+                try:
+                    st = lstat(path.join(side, entity))
+                    state = f"{st.st_mode:o}:{st.st_size}:{st.st_mtime_ns}"
+                except OSError:
+                    state = "missing"
+                digest.update(f"{entity}\0{state}\0".encode(
+                    errors="surrogateescape"))
+        return digest.hexdigest()
+
+
+def create_plan(session, plan_path, no_interrupt):
+    """Create a plan, let the user choose the deletions, then save it.
+
+    :param Session session: Handles the arXive session.
+    :param str plan_path: The path to the plan file.
+    :param bool no_interrupt: Choose every deletion without prompting.
+    """
+
+    session.log("Creating plan...")
+    try:
+        plan = Plan.create(session)
+    except CalledProcessError as e:
+        session.log(f"Error while creating plan ({e.returncode})!", e.stderr)
+        close("Goodbye!")
+
+    deletions = plan.records.paths(DELETE)
+    session.log(f"\n{len(plan.records) - len(deletions)} change(s) and "
+                f"{len(deletions)} deletion(s) found.\n")
+
+    # Choosing the deletions
+    if deletions:
+        session.deletions = deletions
+        tree = print_deletions(session)
+        plan.chosen = choose_deletions(session, no_interrupt, tree)
+    session.log(describe_estimate(session.estimate()))
+
+    try:
+        plan.save(plan_path)
+        session.log(f"Plan saved to {plan_path}.")
+    except (FileNotFoundError, PermissionError, OSError) as e:
+        session.log("Error while saving plan!", e)
+
+def apply_plan(session, plan_path, no_interrupt):
+    """Delete the chosen deletions of a plan, then synchronize exactly the
+    entities of the plan.
+
+    The plan is refused if any of its entities changed since it was created.
+
+    :param Session session: Handles the arXive session.
+    :param str plan_path: The path to the plan file.
+    :param bool no_interrupt: Apply the plan without prompting.
+    """
+
+    try:
+        plan = Plan.load(plan_path)
+    except (FileNotFoundError, PermissionError, OSError,
+            ValueError, KeyError) as e:
+        session.log("Error while loading plan!", e)
+        close("Goodbye!")
+
+    session.source, session.destination = plan.source, plan.destination
+    session.options = plan.options
+    session.records, session.chosen = plan.records, plan.chosen
+    transfers = plan.records.paths(CREATE, UPDATE, OTHER)
+    session.log(f"Plan created: {plan.created}\n"
+                f"Source: {plan.source}\n"
+                f"Destination: {plan.destination}\n"
+                f"{len(transfers)} change(s), {len(plan.chosen)} of "
+                f"{plan.records.count(DELETE)} deletion(s) chosen.\n"
+                f"{describe_estimate(session.estimate())}")
+
+    # Refusing stale plans
+    if plan.get_fingerprint() != plan.fingerprint:
+        session.log("Error: the source or the destination changed "
+                    "since the plan was created!")
+        close("Goodbye!")
+
+    if not no_interrupt and input("\nApply plan? [Y/n]: "
+                                  ).strip().lower() == "n":
+        session.log("\nPlan not applied.")
+        close("Goodbye!")
+
+    # Deleting the chosen entities
+    if plan.chosen:
+        session.deletions = plan.records.paths(DELETE)
+        session.log(f"Deleting {len(plan.chosen)} entities...")
+        for entity, e in session.delete_entities(plan.chosen):
+            session.log(f"Error while deleting "
+                        f"{shorten_path(path.join(session.destination, entity),
+                                        TERMINAL_SIZE - 22)}"
+                        f"!", e)
+        session.log(f"{session.deleted} entities deleted.")
+
+    # Synchronizing the entities of the plan
+    if transfers:
+        session.log(f"Syncing {len(transfers)} entities...")
+        try:
+            session.sync(files_from=transfers)
+            session.log("\nSynchronization finished. Goodbye!")
+        except CalledProcessError as e:
+            session.log("Warning: something went wrong "
+                        "while running rsync!", e.returncode)
+    else:
+        session.log("Nothing to synchronize. Goodbye!")
+
+def main():
+    """arXive plan script.
+
+    `arxive plan <source> <destination> -o <plan file>` creates a plan,
+    `arxive apply <plan file>` applies it.
+
+    :var Session session: Handles the arXive session.
+    :var Config config: Holds and handles configurations.
+    :var bool no_interrupt: Shows if no-interruption mode is active
+        for the current session.
+    """
+
+    if "--apply" in argv[4:]:
+        session = None
+        try:
+            session = Session()
+            session.log("Session log created.")
+        except (FileNotFoundError, PermissionError, OSError) as e:
+            print(f"Error while creating session log: {e}")
+            close("Goodbye!")
+        if stdout.isatty():
+            session.progress_callback = draw_progress
+        apply_plan(session, argv[1], argv[3] == "true")
+    else:
+        if "--output" not in argv[4:-1]:
+            print("Error: the plan file must be set with -o!")
+            close("Goodbye!")
+        plan_path = argv[argv.index("--output", 4) + 1]
+        session, config, no_interrupt = start_session(argv[1], argv[2])
+        create_plan(session, plan_path, no_interrupt)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,505 @@
+"""
+arXive: A simple CLI/GUI frontend for rsync.
+
+This file contains the code for the dry-run records and the transfer
+estimates of arXive.
+
+Check the documentation for details: https://arxive.readthedocs.io
+
+    Copyright (C) 2025 David Gaal (gaaldvd@proton.me)
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import re
+from array import array
+from json import load, dump
+from os import path
+
+# Kinds of the records
+CREATE, UPDATE, DELETE, OTHER = range(4)
+
+# Output format of the itemized dry-run parsed by `parse_record`
+RECORD_FORMAT = "--out-format=%i|%l|%n"
+
+# A line of `rsync --info=progress2`, e.g.
+# `  1,234,567  45%   12.34MB/s    0:01:23 (xfr#12, to-chk=100/2000)`
+PROGRESS_PATTERN = re.compile(
+    r"^\s*([\d,.]+)([KMGTP]?)\s+(\d+)%\s+([\d,.]+)([kKMGTP]?)B/s"
+    r"\s+(\d+):(\d\d):(\d\d)(?:\s+\(xfr#(\d+), \w+-chk=(\d+)/(\d+)\))?")
+
+# The thousands separators of the numbers in the progress
+THOUSANDS_PATTERN = re.compile(r"[,.](?=\d{3}(?:[,.]|$))")
+
+
+def parse_record(line):
+    """Parse a line of an itemized rsync dry-run (see `RECORD_FORMAT`).
+
+    :param str line: A line of the output.
+
+    :return: The kind, the size (the bytes to send, or the size of the
+        deleted file) and the path of the record, or `None` if the line
+        is not a record.
+    :rtype: tuple
+    """
+
+    parts = line.rstrip("\n").split("|", 2)
+    if len(parts) != 3 or not parts[1].isdigit():
+        return None
+    item, size, entity = parts
+    if item.startswith("*deleting"):
+        return DELETE, int(size), entity
+
+    # Only regular files sent by rsync have data to transfer
+    size = int(size) if item[:2] in (">f", "<f") else 0
+    if item[2:3] == "+":
+        return CREATE, size, entity
+    if item[:1] in "<>":
+        return UPDATE, size, entity
+    return OTHER, size, entity
+
+def parse_stats(output):
+    """Parse the statistics printed by rsync with `--stats`.
+
+    :param str output: The output of rsync (at least its end).
+
+    :return: The number of regular files transferred, the size of the
+        transferred files and the bytes sent and received (the missing
+        values are left out).
+    :rtype: dict
+    """
+
+    keys = {"Number of regular files transferred": "files",
+            "Total transferred file size": "transferred_bytes",
+            "Total bytes sent": "sent_bytes",
+            "Total bytes received": "received_bytes"}
+    stats = {}
+    for line in output.splitlines():
+        name, _, value = line.partition(":")
+        if name.strip() in keys:
+            value = (value.split()[0].replace(",", "").replace(".", "")
+                     if value.split() else "")
+            if value.isdigit():
+                stats[keys[name.strip()]] = int(value)
+    return stats
+
+def _scale(number, unit):
+    """Convert a number printed by rsync (with thousands separators and an
+    optional unit, e.g. `1,234`, `123.45` or `12.34M`) to an integer.
+    """
+
+    # Only the separators followed by groups of three digits are thousands
+    # separators, the remaining one is the decimal point
+    number = THOUSANDS_PATTERN.sub("", number).replace(",", ".")
+    if not unit:
+        return int(float(number))
+    return int(float(number) * 1024 ** ("KMGTP".index(unit.upper()) + 1))
+
+def parse_progress(line):
+    """Parse a line of the overall progress of rsync
+    (`--info=progress2`).
+
+    :param str line: A line of the output (terminated by a carriage return).
+
+    :return: The bytes transferred so far, the percentage, the rate (bytes
+        per second), the estimated remaining time (seconds) and the number
+        of files transferred and left to check (if shown), or `None` if the
+        line is not a progress line.
+    :rtype: dict
+    """
+
+    match = PROGRESS_PATTERN.match(line)
+    if not match:
+        return None
+    (size, size_unit, percent, rate, rate_unit, hours, minutes, seconds,
+     transferred, to_check, total) = match.groups()
+    try:
+        return {"bytes": _scale(size, size_unit), "percent": int(percent),
+                "rate": _scale(rate, rate_unit),
+                "eta": int(hours) * 3600 + int(minutes) * 60 + int(seconds),
+                "files": int(transferred) if transferred else None,
+                "to_check": int(to_check) if to_check else None,
+                "total": int(total) if total else None}
+    except ValueError:
+        return None
+
+def format_size(size):
+    """Format a number of bytes for humans.
+
+    :param int size: The number of bytes.
+
+    :return: The formatted size (e.g. `1.5 GiB`).
+    :rtype: str
+    """
+
+    for unit in ("B", "KiB", "MiB", "GiB", "TiB"):
+        if size < 1024 or unit == "TiB":
+            return f"{size:.1f} {unit}" if unit != "B" else f"{size} B"
+        size /= 1024
+
+def format_duration(seconds):
+    """Format a duration for humans.
+
+    :param float seconds: The duration in seconds.
+
+    :return: The formatted duration (e.g. `1:02:03`).
+    :rtype: str
+    """
+
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02}:{seconds:02}"
+
+def describe_progress(progress):
+    """Describe the progress of a sync (see
+    :ref:`parse_progress <parse-progress>`) in one short line.
+
+    :param dict progress: The progress.
+
+    :return: The description.
+    :rtype: str
+    """
+
+    return (f"{progress['percent']}% - {format_size(progress['bytes'])}, "
+            f"{format_size(progress['rate'])}/s, "
+            f"ETA {format_duration(progress['eta'])}")
+
+def describe_estimate(estimate):
+    """Describe an estimate returned by
+    :ref:`Session.estimate <estimate>` in one line.
+
+    :param dict estimate: The estimate.
+
+    :return: The description.
+    :rtype: str
+    """
+
+    duration = (format_duration(estimate["seconds"])
+                if estimate["seconds"] is not None else "unknown")
+    return (f"Estimate: {estimate['created']} to create, "
+            f"{estimate['updated']} to update, "
+            f"{estimate['deleted']} to delete, "
+            f"{format_size(estimate['bytes'])} to send, "
+            f"duration: {duration}")
+
+
+class PlanRecords:
+    """Holds the records of an itemized dry-run in compact arrays.
+
+    A plan can have millions of records, so instead of a list of objects
+    the kinds, sizes and path offsets are kept in typed arrays and the paths
+    in a single buffer (separated by NUL characters).
+
+    Methods:
+        append(kind, size, entity):
+            Adds a record.
+
+        paths(*kinds):
+            Returns the paths of the records of the given kinds.
+
+        count(kind):
+            Returns the number of records of a kind.
+
+        total_size(*kinds):
+            Returns the total size of the records of the given kinds.
+    """
+
+    def __init__(self):
+        self.kinds = array('B')
+        self.sizes = array('q')
+        self.offsets = array('Q', [0])
+        self.buffer = bytearray()
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def __iter__(self):
+        for index in range(len(self.kinds)):
+            yield self.kinds[index], self.sizes[index], self.path(index)
+
+    def append(self, kind, size, entity):
+        """Add a record.
+
+        :param int kind: `CREATE`, `UPDATE`, `DELETE` or `OTHER`.
+        :param int size: The size of the record.
+        :param str entity: The path of the entity.
+        """
+
+        self.kinds.append(kind)
+        self.sizes.append(size)
+        self.buffer += entity.encode(errors="surrogateescape") + b"\0"
+        self.offsets.append(len(self.buffer))
+
+    def path(self, index):
+        """Return the path of a record.
+
+        :param int index: The index of the record.
+
+        :return: The path of the entity.
+        :rtype: str
+        """
+
+        return self.buffer[self.offsets[index]:
+                           self.offsets[index + 1] - 1].decode(
+            errors="surrogateescape")
+
+    def paths(self, *kinds):
+        """Return the paths of the records of the given kinds.
+
+        :return: The paths in the order of the dry-run.
+        :rtype: list
+        """
+
+        return [self.path(index) for index, kind in enumerate(self.kinds)
+                if kind in kinds]
+
+    def count(self, kind):
+        """Return the number of records of a kind."""
+
+        return self.kinds.count(kind)
+
+    def total_size(self, *kinds):
+        """Return the total size of the records of the given kinds."""
+
+        return sum(size for kind, size in zip(self.kinds, self.sizes)
+                   if kind in kinds)
+
+
+class ThroughputHistory:
+    """Handles the throughput measured on previous syncs.
+
+    The history file (`history_path`) stores the last runs of every
+    source/destination pair (profile):
+
+    .. code-block:: json
+
+        {
+            "/path/to/source -> /path/to/destination": [
+                {"bytes": 1048576, "files": 10, "seconds": 2.5}
+            ]
+        }
+
+    Methods:
+        record(profile, size, files, seconds):
+            Saves a run.
+
+        predict(profile, size, files):
+            Predicts the duration of a sync.
+    """
+
+    # Next to the configuration file (`Config.config_path`)
+    history_path = path.expanduser('~/.config/arxive-history.json')
+
+    # The number of runs kept for every profile
+    max_runs = 20
+
+    def __init__(self):
+        self.runs = {}
+        if path.exists(self.history_path):
+            with open(self.history_path, 'r', encoding="utf-8") as file:
+                self.runs = load(file)
+
+    def record(self, profile, size, files, seconds):
+        """Save a run into the history.
+
+        :param str profile: The source/destination pair.
+        :param int size: The bytes sent.
+        :param int files: The number of files created or updated.
+        :param float seconds: The duration of the sync.
+        """
+
+        runs = self.runs.setdefault(profile, [])
+        runs.append({"bytes": size, "files": files, "seconds": seconds})
+        del runs[:-self.max_runs]
+        with open(self.history_path, 'w', encoding="utf-8") as file:
+            dump(self.runs, file)
+
+    def predict(self, profile, size, files):
+        """Predict the duration of a sync from the previous runs.
+
+        The duration is modelled as `bytes / throughput + files * overhead`,
+        both fitted to the previous runs with least squares. With too few
+        (or too similar) runs only the average throughput is used.
+
+        :param str profile: The source/destination pair.
+        :param int size: The bytes to send.
+        :param int files: The number of files to create or update.
+
+        :return: The predicted duration in seconds (`None` without history).
+        :rtype: float
+        """
+
+        runs = [run for run in self.runs.get(profile, [])
+                if run["seconds"] > 0]
+        if not runs:
+            return None
+
+        # Solving the normal equations of the two parameter model
+        bb = sum(run["bytes"] ** 2 for run in runs)
+        ff = sum(run["files"] ** 2 for run in runs)
+        bf = sum(run["bytes"] * run["files"] for run in runs)
+        bt = sum(run["bytes"] * run["seconds"] for run in runs)
+        ft = sum(run["files"] * run["seconds"] for run in runs)
+        det = bb * ff - bf ** 2
+        if det > 1e-9 * bb * ff:
+            per_byte = (bt * ff - ft * bf) / det
+            per_file = (ft * bb - bt * bf) / det
+            if per_byte >= 0 and per_file >= 0:
+                return size * per_byte + files * per_file
+
+        # Falling back to the average throughput
+        total = sum(run["bytes"] for run in runs)
+        seconds = sum(run["seconds"] for run in runs)
+        if total == 0:
+            return seconds / len(runs)
+        return size * seconds / total
+
+
+class DeletionNode:
+    """A node of a :ref:`DeletionTree <deletiontree-class>`.
+
+    :ivar dict children: The child nodes by name (directories with a
+        trailing `/`), `None` if the node has no children.
+    :ivar bool deleted: Shows if the entity itself is a deletion (otherwise
+        it is a directory only containing deletions).
+    :ivar int files: The number of deleted files in the subtree.
+    :ivar int size: The total size of the deletions in the subtree.
+    """
+
+    __slots__ = ("children", "deleted", "files", "size")
+
+    def __init__(self):
+        self.children = None
+        self.deleted = False
+        self.files = 0
+        self.size = 0
+
+
+class DeletionTree:
+    """Holds the deletions in a path trie.
+
+    rsync reports every entity of a directory deleted from the source, so a
+    single deleted directory can be hundreds of thousands of deletions. In
+    the trie every path component is stored once, and a deleted directory
+    can be shown (and chosen) as one entry with the number of files and the
+    total size below it.
+
+    :ivar DeletionNode root: The root of the trie (the destination).
+    :ivar bool sized: Shows if the sizes of the deletions are known
+        (they come from the records of the itemized dry-run).
+
+    Methods:
+        add(entity, size=0):
+            Adds a deletion.
+
+        find(entity):
+            Returns the node of a path.
+
+        nodes(entity=""):
+            Returns the collapsed deletions below a path.
+
+        paths(entity):
+            Returns every deletion below a path.
+    """
+
+    def __init__(self, sized=False):
+        self.root = DeletionNode()
+        self.sized = sized
+
+    def add(self, entity, size=0):
+        """Add a deletion (directories are added with a trailing `/`).
+
+        :param str entity: The path of the entity relative to the
+            destination.
+        :param int size: The size of the entity.
+        """
+
+        is_file = not entity.endswith("/")
+        names = entity.rstrip("/").split("/")
+        node = self.root
+        node.files += is_file
+        node.size += size
+        for index, name in enumerate(names):
+            key = name if is_file and index == len(names) - 1 else f"{name}/"
+            if node.children is None:
+                node.children = {}
+            child = node.children.get(key)
+            if child is None:
+                child = node.children[key] = DeletionNode()
+            node = child
+            node.files += is_file
+            node.size += size
+        node.deleted = True
+
+    def find(self, entity):
+        """Return the node of a path.
+
+        :param str entity: The path (directories with a trailing `/`),
+            an empty string for the root.
+
+        :return: The node (`None` if the path is not in the trie).
+        :rtype: DeletionNode
+        """
+
+        node = self.root
+        names = entity.rstrip("/").split("/") if entity else []
+        for index, name in enumerate(names):
+            key = (name if index == len(names) - 1
+                   and not entity.endswith("/") else f"{name}/")
+            node = (node.children or {}).get(key)
+            if node is None:
+                return None
+        return node
+
+    def nodes(self, entity=""):
+        """Return the deletions below a path, a deleted directory is
+        returned as one entry (without the deletions in it).
+
+        :param str entity: The path of a directory (with a trailing `/`),
+            an empty string for the root.
+
+        :return: Generator of the paths and the nodes of the deletions
+            (in alphabetical order).
+        :rtype: generator
+        """
+
+        node = self.find(entity)
+        if node is None or not node.children:
+            return
+        for name, child in sorted(node.children.items()):
+            if child.deleted:
+                yield f"{entity}{name}", child
+            else:
+                yield from self.nodes(f"{entity}{name}")
+
+    def paths(self, entity):
+        """Return every deletion below a path (the path included).
+
+        :param str entity: The path (directories with a trailing `/`).
+
+        :return: Generator of the paths of the deletions.
+        :rtype: generator
+        """
+
+        node = self.find(entity)
+        if node is None:
+            return
+        stack = [(entity, node)]
+        while stack:
+            entity, node = stack.pop()
+            if node.deleted:
+                yield entity
+            if node.children:
+                stack.extend((f"{entity}{name}", child) for name, child
+                             in sorted(node.children.items(), reverse=True))
@@ -0,0 +1,231 @@
+"""
+arXive: A simple CLI/GUI frontend for rsync.
+
+This file contains the code for the deletion rules of arXive.
+
+Check the documentation for details: https://arxive.readthedocs.io
+
+    Copyright (C) 2025 David Gaal (gaaldvd@proton.me)
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import re
+from os import path, lstat
+from time import time
+
+# The actions of the rules
+ACTIONS = ("delete", "keep")
+
+# The conditions on the entities (compared to `os.lstat`)
+CONDITIONS = ("older_than", "newer_than", "larger_than", "smaller_than")
+
+# References to numbered groups (`\1`, `(?(1)...)`), which would refer to
+# other groups once the patterns are combined (an escaped backslash
+# before them does not count)
+NUMBERED_REFERENCE = re.compile(r"(?<!\\)(?:\\\\)*\\[1-9]|\(\?\(\d")
+
+
+def translate_glob(pattern):
+    """Translate a glob pattern of a deletion rule to a regular expression.
+
+    `*` and `?` do not match `/`, `**` matches anything. Just like the
+    filter rules of rsync, a pattern without a `/` (except a trailing one)
+    matches the name of the entity at any depth, a pattern with a trailing
+    `/` only matches directories, and everything in a matching directory
+    matches too.
+
+    :param str pattern: The glob pattern.
+
+    :return: The regular expression (matched from the start of the path).
+    :rtype: str
+    """
+
+    dir_only = pattern.endswith("/")
+    anchored = "/" in pattern.rstrip("/")
+    pattern = pattern.strip("/")
+
+    regex, i = [], 0
+    while i < len(pattern):
+        char = pattern[i]
+        if pattern.startswith("**", i):
+            regex.append(".*")
+            i += 2
+            continue
+        if char == "*":
+            regex.append("[^/]*")
+        elif char == "?":
+            regex.append("[^/]")
+        elif char == "[" and "]" in pattern[i + 2:]:
+            end = pattern.index("]", i + 2)
+            chars = pattern[i + 1:end]
+            if chars.startswith("!"):
+                chars = f"^{chars[1:]}"
+            regex.append(f"[{chars.replace("\\", "\\\\")}]")
+            i = end
+        else:
+            regex.append(re.escape(char))
+        i += 1
+
+    return (f"{"" if anchored else "(?:.*/)?"}{"".join(regex)}"
+            f"{"/.*" if dir_only else "(?:/.*)?"}\\Z")
+
+
+class DeletionRules:
+    """Chooses deletions with the ordered rules of
+    :ref:`Config.deletion_rules <config-class>`.
+
+    Every rule has an action (`delete` or `keep`) and the conditions an
+    entity has to meet, e.g.:
+
+    .. code-block:: json
+
+        [
+            {"action": "keep", "glob": "*.kdbx"},
+            {"action": "delete", "regex": "\\\\.(tmp|bak)$"},
+            {"action": "keep", "glob": "photos/", "newer_than": 30},
+            {"action": "delete", "larger_than": 1073741824}
+        ]
+
+    `glob` patterns are translated by
+    :ref:`translate_glob <translate-glob>`, `regex` is searched anywhere in
+    the path (relative to the destination, directories with a trailing `/`).
+    `older_than` and `newer_than` are days since the last modification,
+    `larger_than` and `smaller_than` are bytes (checked on the
+    destination). The first matching rule decides, the deletions matched
+    by none of the rules are deleted (just like with `-n`).
+
+    The patterns of all the rules are compiled into a single regular
+    expression, so choosing from millions of deletions reads every path
+    once instead of once for every rule (and the entities are only checked
+    on the destination if a rule with conditions matches their path).
+
+    :ivar list rules: The action, the pattern and the conditions
+        of the rules.
+    :ivar re.Pattern matcher: The patterns of every rule combined
+        (`None` if they cannot be combined).
+
+    :raises ValueError: If a rule is invalid.
+
+    Methods:
+        action(entity, root):
+            Returns the action of the first matching rule.
+
+        choose(entities, root):
+            Returns the deletions to delete.
+    """
+
+    def __init__(self, rules):
+        self.rules = []
+        alternatives = []
+        for index, rule in enumerate(rules):
+            action = rule.get("action")
+            if action not in ACTIONS:
+                raise ValueError(f"Invalid action in deletion rule "
+                                 f"{index + 1}: {action}")
+            unknown = set(rule) - {"action", "glob", "regex", *CONDITIONS}
+            if unknown:
+                raise ValueError(f"Unknown key in deletion rule "
+                                 f"{index + 1}: {", ".join(sorted(unknown))}")
+            if "glob" in rule and "regex" in rule:
+                raise ValueError(f"Deletion rule {index + 1} has both "
+                                 f"a glob and a regex!")
+
+            # A rule without a pattern matches every path
+            if "glob" in rule:
+                pattern = translate_glob(rule["glob"])
+            elif "regex" in rule:
+                pattern = f"(?s:.*?)(?:{rule["regex"]})"
+            else:
+                pattern = ""
+            try:
+                compiled = re.compile(pattern)
+            except re.error as e:
+                raise ValueError(f"Invalid pattern in deletion rule "
+                                 f"{index + 1}: {e}") from e
+
+            conditions = {name: float(rule[name]) for name in CONDITIONS
+                          if name in rule}
+            self.rules.append((action, compiled, conditions))
+            alternatives.append(f"(?P<r{index}>{pattern})")
+
+        # The first alternative matching a path is the first rule matching
+        # it (regexes with numbered backreferences or repeated group names
+        # cannot be combined, then every rule is tried one by one)
+        self.matcher = None
+        if not any(NUMBERED_REFERENCE.search(rule.get("regex", ""))
+                   for rule in rules):
+            try:
+                self.matcher = re.compile("|".join(alternatives))
+            except re.error:
+                pass
+
+    def action(self, entity, root):
+        """Return the action of the first rule matching an entity.
+
+        :param str entity: The path relative to `root`.
+        :param str root: The destination.
+
+        :return: `delete` or `keep`.
+        :rtype: str
+        """
+
+        first = 0
+        if self.matcher is not None:
+            match = self.matcher.match(entity)
+            if match is None:
+                return "delete"
+            first = int(match.lastgroup[1:])
+
+        # The rules after the first match are only tried if its
+        # conditions are not met
+        st = None
+        for index in range(first, len(self.rules)):
+            action, pattern, conditions = self.rules[index]
+            if (index != first or self.matcher is None) and not pattern.match(
+                    entity):
+                continue
+            if not conditions:
+                return action
+            if st is None:
+                try:
+                    st = lstat(path.join(root, entity))
+                except OSError:
+                    st = False
+            if st and self._meets(st, conditions):
+                return action
+        return "delete"
+
+    @staticmethod
+    def _meets(st, conditions):
+        """Check the conditions of a rule on the status of an entity."""
+
+        age = (time() - st.st_mtime) / 86400
+        return (age > conditions.get("older_than", -float("inf"))
+                and age < conditions.get("newer_than", float("inf"))
+                and st.st_size > conditions.get("larger_than", -1)
+                and st.st_size < conditions.get("smaller_than", float("inf")))
+
+    def choose(self, entities, root):
+        """Choose the deletions to delete.
+
+        :param list entities: The paths of the deletions relative to `root`.
+        :param str root: The destination.
+
+        :return: The paths of the deletions the rules delete.
+        :rtype: list
+        """
+
+        return [entity for entity in entities
+                if self.action(entity, root) == "delete"]
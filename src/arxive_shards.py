@@ -0,0 +1,189 @@
+"""
+arXive: A simple CLI/GUI frontend for rsync.
+
+This file contains the code for splitting a source into shards
+synchronized by parallel rsync processes.
+
+Check the documentation for details: https://arxive.readthedocs.io
+
+    Copyright (C) 2025 David Gaal (gaaldvd@proton.me)
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from heapq import heapify, heapreplace
+from os import path, scandir
+
+# The cost of a file in bytes (creating it and its metadata) when the
+# shards are balanced by size and file count
+FILE_COST = 32 * 1024
+
+# The number of shards per rsync process (smaller shards balance better)
+SHARDS_PER_PROCESS = 4
+
+# Directories are split into their entries at most this deep
+MAX_SPLIT_DEPTH = 3
+
+
+class Shard:
+    """Holds a shard of the source: entities synchronized by one rsync
+    process (with `--files-from`).
+
+    :ivar list paths: The paths of the entities relative to the root of
+        the transfer (directories are synchronized recursively).
+    :ivar int size: The total size of the files in the shard.
+    :ivar int files: The number of entities in the shard.
+    """
+
+    __slots__ = ("paths", "size", "files")
+
+    def __init__(self):
+        self.paths = []
+        self.size = 0
+        self.files = 0
+
+    @property
+    def weight(self):
+        """The estimated cost of synchronizing the shard."""
+
+        return self.size + self.files * FILE_COST
+
+    def add(self, entity, size, files):
+        """Add an entity to the shard.
+
+        :param str entity: The path of the entity.
+        :param int size: The total size of the files of the entity.
+        :param int files: The number of entities in the entity.
+        """
+
+        self.paths.append(entity)
+        self.size += size
+        self.files += files
+
+
+def measure_tree(directory):
+    """Measure a directory: the total size of its files and the number of
+    its entities (without following symlinks, errors are skipped).
+
+    :param str directory: The path to the directory.
+
+    :return: The size and the number of entities.
+    :rtype: tuple
+    """
+
+    size, files = 0, 1
+    stack = [directory]
+    while stack:
+        try:
+            with scandir(stack.pop()) as entries:
+                for entry in entries:
+                    files += 1
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif entry.is_file(follow_symlinks=False):
+                        size += entry.stat(follow_symlinks=False).st_size
+        except OSError:
+            continue
+    return size, files
+
+def _list_units(root, rel, executor):
+    """List the entries of a directory of the source with their size
+    and number of entities (directories are measured in parallel).
+
+    :return: The path, the size and the number of entities
+        and whether it is a directory, for every entry.
+    :rtype: list
+    """
+
+    units, futures = [], []
+    with scandir(path.join(root, rel)) as entries:
+        for entry in entries:
+            entity = f"{rel}/{entry.name}" if rel else entry.name
+            if entry.is_dir(follow_symlinks=False):
+                futures.append((entity, executor.submit(measure_tree,
+                                                        entry.path)))
+            else:
+                try:
+                    size = entry.stat(follow_symlinks=False).st_size
+                except OSError:
+                    size = 0
+                units.append((entity, size, 1, False))
+    units.extend((entity, *future.result(), True)
+                 for entity, future in futures)
+    return units
+
+def plan_shards(root, prefix, processes):
+    """Split the source into shards of similar estimated cost (size and
+    number of entities, see `FILE_COST`).
+
+    The entries of the source are the units of the shards. Directories
+    bigger than a shard should be are split into their entries (up to
+    `MAX_SPLIT_DEPTH`), then the units are distributed over
+    `SHARDS_PER_PROCESS` shards per process, the biggest first into the
+    smallest shard. The shards are returned in decreasing size, so when
+    the rsync processes take the next shard from a shared queue, the small
+    shards at the end even out the differences.
+
+    The deletions inside a split directory are not found by the rsync
+    processes (only the ones inside the synchronized entities), so the
+    split directories are also returned.
+
+    :param str root: The root of the transfer on the source.
+    :param str prefix: The path of the source relative to `root` (empty if
+        the source is the root itself).
+    :param int processes: The number of rsync processes.
+
+    :return: The shards and the paths of the split directories
+        (relative to `root`).
+    :rtype: tuple
+
+    :raises OSError: If the source cannot be read.
+    """
+
+    with ThreadPoolExecutor(max_workers=2 * processes) as executor:
+        units = _list_units(root, prefix, executor)
+        split = [prefix]
+        limit = (sum(size + files * FILE_COST for _, size, files, _ in units)
+                 / (processes * SHARDS_PER_PROCESS))
+
+        # Splitting the directories which would not fit into a shard
+        for _ in range(MAX_SPLIT_DEPTH - 1):
+            big = [unit for unit in units
+                   if unit[3] and unit[1] + unit[2] * FILE_COST > limit]
+            if not big:
+                break
+            names = {unit[0] for unit in big}
+            units = [unit for unit in units if unit[0] not in names]
+            for entity, _, _, _ in big:
+                try:
+                    units.extend(_list_units(root, entity, executor))
+                    split.append(entity)
+                except OSError:
+                    units.append((entity, 0, 1, True))
+
+    # Distributing the units, the biggest first into the smallest shard
+    shards = [Shard() for _ in range(
+        max(1, min(len(units), processes * SHARDS_PER_PROCESS)))]
+    heap = [(0, index) for index in range(len(shards))]
+    heapify(heap)
+    for entity, size, files, _ in sorted(
+            units, key=lambda unit: unit[1] + unit[2] * FILE_COST,
+            reverse=True):
+        index = heap[0][1]
+        shards[index].add(entity, size, files)
+        heapreplace(heap, (shards[index].weight, index))
+    shards = sorted((shard for shard in shards if shard.paths),
+                    key=lambda shard: shard.weight, reverse=True)
+    return shards, split
@@ -0,0 +1,347 @@
+"""
+arXive: A simple CLI/GUI frontend for rsync.
+
+This file contains the code for the watch mode of arXive.
+
+Check the documentation for details: https://arxive.readthedocs.io
+
+    Copyright (C) 2025 David Gaal (gaaldvd@proton.me)
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import ctypes
+import ctypes.util
+from os import (read, close as close_fd, fsencode, fsdecode, strerror, walk,
+                lstat)
+from select import select
+from struct import calcsize, unpack_from
+from time import monotonic
+
+from arxive_cli import *
+
+# inotify event masks (see inotify(7))
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_DONT_FOLLOW = 0x02000000
+IN_EXCL_UNLINK = 0x04000000
+IN_ISDIR = 0x40000000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = (IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO
+              | IN_CREATE | IN_DELETE | IN_ONLYDIR | IN_DONT_FOLLOW
+              | IN_EXCL_UNLINK)
+
+# Header of `struct inotify_event` (wd, mask, cookie, len)
+EVENT_HEADER = "iIII"
+EVENT_HEADER_SIZE = calcsize(EVENT_HEADER)
+
+
+class Watcher:
+    """Watches a directory tree with inotify.
+
+    Every directory of the tree gets its own watch, new directories are
+    watched as soon as they show up.
+
+    :ivar str root: The watched directory.
+    :ivar dict dirs: The relative paths of the watched directories by
+        watch descriptors.
+    :ivar bool overflow: Shows if the kernel dropped events, in this case
+        the tree has to be synchronized as a whole.
+
+    Methods:
+        add_tree(rel):
+            Watches a directory and its subdirectories.
+
+        read(timeout):
+            Reads the events from the kernel.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.dirs = {}
+        self.overflow = False
+        self.libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self.fd = self.libc.inotify_init1(IN_CLOEXEC)
+        if self.fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, strerror(errno))
+        self.add_tree("")
+
+    def close(self):
+        """Close the inotify instance (which removes every watch)."""
+
+        close_fd(self.fd)
+
+    def add_tree(self, rel):
+        """Watch a directory and all of its subdirectories.
+
+        :param str rel: The path of the directory relative to `root`.
+
+        :return: The relative paths of every entity in the directory.
+        :rtype: list
+        """
+
+        entities = []
+        wd = self.libc.inotify_add_watch(
+            self.fd, fsencode(path.join(self.root, rel)), WATCH_MASK)
+        if wd < 0:
+            return entities
+        self.dirs[wd] = rel
+        try:
+            with scandir(path.join(self.root, rel)) as entries:
+                for entry in entries:
+                    entity = path.join(rel, entry.name)
+                    entities.append(entity)
+                    if entry.is_dir(follow_symlinks=False):
+                        entities.extend(self.add_tree(entity))
+        except OSError:
+            pass
+        return entities
+
+    def remove_tree(self, rel):
+        """Forget the watches of a directory that was moved away
+        and of its subdirectories.
+
+        :param str rel: The path of the directory relative to `root`.
+        """
+
+        for wd, watched in list(self.dirs.items()):
+            if watched == rel or watched.startswith(f"{rel}/"):
+                self.libc.inotify_rm_watch(self.fd, wd)
+                del self.dirs[wd]
+
+    def read(self, timeout):
+        """Wait for events and read them.
+
+        :param float timeout: Seconds to wait for the first event.
+
+        :return: The relative paths and masks of the events.
+        :rtype: list
+        """
+
+        events = []
+        if not select([self.fd], [], [], timeout)[0]:
+            return events
+        buffer = read(self.fd, 65536)
+        offset = 0
+        while offset < len(buffer):
+            wd, mask, _, length = unpack_from(EVENT_HEADER, buffer, offset)
+            offset += EVENT_HEADER_SIZE
+            name = fsdecode(buffer[offset:offset + length].rstrip(b"\0"))
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                self.overflow = True
+            elif mask & IN_IGNORED:
+                self.dirs.pop(wd, None)
+            elif wd in self.dirs:
+                events.append((path.join(self.dirs[wd], name), mask))
+        return events
+
+
+def changed_records(session, changed, prefix):
+    """Collect the records the moved files are detected from (see
+    :ref:`Session.move_entities <move-entities>`): the deletions and the new
+    files among the changed paths, so that the whole tree is not read again
+    by a dry-run (and the records of an earlier cycle are not reused).
+
+    :param Session session: Handles the arXive session.
+    :param set changed: Paths (relative to the source) created or modified.
+    :param str prefix: The directory of the source on the destination
+        (empty if the source has a trailing slash).
+
+    :return: The records of the deletions and the new files.
+    :rtype: PlanRecords
+    """
+
+    records = PlanRecords()
+    for entity in session.deletions:
+        records.append(DELETE, 0, entity)
+    root = session.transfer_root()
+    for rel in sorted(changed):
+        rel_path = path.join(root, prefix, rel)
+        files = [rel_path]
+        if path.isdir(rel_path) and not path.islink(rel_path):
+            files = [path.join(directory, name)
+                     for directory, _, names in walk(rel_path)
+                     for name in names]
+        for file_path in files:
+            entity = path.relpath(file_path, root)
+            if path.lexists(path.join(session.destination, entity)):
+                continue
+            try:
+                records.append(CREATE, lstat(file_path).st_size, entity)
+            except OSError:
+                continue
+    return records
+
+def sync_changes(session, changed, deleted, prefix, no_interrupt):
+    """Delete the entities removed from the source (following the same rules
+    as the CLI), then synchronize the changed paths.
+
+    :param Session session: Handles the arXive session.
+    :param set changed: Paths (relative to the source) created or modified.
+    :param set deleted: Paths (relative to the source) deleted or moved away.
+    :param str prefix: The directory of the source on the destination
+        (empty if the source has a trailing slash).
+    :param bool no_interrupt: Delete everything without prompting.
+    """
+
+    # Collecting deletions, with everything below the deleted directories,
+    # the same way rsync lists them
+    session.deletions = []
+    for rel in sorted(deleted):
+
+        # Skipping the entities of deleted directories (they are listed
+        # with the directory)
+        parent = path.dirname(rel)
+        while parent and parent not in deleted:
+            parent = path.dirname(parent)
+        if parent:
+            continue
+
+        entity = path.join(prefix, rel)
+        entity_path = path.join(session.destination, entity)
+        if path.isdir(entity_path) and not path.islink(entity_path):
+            session.deletions.extend(list_subtree(session.destination,
+                                                  entity))
+        elif path.lexists(entity_path):
+            session.deletions.append(entity)
+    session.records = None
+    if session.deletions:
+        if session.detect_moves:
+            session.records = changed_records(session, changed, prefix)
+        session.log(f"\n{len(session.deletions)} deletion(s) found.\n")
+        tree = print_deletions(session)
+        prompt_deletions(session, no_interrupt, tree)
+
+    # Synchronizing only the changed paths
+    if changed:
+        session.log(f"Syncing {len(changed)} changed path(s)...")
+        try:
+            result = session.sync(
+                files_from=[path.join(prefix, rel) for rel in sorted(changed)])
+            if result.returncode == 0:
+                session.log("Synchronization finished.")
+        except CalledProcessError as e:
+            session.log("Warning: something went wrong "
+                        "while running rsync!", e.returncode)
+
+
+def main():
+    """arXive watch mode script.
+
+    The source is watched with inotify, the changes are collected until
+    there are no new events for :ref:`Config.debounce <config-class>`
+    seconds, then only the changed paths get synchronized.
+
+    :var Session session: Handles the arXive session.
+    :var Config config: Holds and handles configurations.
+    :var bool no_interrupt: Shows if no-interruption mode is active
+        for the current session.
+    :var Watcher watcher: Watches the source.
+    """
+
+    session, config, no_interrupt = start_session(argv[1], argv[2])
+
+    # Only the changed paths are synchronized, so rsync cannot delete
+    # anything, the deletions are always done beforehand
+    session.single_pass = False
+
+    # Watching the source
+    root = session.source.rstrip("/") or "/"
+    prefix = "" if session.source.endswith("/") else path.basename(root)
+    try:
+        watcher = Watcher(root)
+    except OSError as e:
+        session.log("Error while watching the source!", e)
+        close("Goodbye!")
+    session.log(f"Watching {len(watcher.dirs)} directories "
+                f"(press Ctrl+C to stop)...")
+
+    changed, deleted = set(), set()
+    first_event = None
+    try:
+        while True:
+            events = watcher.read(config.debounce)
+            for rel, mask in events:
+                if mask & (IN_DELETE | IN_MOVED_FROM):
+                    changed.discard(rel)
+                    deleted.add(rel)
+                    if mask & IN_ISDIR:
+                        watcher.remove_tree(rel)
+                else:
+                    deleted.discard(rel)
+                    changed.add(rel)
+
+                    # New directories are watched and their contents
+                    # synchronized (they may have been filled already)
+                    if mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO):
+                        changed.update(watcher.add_tree(rel))
+            if events and first_event is None:
+                first_event = monotonic()
+
+            # Synchronizing after a quiet period (or if the source keeps
+            # changing for too long)
+            if first_event is not None and (
+                    not events
+                    or monotonic() - first_event > 10 * config.debounce):
+                if watcher.overflow:
+                    session.log("Warning: too many events, synchronizing "
+                                "the whole source...")
+                    watcher.close()
+                    watcher = Watcher(root)
+                    changed, deleted = set(), set()
+                    session.deletions = []
+                    try:
+                        session.deletions = list(session.iter_deletions())
+                    except CalledProcessError as e:
+                        session.log(f"Error while listing deletions "
+                                    f"({e.returncode})!", e.stderr)
+                    if session.deletions:
+                        prompt_deletions(session, no_interrupt)
+                    try:
+                        session.sync()
+                        session.log("Synchronization finished.")
+                    except CalledProcessError as e:
+                        session.log("Warning: something went wrong "
+                                    "while running rsync!", e.returncode)
+                else:
+
+                    # Paths deleted and created again in the meantime
+                    # are changes
+                    for rel in [r for r in deleted
+                                if path.lexists(path.join(root, r))]:
+                        deleted.discard(rel)
+                        changed.add(rel)
+                    sync_changes(session, changed, deleted, prefix,
+                                 no_interrupt)
+                changed, deleted = set(), set()
+                first_event = None
+    except KeyboardInterrupt:
+        session.log("\nWatching stopped.")
+    finally:
+        watcher.close()
+    close("Goodbye!")
+
+
+if __name__ == '__main__':
+    main()
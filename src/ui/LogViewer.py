@@ -15,8 +15,9 @@ from PySide6.QtGui import (QBrush, QColor, QConicalGradient, QCursor,
     QFont, QFontDatabase, QGradient, QIcon,
     QImage, QKeySequence, QLinearGradient, QPainter,
     QPalette, QPixmap, QRadialGradient, QTransform)
-from PySide6.QtWidgets import (QAbstractButton, QApplication, QDialog, QDialogButtonBox,
-    QPlainTextEdit, QSizePolicy, QVBoxLayout, QWidget)
+from PySide6.QtWidgets import (QAbstractButton, QApplication, QCheckBox, QDialog,
+    QDialogButtonBox, QHBoxLayout, QLineEdit, QListView,
+    QPushButton, QSizePolicy, QVBoxLayout, QWidget)
 
 class Ui_Dialog(object):
     def setupUi(self, Dialog):
@@ -26,8 +27,36 @@ class Ui_Dialog(object):
         Dialog.setMinimumSize(QSize(600, 400))
         self.verticalLayout = QVBoxLayout(Dialog)
         self.verticalLayout.setObjectName(u"verticalLayout")
-        self.sessionLog = QPlainTextEdit(Dialog)
+        self.searchLayout = QHBoxLayout()
+        self.searchLayout.setObjectName(u"searchLayout")
+        self.searchEdit = QLineEdit(Dialog)
+        self.searchEdit.setObjectName(u"searchEdit")
+        self.searchEdit.setClearButtonEnabled(True)
+
+        self.searchLayout.addWidget(self.searchEdit)
+
+        self.nextButton = QPushButton(Dialog)
+        self.nextButton.setObjectName(u"nextButton")
+
+        self.searchLayout.addWidget(self.nextButton)
+
+        self.endButton = QPushButton(Dialog)
+        self.endButton.setObjectName(u"endButton")
+
+        self.searchLayout.addWidget(self.endButton)
+
+        self.followCheck = QCheckBox(Dialog)
+        self.followCheck.setObjectName(u"followCheck")
+        self.followCheck.setChecked(True)
+
+        self.searchLayout.addWidget(self.followCheck)
+
+
+        self.verticalLayout.addLayout(self.searchLayout)
+
+        self.sessionLog = QListView(Dialog)
         self.sessionLog.setObjectName(u"sessionLog")
+        self.sessionLog.setUniformItemSizes(True)
 
         self.verticalLayout.addWidget(self.sessionLog)
 
@@ -48,5 +77,9 @@ class Ui_Dialog(object):
 
     def retranslateUi(self, Dialog):
         Dialog.setWindowTitle(QCoreApplication.translate("Dialog", u"Session log", None))
+        self.searchEdit.setPlaceholderText(QCoreApplication.translate("Dialog", u"Search...", None))
+        self.nextButton.setText(QCoreApplication.translate("Dialog", u"Find next", None))
+        self.endButton.setText(QCoreApplication.translate("Dialog", u"Jump to end", None))
+        self.followCheck.setText(QCoreApplication.translate("Dialog", u"Follow", None))
     # retranslateUi
 
@@ -15,8 +15,8 @@ from PySide6.QtGui import (QBrush, QColor, QConicalGradient, QCursor,
     QFont, QFontDatabase, QGradient, QIcon,
     QImage, QKeySequence, QLinearGradient, QPainter,
     QPalette, QPixmap, QRadialGradient, QTransform)
-from PySide6.QtWidgets import (QApplication, QGridLayout, QLabel, QLineEdit,
-    QListWidget, QListWidgetItem, QMainWindow, QPlainTextEdit,
+from PySide6.QtWidgets import (QAbstractItemView, QApplication, QGridLayout, QLabel,
+    QLineEdit, QListView, QMainWindow, QPlainTextEdit,
     QPushButton, QRadioButton, QSizePolicy, QSpacerItem,
     QStatusBar, QToolBar, QVBoxLayout, QWidget)
 
@@ -128,8 +128,10 @@ class Ui_MainWindow(object):
 
         self.verticalLayout.addWidget(self.sessionCtrl)
 
-        self.delList = QListWidget(self.centralwidget)
+        self.delList = QListView(self.centralwidget)
         self.delList.setObjectName(u"delList")
+        self.delList.setSelectionMode(QAbstractItemView.SelectionMode.ExtendedSelection)
+        self.delList.setUniformItemSizes(True)
 
         self.verticalLayout.addWidget(self.delList)
 
@@ -0,0 +1,55 @@
+"""
+arXive: A simple CLI/GUI frontend for rsync.
+
+This file contains the shared setup of the tests of arXive (run them
+with `python -m pytest tests`).
+
+Check the documentation for details: https://arxive.readthedocs.io
+
+    Copyright (C) 2025 David Gaal (gaaldvd@proton.me)
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import sys
+from os import path
+
+import pytest
+
+# The modules of arXive are run from `src` (not installed as a package)
+sys.path.insert(0, path.join(path.dirname(path.dirname(
+    path.abspath(__file__))), "src"))
+
+
+def make_tree(root, entries):
+    """Create files and directories (paths ending with `/`) under `root`.
+
+    :param pathlib.Path root: The root directory (created).
+    :param list entries: The relative paths of the entries.
+    """
+
+    root.mkdir(parents=True, exist_ok=True)
+    for entry in entries:
+        if entry.endswith("/"):
+            (root / entry).mkdir(parents=True, exist_ok=True)
+        else:
+            (root / entry).parent.mkdir(parents=True, exist_ok=True)
+            (root / entry).write_bytes(b"x" * len(entry))
+
+
+@pytest.fixture
+def tree():
+    """Return the function creating test trees (see `make_tree`)."""
+
+    return make_tree
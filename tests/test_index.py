@@ -0,0 +1,99 @@
+"""
+arXive: A simple CLI/GUI frontend for rsync.
+
+This file contains the tests of the directory index of arXive (the
+deletions it lists are compared to the native engine).
+
+Check the documentation for details: https://arxive.readthedocs.io
+
+    Copyright (C) 2025 David Gaal (gaaldvd@proton.me)
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import pytest
+
+from arxive_common import scan_deletions
+from arxive_index import DirectoryIndex
+
+SOURCE = ["keep/1", "keep/sub/2", "same/3", "moved/", "top"]
+DESTINATION = SOURCE + ["keep/gone", "keep/sub/gone/deep/4", "keep/sub/gone/5",
+                        "old/x/6", "old/7", "empty/", "top2", "same/3x"]
+
+
+@pytest.fixture(autouse=True)
+def index_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(DirectoryIndex, "index_dir", str(tmp_path / "index"))
+
+
+def index_deletions(source, destination):
+    index = DirectoryIndex(source, destination)
+    try:
+        return list(index.scan_deletions()), index.errors
+    finally:
+        index.close()
+
+
+@pytest.mark.parametrize("slash", [True, False])
+def test_index_lists_the_same_deletions_as_native(tmp_path, tree, slash):
+    tree(tmp_path / "src", SOURCE)
+    tree(tmp_path / "dst" / ("" if slash else "src"), DESTINATION)
+    source = f"{tmp_path / "src"}{"/" if slash else ""}"
+    destination = str(tmp_path / "dst")
+
+    native = list(scan_deletions(source, destination))
+    indexed, errors = index_deletions(source, destination)
+    assert errors == []
+    assert sorted(indexed) == sorted(native)
+    assert len(native) == 12
+
+    # A directory is listed after its entries (like rsync)
+    for entities in (native, indexed):
+        for index, entity in enumerate(entities):
+            if entity.endswith("/"):
+                assert not any(other.startswith(entity)
+                               for other in entities[index + 1:])
+
+
+def test_index_follows_changes(tmp_path, tree):
+    tree(tmp_path / "src", SOURCE)
+    tree(tmp_path / "dst", DESTINATION)
+    source, destination = f"{tmp_path / "src"}/", str(tmp_path / "dst")
+    index_deletions(source, destination)
+
+    (tmp_path / "src" / "old").mkdir()
+    (tmp_path / "src" / "old" / "7").write_bytes(b"7")
+    (tmp_path / "dst" / "same" / "3x").unlink()
+    indexed, _ = index_deletions(source, destination)
+    assert sorted(indexed) == sorted(scan_deletions(source, destination))
+    assert "old/7" not in indexed and "old/x/" in indexed
+
+
+def test_unreadable_source_directory_is_not_listed(tmp_path, tree,
+                                                    monkeypatch):
+    tree(tmp_path / "src", SOURCE)
+    tree(tmp_path / "dst", DESTINATION)
+    source, destination = f"{tmp_path / "src"}/", str(tmp_path / "dst")
+    read_dir = DirectoryIndex._read_dir
+
+    def failing(self, side, rel, known):
+        if side == "source" and rel == "keep":
+            raise PermissionError(13, "Permission denied", rel)
+        return read_dir(self, side, rel, known)
+
+    monkeypatch.setattr(DirectoryIndex, "_read_dir", failing)
+    indexed, errors = index_deletions(source, destination)
+    assert errors
+    assert not [entity for entity in indexed if entity.startswith("keep/")]
+    assert "old/" in indexed
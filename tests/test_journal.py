@@ -0,0 +1,71 @@
+"""
+arXive: A simple CLI/GUI frontend for rsync.
+
+This file contains the tests of the sync journal of arXive.
+
+Check the documentation for details: https://arxive.readthedocs.io
+
+    Copyright (C) 2025 David Gaal (gaaldvd@proton.me)
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import pytest
+
+from arxive_journal import Journal
+
+
+@pytest.fixture
+def journal(tmp_path, monkeypatch):
+    monkeypatch.setattr(Journal, "journal_dir", str(tmp_path / "journal"))
+    return Journal("source -> destination")
+
+
+def test_checkpoints_are_loaded(journal):
+    assert journal.load() is None
+    journal.begin(source="src", destination="dst", options=[])
+    journal.checkpoint("deleted", entities=3)
+    journal.checkpoint("sync_start", shards=[["a"], ["b"], ["c"]])
+    journal.checkpoint("shard_done", shard=0)
+    journal.checkpoint("shard_done", shard=2)
+
+    state = Journal("source -> destination").load()
+    assert state["source"] == "src"
+    assert state["events"]["deleted"]["entities"] == 3
+    assert state["events"]["sync_start"]["shards"] == [["a"], ["b"], ["c"]]
+    assert state["done"] == {0, 2}
+
+
+def test_torn_last_line_is_ignored(journal):
+    journal.begin(source="src")
+    journal.checkpoint("shard_done", shard=1)
+    with open(journal.journal_path, 'a', encoding="utf-8") as file:
+        file.write('{"event": "shard_do')
+    assert journal.load()["done"] == {1}
+
+
+def test_begin_replaces_and_finish_removes(journal):
+    journal.begin(source="old")
+    journal.checkpoint("shard_done", shard=0)
+    journal.begin(source="new")
+    state = journal.load()
+    assert state["source"] == "new" and state["done"] == set()
+
+    journal.finish()
+    journal.finish()
+    assert journal.load() is None
+
+
+def test_profiles_have_separate_journals(journal):
+    assert Journal("other").journal_path != journal.journal_path
@@ -0,0 +1,122 @@
+"""
+arXive: A simple CLI/GUI frontend for rsync.
+
+This file contains the tests of the rsync output parsers and the
+record containers of arXive.
+
+Check the documentation for details: https://arxive.readthedocs.io
+
+    Copyright (C) 2025 David Gaal (gaaldvd@proton.me)
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import pytest
+
+from arxive_records import (CREATE, UPDATE, DELETE, OTHER, parse_record,
+                            parse_stats, parse_progress, PlanRecords,
+                            DeletionTree)
+
+
+@pytest.mark.parametrize("line, record", [
+    ("*deleting  |120|old/file.txt\n", (DELETE, 120, "old/file.txt")),
+    ("*deleting  |0|old/\n", (DELETE, 0, "old/")),
+    (">f+++++++++|2048|new/file.bin\n", (CREATE, 2048, "new/file.bin")),
+    ("cd+++++++++|4096|new/\n", (CREATE, 0, "new/")),
+    (">f.st......|512|changed.txt\n", (UPDATE, 512, "changed.txt")),
+    (".d..t......|4096|dir/\n", (OTHER, 0, "dir/")),
+    (">f+++++++++|10|a|b.txt\n", (CREATE, 10, "a|b.txt")),
+])
+def test_parse_record(line, record):
+    assert parse_record(line) == record
+
+
+@pytest.mark.parametrize("line", [
+    "sending incremental file list\n", "\n", "a|b\n", ">f+++++++++|x|f\n",
+])
+def test_parse_record_other_lines(line):
+    assert parse_record(line) is None
+
+
+def test_parse_stats():
+    output = ("Number of files: 1,234 (reg: 1,000, dir: 234)\n"
+              "Number of regular files transferred: 12\n"
+              "Total file size: 9,999,999 bytes\n"
+              "Total transferred file size: 1.234.567 bytes\n"
+              "Total bytes sent: 1,300,000\n"
+              "Total bytes received: 2,345\n")
+    assert parse_stats(output) == {"files": 12,
+                                   "transferred_bytes": 1234567,
+                                   "sent_bytes": 1300000,
+                                   "received_bytes": 2345}
+
+
+def test_parse_stats_missing_values():
+    assert parse_stats("Total bytes sent:\nsomething else\n") == {}
+
+
+@pytest.mark.parametrize("line, expected", [
+    ("  1,234,567  45%   12.34MB/s    0:01:23 (xfr#12, to-chk=100/2000)\r",
+     {"bytes": 1234567, "percent": 45, "rate": int(12.34 * 1024 ** 2),
+      "eta": 83, "files": 12, "to_check": 100, "total": 2000}),
+    ("  1.234.567 100%  123,45kB/s    1:00:00\r",
+     {"bytes": 1234567, "percent": 100, "rate": int(123.45 * 1024),
+      "eta": 3600, "files": None, "to_check": None, "total": None}),
+    ("        123   0%  123.45B/s    0:00:00 (xfr#0, ir-chk=1000/1001)\r",
+     {"bytes": 123, "percent": 0, "rate": 123, "eta": 0, "files": 0,
+      "to_check": 1000, "total": 1001}),
+    ("    12.34G  99%   1.00GB/s    0:00:01\r",
+     {"bytes": int(12.34 * 1024 ** 3), "percent": 99, "rate": 1024 ** 3,
+      "eta": 1, "files": None, "to_check": None, "total": None}),
+])
+def test_parse_progress(line, expected):
+    assert parse_progress(line) == expected
+
+
+def test_parse_progress_other_lines():
+    assert parse_progress("sending incremental file list\n") is None
+    assert parse_progress("file.txt\n") is None
+
+
+def test_plan_records():
+    records = PlanRecords()
+    records.append(CREATE, 10, "new")
+    records.append(DELETE, 5, "old/\udcff")
+    records.append(UPDATE, 7, "changed")
+    records.append(CREATE, 3, "other")
+
+    assert len(records) == 4
+    assert list(records) == [(CREATE, 10, "new"), (DELETE, 5, "old/\udcff"),
+                             (UPDATE, 7, "changed"), (CREATE, 3, "other")]
+    assert records.paths(CREATE) == ["new", "other"]
+    assert records.paths(DELETE, UPDATE) == ["old/\udcff", "changed"]
+    assert records.count(CREATE) == 2
+    assert records.total_size(CREATE, UPDATE) == 20
+
+
+def test_deletion_tree():
+    tree = DeletionTree(sized=True)
+    for entity, size in (("gone/a/1", 1), ("gone/a/", 0), ("gone/2", 2),
+                         ("gone/", 0), ("kept/3", 3), ("top", 4)):
+        tree.add(entity, size)
+
+    assert tree.root.files == 4 and tree.root.size == 10
+    assert [entity for entity, _ in tree.nodes()] == ["gone/", "kept/3",
+                                                      "top"]
+    assert tree.find("gone/").files == 2 and tree.find("gone/").size == 3
+    assert tree.find("kept/").deleted is False
+    assert tree.find("missing") is None
+    assert sorted(tree.paths("gone/")) == ["gone/", "gone/2", "gone/a/",
+                                           "gone/a/1"]
+    assert list(tree.paths("missing")) == []
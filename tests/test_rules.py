@@ -0,0 +1,115 @@
+"""
+arXive: A simple CLI/GUI frontend for rsync.
+
+This file contains the tests of the deletion rules of arXive.
+
+Check the documentation for details: https://arxive.readthedocs.io
+
+    Copyright (C) 2025 David Gaal (gaaldvd@proton.me)
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import re
+from os import utime
+from time import time
+
+import pytest
+
+from arxive_rules import DeletionRules, translate_glob
+
+
+@pytest.mark.parametrize("pattern, matching, other", [
+    ("*.tmp", ["a.tmp", "dir/b.tmp", "x.tmp/inner"], ["a.tmpx", "tmp"]),
+    ("photos/", ["photos/a.jpg", "x/photos/b.jpg"], ["photos", "photosx/a"]),
+    ("docs/*.txt", ["docs/a.txt"], ["x/docs/a.txt", "docs/x/a.txt"]),
+    ("**/cache", ["a/b/cache", "a/cache/x"], ["cache", "a/caches"]),
+    ("file?.[!a]", ["file1.b"], ["file1.a", "file12.b"]),
+])
+def test_translate_glob(pattern, matching, other):
+    regex = re.compile(translate_glob(pattern))
+    for entity in matching:
+        assert regex.match(entity), entity
+    for entity in other:
+        assert not regex.match(entity), entity
+
+
+def test_first_matching_rule_decides(tmp_path):
+    rules = DeletionRules([{"action": "keep", "glob": "*.kdbx"},
+                           {"action": "delete", "regex": r"\.(tmp|bak)$"},
+                           {"action": "keep", "glob": "photos/"}])
+    assert rules.matcher is not None
+    assert rules.action("vault.kdbx", str(tmp_path)) == "keep"
+    assert rules.action("photos/a.tmp", str(tmp_path)) == "delete"
+    assert rules.action("photos/a.jpg", str(tmp_path)) == "keep"
+    assert rules.action("other.txt", str(tmp_path)) == "delete"
+    assert rules.choose(["vault.kdbx", "a.bak", "photos/"],
+                        str(tmp_path)) == ["a.bak"]
+
+
+def test_conditions_fall_through(tmp_path):
+    (tmp_path / "old.log").write_bytes(b"x" * 100)
+    (tmp_path / "new.log").write_bytes(b"x" * 100)
+    utime(tmp_path / "old.log", (time() - 10 * 86400,) * 2)
+    rules = DeletionRules([{"action": "keep", "glob": "*.log",
+                            "newer_than": 1},
+                           {"action": "keep", "glob": "*.log",
+                            "larger_than": 1000}])
+    assert rules.action("new.log", str(tmp_path)) == "keep"
+    assert rules.action("old.log", str(tmp_path)) == "delete"
+    assert rules.action("missing.log", str(tmp_path)) == "delete"
+
+
+@pytest.mark.parametrize("rules", [
+    [{"action": "keep", "regex": "(?P<name>a)"},
+     {"action": "keep", "regex": "(?P<name>b)"}],
+    [{"action": "keep", "glob": "*.kdbx"},
+     {"action": "keep", "regex": r"(ab)\1"}],
+    [{"action": "keep", "glob": "*.kdbx"},
+     {"action": "keep", "regex": r"(a)?(?(1)b|c)x"}],
+])
+def test_uncombinable_rules_are_tried_one_by_one(rules, tmp_path):
+    combined = DeletionRules(rules)
+    assert combined.matcher is None
+    for entity in ("a", "b", "abab", "abx", "cx", "vault.kdbx", "zzz"):
+        separate = next((rule["action"] for rule in rules
+                         if re.compile(translate_glob(rule["glob"])
+                                       if "glob" in rule else
+                                       f"(?s:.*?)(?:{rule["regex"]})").match(
+                             entity)), "delete")
+        assert combined.action(entity, str(tmp_path)) == separate, entity
+
+
+def test_numbered_backreference_is_not_shifted(tmp_path):
+    rules = DeletionRules([{"action": "keep", "glob": "*.kdbx"},
+                           {"action": "keep", "regex": r"(ab)\1"}])
+    assert rules.action("x/abab", str(tmp_path)) == "keep"
+    assert rules.action("x/ab", str(tmp_path)) == "delete"
+
+
+def test_escaped_backslash_is_combined(tmp_path):
+    rules = DeletionRules([{"action": "keep", "regex": r"\\1"}])
+    assert rules.matcher is not None
+    assert rules.action("a\\1", str(tmp_path)) == "keep"
+
+
+@pytest.mark.parametrize("rule", [
+    {"action": "remove"},
+    {"action": "keep", "size": 1},
+    {"action": "keep", "glob": "*", "regex": ".*"},
+    {"action": "keep", "regex": "("},
+])
+def test_invalid_rules(rule):
+    with pytest.raises(ValueError):
+        DeletionRules([rule])
@@ -0,0 +1,63 @@
+"""
+arXive: A simple CLI/GUI frontend for rsync.
+
+This file contains the tests of splitting a source into shards.
+
+Check the documentation for details: https://arxive.readthedocs.io
+
+    Copyright (C) 2025 David Gaal (gaaldvd@proton.me)
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from os import walk, path
+
+from arxive_shards import plan_shards, measure_tree
+
+
+def covering(entity, paths):
+    """Return the paths of the shards that contain an entity."""
+
+    return [p for p in paths if entity == p or entity.startswith(f"{p}/")]
+
+
+def test_measure_tree(tmp_path, tree):
+    tree(tmp_path, ["a/1", "a/b/22", "c"])
+    assert measure_tree(str(tmp_path)) == (3 + 6 + 1, 6)
+
+
+def test_every_entity_is_in_one_shard(tmp_path, tree):
+    entries = [f"big/d{d}/f{f}" for d in range(10) for f in range(20)]
+    entries += [f"small{index}" for index in range(5)] + ["empty/"]
+    tree(tmp_path / "src", entries)
+
+    shards, split = plan_shards(str(tmp_path), "src", 2)
+    paths = [p for shard in shards for p in shard.paths]
+    assert len(paths) == len(set(paths))
+    assert "src" in split and "src/big" in split
+    assert shards == sorted(shards, key=lambda shard: shard.weight,
+                            reverse=True)
+    for directory, dirs, files in walk(tmp_path / "src"):
+        rel = path.relpath(directory, tmp_path)
+        for name in files + dirs:
+            entity = f"{rel}/{name}"
+            if entity in split:
+                continue
+            assert len(covering(entity, paths)) == 1, entity
+
+
+def test_empty_source_has_no_shards(tmp_path):
+    (tmp_path / "src").mkdir()
+    shards, split = plan_shards(str(tmp_path), "src", 4)
+    assert shards == [] and split == ["src"]